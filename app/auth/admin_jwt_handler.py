@@ -1,9 +1,10 @@
 # app/auth/admin_jwt_handler.py
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-from jose import jwt, JWTError
+from app.auth.key_manager import signing_keys
 from app.core.config import settings # Usaremos as mesmas chaves RSA, mas poderíamos ter chaves dedicadas
 from app.schemas.admin_schemas import AdminTokenData # Schema específico para payload do admin token
+from app.auth.request_claims import RequestClaims, decode_token_claims
 
 # Usar as mesmas chaves do JWT principal, mas com um "tipo" diferente no payload
 # Ou, se você quiser chaves diferentes para admins, defina-as em config.py
@@ -24,25 +25,18 @@ def create_admin_access_token(data: dict, expires_delta: Optional[timedelta] = N
         "iat": datetime.now(timezone.utc),
         "type": "admin_access" # Tipo específico para token de admin
     })
-    # Usando as mesmas chaves RSA do sistema principal de usuários
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_PRIVATE_KEY_CONTENT, algorithm=ADMIN_JWT_ALGORITHM)
+    # Usando as mesmas chaves RSA do sistema principal de usuários (já parseadas pelo key manager)
+    encoded_jwt = signing_keys.sign(to_encode)
     return encoded_jwt
 
-def verify_admin_token(token: str, credentials_exception: Exception) -> Optional[AdminTokenData]:
-    try:
-        payload = jwt.decode(
-            token,
-            settings.JWT_PUBLIC_KEY_CONTENT, # Usando as mesmas chaves RSA
-            algorithms=[ADMIN_JWT_ALGORITHM]
-        )
-        admin_id_str: Optional[str] = payload.get("sub") # admin_id como 'subject'
-        token_type: Optional[str] = payload.get("type")
-        
-        if admin_id_str is None or token_type != "admin_access":
-            raise credentials_exception
-        
-        return AdminTokenData(admin_id=admin_id_str)
-    except JWTError:
+def verify_admin_token_claims(claims: RequestClaims, credentials_exception: Exception) -> AdminTokenData:
+    # Claims já decodificadas uma vez por requisição (ver app.auth.request_claims)
+    if not claims.valid:
         raise credentials_exception
-    except Exception:
+    admin_id_str: Optional[str] = claims.subject # admin_id como 'subject'
+    if admin_id_str is None or claims.token_type != "admin_access":
         raise credentials_exception
+    return AdminTokenData(admin_id=admin_id_str)
+
+def verify_admin_token(token: str, credentials_exception: Exception) -> Optional[AdminTokenData]:
+    return verify_admin_token_claims(decode_token_claims(token), credentials_exception)
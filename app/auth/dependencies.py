@@ -1,8 +1,10 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
-from app.auth.jwt_handler import verify_token
+from app.auth.jwt_handler import verify_token_claims
+from app.auth.request_claims import get_request_claims
+from app.auth.principal_cache import get_cached_user_principal, MISSING
 from app.auth.schemas import TokenData
-from app.services.supabase_service import supabase_service # Importa a instância
+from app.services.supabase_service import get_supabase_service # Acessor preguiçoso do serviço
 from app.models.user import User
 from typing import Optional
 import uuid
@@ -10,13 +12,15 @@ from app.core.config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login") # Ajuste o tokenUrl
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    token_data: Optional[TokenData] = verify_token(token, credentials_exception)
+    # Claims decodificadas uma única vez por requisição e compartilhadas com o ApiLoggingMiddleware
+    claims = get_request_claims(request.scope, token)
+    token_data: Optional[TokenData] = verify_token_claims(claims, credentials_exception)
     if not token_data or token_data.token_type != "access":
         raise credentials_exception
     
@@ -24,10 +28,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         raise credentials_exception
 
     user_id_uuid = uuid.UUID(token_data.user_id) # Converter string para UUID
-    user = await supabase_service.get_user_by_id(user_id_uuid) # Usar a instância
+    user = get_cached_user_principal(user_id_uuid)
+    if user is MISSING:
+        user = await get_supabase_service().get_user_by_id(user_id_uuid) # Cacheado pelo serviço (sem desfazer uma invalidação)
 
     if user is None:
         raise credentials_exception
+    if token_data.session_epoch < user.session_epoch: # Emitido antes de um "logout de todas as sessões"
+        raise credentials_exception
     
     # Se a role estiver no token E for confiável (ex: você acabou de gerar o token)
     # você pode usar token_data.role. Caso contrário, busque do banco.
@@ -1,10 +1,11 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple # Importar Tuple
-from jose import jwt, JWTError
+from app.auth.key_manager import signing_keys
 from app.core.config import settings
-from app.auth.schemas import TokenData # Supondo que TokenData está em app.auth.schemas
+from app.auth.schemas import TokenData, SESSION_EPOCH_CLAIM # Supondo que TokenData está em app.auth.schemas
+from app.auth.request_claims import RequestClaims, decode_token_claims
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, session_epoch: int = 0) -> str:
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
@@ -15,12 +16,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({
         "exp": expire,
         "iat": datetime.now(timezone.utc),
-        "type": "access"
+        "type": "access",
+        SESSION_EPOCH_CLAIM: session_epoch, # Época de sessão do usuário na emissão
     })
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_PRIVATE_KEY_CONTENT, algorithm=settings.JWT_ALGORITHM)
+    encoded_jwt = signing_keys.sign(to_encode) # Chave já parseada + 'kid' no header
     return encoded_jwt
 
-def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> Tuple[str, datetime]:
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None, session_epoch: int = 0) -> Tuple[str, datetime]:
     """
     Cria um refresh token JWT.
     Retorna o token string e seu timestamp de expiração.
@@ -36,43 +38,32 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None)
     to_encode.update({
         "exp": expire_at_utc,
         "iat": current_time_utc,
-        "type": "refresh"
+        "type": "refresh",
+        SESSION_EPOCH_CLAIM: session_epoch,
     })
     # O JTI (JWT ID) pode ser útil para identificar unicamente um token se necessário
     # import uuid
     # to_encode.update({"jti": str(uuid.uuid4())}) 
     
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_PRIVATE_KEY_CONTENT, algorithm=settings.JWT_ALGORITHM)
+    encoded_jwt = signing_keys.sign(to_encode) # Chave já parseada + 'kid' no header
     return encoded_jwt, expire_at_utc
 
-def verify_token(token: str, credentials_exception: Exception) -> Optional[TokenData]:
+def verify_token_claims(claims: RequestClaims, credentials_exception: Exception) -> TokenData:
     """
-    Verifica um token JWT (access ou refresh).
+    Valida claims já decodificadas (ver app.auth.request_claims) de um token de usuário.
     Retorna TokenData se válido, caso contrário, levanta a credentials_exception.
     """
-    try:
-        payload = jwt.decode(
-            token,
-            settings.JWT_PUBLIC_KEY_CONTENT,
-            algorithms=[settings.JWT_ALGORITHM],
-            # options={"verify_aud": False} # Se você não usar 'aud' (audience)
-        )
-        user_id: Optional[str] = payload.get("sub") # 'sub' (subject) é o ID do usuário
-        token_type: Optional[str] = payload.get("type")
-        
-        # Validações básicas do payload
-        if user_id is None or token_type is None:
-            # print("Debug: verify_token - user_id ou token_type ausente no payload.") # Debug
-            raise credentials_exception
-        
-        # Adicionando role ao TokenData se presente no payload
-        role: Optional[str] = payload.get("role") # 'role' é específico para seu access token
-        
-        return TokenData(user_id=user_id, token_type=token_type, role=role)
-    
-    except JWTError as e:
-        # print(f"Debug: verify_token - JWTError: {e}, Token: {token[:20]}...") # Debug
+    if not claims.valid:
         raise credentials_exception
-    except Exception as e: # Captura outras exceções inesperadas durante a decodificação
-        # print(f"Debug: verify_token - Erro inesperado: {e}") # Debug
+    # Validações básicas do payload
+    if claims.subject is None or claims.token_type is None:
         raise credentials_exception
+    # 'role' é específico para seu access token
+    return TokenData(user_id=claims.subject, token_type=claims.token_type, role=claims.role, session_epoch=claims.session_epoch)
+
+def verify_token(token: str, credentials_exception: Exception) -> Optional[TokenData]:
+    """
+    Verifica um token JWT (access ou refresh).
+    Retorna TokenData se válido, caso contrário, levanta a credentials_exception.
+    """
+    return verify_token_claims(decode_token_claims(token), credentials_exception)
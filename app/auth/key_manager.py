@@ -0,0 +1,102 @@
+# app/auth/key_manager.py
+import base64
+import hashlib
+import json
+from typing import Optional, Dict, Any
+
+from jose import jwk, jwt, JWTError
+from jose.backends.base import Key
+
+from app.core.config import settings
+
+
+def _key_thumbprint(public_jwk: Dict[str, Any]) -> str:
+    # RFC 7638: SHA-256 dos membros obrigatórios da JWK, em JSON canônico
+    required = {name: public_jwk[name] for name in ("e", "kty", "n") if name in public_jwk}
+    canonical = json.dumps(required, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(hashlib.sha256(canonical).digest()).rstrip(b"=").decode("ascii")
+
+
+class SigningKeyManager:
+    """
+    Mantém as chaves JWT já parseadas (uma vez, no startup) em vez de repassar o PEM
+    para o python-jose a cada assinatura/verificação.
+    - Assina com a chave ativa e coloca o 'kid' no header do token.
+    - Verifica escolhendo a chave pelo 'kid' (várias chaves ativas => rotação sem downtime).
+      Tokens sem 'kid' (emitidos antes da rotação) usam a chave ativa.
+    """
+
+    def __init__(self, algorithm: str):
+        self.algorithm = algorithm
+        self.signing_kid: Optional[str] = None
+        self._signing_key: Optional[Key] = None
+        self._verification_keys: Dict[str, Key] = {}
+        self._jwks: Dict[str, Any] = {"keys": []}
+        self._loaded = False
+
+    @property
+    def is_asymmetric(self) -> bool:
+        return not self.algorithm.upper().startswith("HS")
+
+    def load(self, private_key_pem: str, public_key_pem: str, active_kid: Optional[str] = None, additional_public_keys: Optional[Dict[str, str]] = None) -> None:
+        signing_key = jwk.construct(private_key_pem, self.algorithm)
+        public_key = jwk.construct(public_key_pem, self.algorithm)
+
+        verification_keys: Dict[str, Key] = {}
+        jwks_entries = []
+        if self.is_asymmetric:
+            public_jwk = public_key.to_dict()
+            kid = active_kid or _key_thumbprint(public_jwk)
+            jwks_entries.append({**public_jwk, "kid": kid, "use": "sig"})
+        else:
+            kid = active_kid or "default" # Chave simétrica: nunca é publicada no JWKS
+        verification_keys[kid] = public_key
+
+        for extra_kid, pem in (additional_public_keys or {}).items():
+            extra_key = jwk.construct(pem, self.algorithm)
+            verification_keys[extra_kid] = extra_key
+            if self.is_asymmetric:
+                jwks_entries.append({**extra_key.to_dict(), "kid": extra_kid, "use": "sig"})
+
+        self.signing_kid = kid
+        self._signing_key = signing_key
+        self._verification_keys = verification_keys
+        self._jwks = {"keys": jwks_entries}
+        self._loaded = True
+        print(f"INFO:     Chaves JWT carregadas. kid ativo='{kid}', chaves de verificação={list(verification_keys)}.")
+
+    def load_from_settings(self) -> None:
+        additional_keys: Dict[str, str] = {}
+        if settings.JWT_ADDITIONAL_PUBLIC_KEYS.strip():
+            additional_keys = json.loads(settings.JWT_ADDITIONAL_PUBLIC_KEYS)
+        self.load(
+            settings.JWT_PRIVATE_KEY_CONTENT,
+            settings.JWT_PUBLIC_KEY_CONTENT,
+            active_kid=settings.JWT_KEY_ID,
+            additional_public_keys=additional_keys,
+        )
+
+    def ensure_loaded(self) -> None:
+        # Normalmente carregado no lifespan; o fallback preguiçoso cobre scripts e imports diretos
+        if not self._loaded:
+            self.load_from_settings()
+
+    def sign(self, claims: Dict[str, Any]) -> str:
+        self.ensure_loaded()
+        return jwt.encode(claims, self._signing_key, algorithm=self.algorithm, headers={"kid": self.signing_kid})
+
+    def decode(self, token: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Verifica e decodifica o token. Levanta JWTError se inválido ou se o 'kid' for desconhecido."""
+        self.ensure_loaded()
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._verification_keys.get(kid or self.signing_kid)
+        if key is None:
+            raise JWTError(f"Unknown key id: {kid}")
+        return jwt.decode(token, key, algorithms=[self.algorithm], options=options)
+
+    def jwks(self) -> Dict[str, Any]:
+        self.ensure_loaded()
+        return self._jwks
+
+
+signing_keys = SigningKeyManager(algorithm=settings.JWT_ALGORITHM)
@@ -0,0 +1,64 @@
+# app/auth/principal_cache.py
+import uuid
+from typing import Optional, Union
+
+from app.core.config import settings
+from app.models.admin import Administrator
+from app.models.user import User
+from app.utils.ttl_cache import TTLCache, MISSING
+
+# Usuários (User) resolvidos em get_current_user, por user_id.
+# None também é cacheado (cache negativo) para IDs desconhecidos, com TTL próprio e menor.
+user_principal_cache = TTLCache(
+    max_size=settings.USER_PRINCIPAL_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_PRINCIPAL_CACHE_TTL_SECONDS,
+    name="user_principals",
+)
+
+
+def get_cached_user_principal(user_id: Union[str, uuid.UUID]):
+    """Retorna o User cacheado, None (ID desconhecido, cache negativo) ou MISSING."""
+    return user_principal_cache.get(str(user_id))
+
+
+def cache_user_principal(user_id: Union[str, uuid.UUID], user: Optional[User], generation: Optional[int] = None) -> None:
+    """`generation`: user_principal_cache.generation() pego antes da busca (não recoloca um usuário invalidado no meio tempo)."""
+    if user is None:
+        user_principal_cache.set(str(user_id), None, ttl_seconds=settings.USER_PRINCIPAL_NEGATIVE_CACHE_TTL_SECONDS, generation=generation)
+    else:
+        user_principal_cache.set(str(user_id), user, generation=generation)
+
+
+def invalidate_user_principal(user_id: Union[str, uuid.UUID]) -> bool:
+    return user_principal_cache.invalidate(str(user_id))
+
+
+# Administradores resolvidos em admin_dependencies.get_current_admin_user, por admin_id.
+# Invalidado pelo AdminService em qualquer alteração do admin (status, senha, HWID, ...).
+# Obs.: a invalidação é por processo; com vários workers, os demais enxergam a mudança em até ADMIN_PRINCIPAL_CACHE_TTL_SECONDS.
+# No mesmo processo, uma busca iniciada antes da alteração não recoloca o admin antigo (set com generation).
+admin_principal_cache = TTLCache(
+    max_size=settings.ADMIN_PRINCIPAL_CACHE_MAX_SIZE,
+    ttl_seconds=settings.ADMIN_PRINCIPAL_CACHE_TTL_SECONDS,
+    name="admin_principals",
+)
+
+
+def get_cached_admin_principal(admin_id: Union[str, uuid.UUID]) -> Optional[Administrator]:
+    cached = admin_principal_cache.get(str(admin_id))
+    return None if cached is MISSING else cached
+
+
+def cache_admin_principal(admin: Administrator, generation: Optional[int] = None) -> None:
+    admin_principal_cache.set(str(admin.id), admin, generation=generation)
+
+
+def invalidate_admin_principal(admin_id: Union[str, uuid.UUID]) -> bool:
+    return admin_principal_cache.invalidate(str(admin_id))
+
+
+__all__ = [
+    "user_principal_cache", "get_cached_user_principal", "cache_user_principal", "invalidate_user_principal",
+    "admin_principal_cache", "get_cached_admin_principal", "cache_admin_principal", "invalidate_admin_principal",
+    "MISSING",
+]
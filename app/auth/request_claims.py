@@ -0,0 +1,97 @@
+# app/auth/request_claims.py
+from typing import Optional
+
+from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.types import Scope
+
+from app.auth.key_manager import signing_keys
+from app.auth.schemas import SESSION_EPOCH_CLAIM
+from app.auth.token_cache import CachedTokenData, cache_token_data, get_cached_token_data, token_data_from_payload
+from app.schemas.admin_schemas import AdminTokenData
+
+# Chave usada em scope["state"] (o mesmo dict por trás de request.state)
+AUTH_CLAIMS_STATE_KEY = "auth_claims"
+
+USER_TOKEN_TYPES = ("access", "refresh")
+ADMIN_TOKEN_TYPES = ("admin_access",)
+
+
+class RequestClaims(BaseModel):
+    """
+    Claims do bearer token de UMA requisição, decodificadas e verificadas uma única vez.
+    Compartilhadas entre o middleware de logging e as dependências de autenticação.
+    """
+    token: Optional[str] = None
+    valid: bool = False
+    subject: Optional[str] = None     # 'sub': user_id ou admin_id
+    token_type: Optional[str] = None  # 'type': access, refresh ou admin_access
+    role: Optional[str] = None
+    session_epoch: int = 0            # 'sep': época de sessão do usuário na emissão
+
+    @classmethod
+    def from_token_data(cls, token: str, token_data: CachedTokenData) -> "RequestClaims":
+        if isinstance(token_data, AdminTokenData):
+            return cls(token=token, valid=True, subject=token_data.admin_id, token_type="admin_access")
+        return cls(
+            token=token, valid=True, subject=token_data.user_id, token_type=token_data.token_type,
+            role=token_data.role, session_epoch=token_data.session_epoch,
+        )
+
+    @property
+    def is_admin_token(self) -> bool:
+        return self.valid and self.token_type in ADMIN_TOKEN_TYPES
+
+    @property
+    def is_user_token(self) -> bool:
+        return self.valid and self.token_type in USER_TOKEN_TYPES
+
+
+def extract_bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    scheme, _, credentials = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not credentials:
+        return None
+    return credentials.strip()
+
+
+def decode_token_claims(token: str) -> RequestClaims:
+    """
+    Verifica a assinatura do token (uma vez) e monta as claims. Token inválido => valid=False.
+    Tokens já verificados vêm do cache (sem custo de criptografia) até o seu 'exp'.
+    """
+    cached = get_cached_token_data(token)
+    if cached is not None:
+        return RequestClaims.from_token_data(token, cached)
+    try:
+        payload = signing_keys.decode(token) # Chave escolhida pelo 'kid', parseada uma única vez
+    except Exception: # JWTError ou qualquer falha com um header malformado: "sem claims", como o verify_token antigo.
+        # Também roda no ApiLoggingMiddleware para qualquer Authorization recebido, que não pode virar um 500.
+        return RequestClaims(token=token)
+    cache_token_data(token, token_data_from_payload(payload), payload.get("exp"))
+    return RequestClaims(
+        token=token,
+        valid=True,
+        subject=payload.get("sub"),
+        token_type=payload.get("type"),
+        role=payload.get("role"),
+        session_epoch=payload.get(SESSION_EPOCH_CLAIM) or 0,
+    )
+
+
+def get_request_claims(scope: Scope, token: Optional[str] = None) -> RequestClaims:
+    """
+    Retorna as claims da requisição, decodificando o token apenas na primeira chamada.
+    Sem `token`, usa o header Authorization do próprio scope.
+    """
+    state = scope.setdefault("state", {})
+    claims: Optional[RequestClaims] = state.get(AUTH_CLAIMS_STATE_KEY)
+    if claims is not None and (token is None or claims.token == token):
+        return claims
+
+    if token is None:
+        token = extract_bearer_token(Headers(scope=scope).get("authorization"))
+    claims = decode_token_claims(token) if token else RequestClaims()
+    state[AUTH_CLAIMS_STATE_KEY] = claims
+    return claims
@@ -0,0 +1,133 @@
+# app/auth/revoked_token_filter.py
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.utils.bloom_filter import BloomFilter
+from app.utils.security import hash_token
+
+
+class RevokedTokenFilter:
+    """
+    Filtro de Bloom em memória com os hashes (SHA-256) de refresh tokens revogados explicitamente
+    (logout de um token, revogação por ID, recusas da RPC de rotação), consultado por /auth/refresh e /auth/logout
+    antes do banco: replays de tokens já revogados são recusados (refresh) ou ignorados (logout) sem query.
+    - Sem falso negativo: se o filtro diz "não revogado", o fluxo normal segue para o banco.
+    - Falso positivo (~REVOKED_TOKEN_FILTER_FALSE_POSITIVE_RATE) recusa um token válido no refresh (o cliente refaz
+      o login) e, no logout, deixa de revogá-lo no banco (o token segue válido até expirar ou um logout de todas as sessões).
+    - Bloom não remove itens: a reconstrução periódica a partir da view revoked_refresh_token_hashes
+      (sql/revoked_refresh_tokens.sql) descarta os expirados e pega revogações de outros workers.
+    Tokens revogados pela rotação NÃO entram: o replay deles precisa chegar ao banco para a
+    detecção de reuso revogar a família.
+    """
+
+    def __init__(self, enabled: bool, capacity: int, false_positive_rate: float, rebuild_interval_seconds: float):
+        self.enabled = enabled
+        self.capacity = max(1, capacity)
+        self.false_positive_rate = false_positive_rate
+        self.rebuild_interval_seconds = max(10.0, rebuild_interval_seconds)
+        self._filter = BloomFilter(self.capacity, false_positive_rate)
+        self._pending: Optional[List[str]] = None # Revogações que chegam durante uma reconstrução
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.hits = 0
+        self.added = 0
+        self.rebuilds = 0
+        self.rebuild_errors = 0
+        self.last_rebuild_at: Optional[float] = None
+        self.last_rebuild_ms: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def add_hashes(self, token_hashes: Iterable[Optional[str]]) -> None:
+        """Chamado pelo SupabaseService a cada revogação explícita (hashes como gravados em refresh_tokens.token_hash)."""
+        if not self.enabled:
+            return
+        for token_hash in token_hashes:
+            if not token_hash:
+                continue
+            self._filter.add(token_hash)
+            if self._pending is not None:
+                self._pending.append(token_hash)
+            self.added += 1
+
+    def might_be_revoked(self, token_str: str) -> bool:
+        if not self.enabled:
+            return False
+        self.checks += 1
+        if hash_token(token_str) in self._filter:
+            self.hits += 1
+            return True
+        return False
+
+    async def rebuild(self) -> bool:
+        from app.services import get_supabase_service
+        started = time.perf_counter()
+        self._pending = []
+        try:
+            token_hashes = await get_supabase_service().list_revoked_refresh_token_hashes()
+        except Exception as e:
+            self.rebuild_errors += 1
+            print(f"ERRO ao reconstruir o filtro de refresh tokens revogados: {e}")
+            return False
+        finally:
+            pending, self._pending = self._pending, None
+        # Folga de 2x sobre o volume atual: acima da capacidade a taxa de falsos positivos sobe rápido
+        rebuilt = BloomFilter(max(self.capacity, 2 * len(token_hashes)), self.false_positive_rate)
+        for token_hash in token_hashes:
+            rebuilt.add(token_hash)
+        for token_hash in pending: # Revogadas depois da leitura da view
+            rebuilt.add(token_hash)
+        self._filter = rebuilt
+        self.rebuilds += 1
+        self.last_rebuild_at = time.time()
+        self.last_rebuild_ms = round((time.perf_counter() - started) * 1000, 1)
+        if rebuilt.count > self.capacity:
+            print(f"AVISO: {rebuilt.count} refresh tokens revogados no filtro, acima de REVOKED_TOKEN_FILTER_CAPACITY={self.capacity}.")
+        return True
+
+    async def start(self) -> None:
+        if not self.enabled or self.running:
+            return
+        self._task = asyncio.create_task(self._run(), name="revoked-token-filter-rebuild")
+        print(f"INFO:     Filtro de refresh tokens revogados iniciado (reconstrução a cada {self.rebuild_interval_seconds:.0f}s).")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True: # Primeira carga logo no startup; até lá só as revogações deste processo estão no filtro
+            await self.rebuild()
+            await asyncio.sleep(self.rebuild_interval_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            **self._filter.stats(),
+            "checks": self.checks,
+            "hits": self.hits,
+            "added_since_start": self.added,
+            "rebuilds": self.rebuilds,
+            "rebuild_errors": self.rebuild_errors,
+            "rebuild_interval_seconds": self.rebuild_interval_seconds,
+            "last_rebuild_age_seconds": round(time.time() - self.last_rebuild_at, 1) if self.last_rebuild_at else None,
+            "last_rebuild_ms": self.last_rebuild_ms,
+        }
+
+
+revoked_token_filter = RevokedTokenFilter(
+    enabled=settings.REVOKED_TOKEN_FILTER_ENABLED,
+    capacity=settings.REVOKED_TOKEN_FILTER_CAPACITY,
+    false_positive_rate=settings.REVOKED_TOKEN_FILTER_FALSE_POSITIVE_RATE,
+    rebuild_interval_seconds=settings.REVOKED_TOKEN_FILTER_REBUILD_INTERVAL_SECONDS,
+)
@@ -6,10 +6,15 @@ class Token(BaseModel):
     refresh_token: str
     token_type: str
 
+# Claim com a época de sessão do usuário (ver SupabaseService.revoke_all_user_refresh_tokens).
+# Tokens sem a claim (emitidos antes dela existir) valem como época 0.
+SESSION_EPOCH_CLAIM = "sep"
+
 class TokenData(BaseModel):
     user_id: Optional[str] = None
     token_type: Optional[str] = None
     role: Optional[str] = None # Adicionado para checagem de admin
+    session_epoch: int = 0
 
 class UserLoginSchema(BaseModel):
     email: EmailStr
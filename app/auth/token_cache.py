@@ -0,0 +1,54 @@
+# app/auth/token_cache.py
+import time
+from typing import Optional, Union, Dict, Any
+
+from app.auth.schemas import TokenData, SESSION_EPOCH_CLAIM
+from app.core.config import settings
+from app.schemas.admin_schemas import AdminTokenData
+from app.utils.security import hash_token
+from app.utils.ttl_cache import TTLCache, MISSING
+
+CachedTokenData = Union[TokenData, AdminTokenData]
+
+# Tokens já verificados (assinatura RSA ok), indexados pelo SHA-256 do token.
+# O TTL de cada entrada nunca passa do 'exp' do próprio token.
+verified_token_cache = TTLCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl_seconds=settings.TOKEN_CACHE_MAX_TTL_SECONDS,
+    name="verified_tokens",
+)
+
+
+def token_data_from_payload(payload: Dict[str, Any]) -> CachedTokenData:
+    if payload.get("type") == "admin_access":
+        return AdminTokenData(admin_id=payload.get("sub"))
+    return TokenData(
+        user_id=payload.get("sub"), token_type=payload.get("type"), role=payload.get("role"),
+        session_epoch=payload.get(SESSION_EPOCH_CLAIM) or 0,
+    )
+
+
+def get_cached_token_data(token: str) -> Optional[CachedTokenData]:
+    cached = verified_token_cache.get(hash_token(token))
+    return None if cached is MISSING else cached
+
+
+def cache_token_data(token: str, token_data: CachedTokenData, exp: Optional[int]) -> None:
+    if exp is None:
+        return # Sem 'exp' não há como limitar o TTL com segurança
+    verified_token_cache.set(hash_token(token), token_data, ttl_seconds=exp - time.time())
+
+
+def invalidate_token(token: Optional[str]) -> bool:
+    """Hook de logout: remove o token do cache para que a próxima verificação passe pela criptografia."""
+    if not token:
+        return False
+    return verified_token_cache.invalidate(hash_token(token))
+
+
+def invalidate_subject(subject_id: str) -> int:
+    """Remove todos os tokens cacheados de um usuário/admin (ex: logout de todas as sessões)."""
+    subject_id = str(subject_id)
+    return verified_token_cache.invalidate_where(
+        lambda _key, data: (data.admin_id if isinstance(data, AdminTokenData) else data.user_id) == subject_id
+    )
@@ -1,123 +1,107 @@
 # app/core/logging_middleware.py
 import time
-import json
-from typing import Optional, Any, Dict, Callable, Awaitable
+from typing import Optional, Any, Dict
 
-try:
-    from starlette.middleware.base import BaseHTTPMiddleware, DispatchFunction
-    CALL_NEXT_TYPE = DispatchFunction
-except ImportError:
-    CALL_NEXT_TYPE = Callable[[Request], Awaitable[Response]]
-    from starlette.middleware.base import BaseHTTPMiddleware
-
-from starlette.types import ASGIApp
-from starlette.requests import Request
-from starlette.responses import Response
-from jose import jwt, JWTError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.auth.request_claims import get_request_claims
 from app.core.config import settings
-ADMIN_JWT_ALGORITHM = getattr(settings, 'ADMIN_JWT_ALGORITHM', settings.JWT_ALGORITHM)
-USER_JWT_ALGORITHM = settings.JWT_ALGORITHM
+from app.services.log_sink import api_log_sink
+from app.services.traffic_rollups import traffic_rollups
 
 
-async def get_request_body_for_log(request: Request) -> Optional[Dict[str, Any]]:
+async def get_request_body_for_log(scope: Scope) -> Optional[Dict[str, Any]]:
     # Omitindo a leitura real do corpo para evitar consumir o stream e por segurança/simplicidade
-    return None 
-
-def get_id_from_token(token_str: Optional[str], key: str, algorithm: str) -> Optional[str]:
-    if not token_str:
-        return None
-    try:
-        if token_str.startswith("Bearer "):
-            token_str = token_str.split("Bearer ", 1)[1]
-        
-        payload = jwt.decode(token_str, key, algorithms=[algorithm], options={"verify_aud": False})
-        return payload.get("sub") 
-    except JWTError:
-        return None
-    except Exception:
-        return None
-
-
-class ApiLoggingMiddleware(BaseHTTPMiddleware):
+    return None
+
+
+class ApiLoggingMiddleware:
+    """
+    Middleware ASGI puro: intercepta o `send` para capturar status e tempo de processamento,
+    sem as tasks e memory streams extras do BaseHTTPMiddleware.
+    """
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
-
-    async def dispatch(self, request: Request, call_next: CALL_NEXT_TYPE) -> Response:
-        start_time = time.time()
-        
-        request_body_log = await get_request_body_for_log(request)
-        response: Optional[Response] = None 
-        status_code_for_log = 500 
-        process_time = 0.0
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code_for_log = 500
         error_in_app_message: Optional[str] = None
 
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code_for_log
+            if message["type"] == "http.response.start":
+                status_code_for_log = message["status"]
+            await send(message)
+
         try:
-            response = await call_next(request)
-            process_time = (time.time() - start_time) * 1000
-            status_code_for_log = response.status_code
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            process_time = (time.time() - start_time) * 1000
             error_in_app_message = str(e)
-            status_code_for_log = 500 
-            print(f"ERRO NA APLICAÇÃO DURANTE REQUEST (Middleware): {e} para {request.method} {request.url.path}")
-            raise e 
-
-        if response is None: # Cenário de fallback improvável
-            print(f"AVISO: Nenhuma resposta foi gerada por call_next para {request.method} {request.url.path}. Retornando 500.")
-            response = Response("Internal server error after middleware processing.", status_code=500)
             status_code_for_log = 500
-            if not error_in_app_message: error_in_app_message = "No response from application stack."
+            print(f"ERRO NA APLICAÇÃO DURANTE REQUEST (Middleware): {e} para {scope.get('method')} {scope.get('path')}")
+            raise
+        finally:
+            process_time = (time.perf_counter() - start_time) * 1000
+            await self._log_request(scope, status_code_for_log, process_time, error_in_app_message)
+
+    async def _log_request(self, scope: Scope, status_code_for_log: int, process_time: float, error_in_app_message: Optional[str]) -> None:
+        headers = Headers(scope=scope)
+        path_for_tags: str = scope.get("path", "")
+        client = scope.get("client")
+        request_body_log = await get_request_body_for_log(scope)
 
         user_id_from_token: Optional[str] = None
         admin_id_from_token: Optional[str] = None
-        auth_header = request.headers.get("authorization")
 
-        if auth_header:
-            admin_id_from_token = get_id_from_token(auth_header, settings.JWT_PUBLIC_KEY_CONTENT, ADMIN_JWT_ALGORITHM)
-            if not admin_id_from_token:
-                user_id_from_token = get_id_from_token(auth_header, settings.JWT_PUBLIC_KEY_CONTENT, USER_JWT_ALGORITHM)
-        
+        if headers.get("authorization"):
+            # Reaproveita as claims já verificadas pela dependência de auth (ou decodifica uma única vez aqui).
+            # O tipo do token vem da claim 'type', sem decodificação por tentativa e erro.
+            claims = get_request_claims(scope)
+            if claims.is_admin_token:
+                admin_id_from_token = claims.subject
+            elif claims.is_user_token:
+                user_id_from_token = claims.subject
+
         log_entry: Dict[str, Any] = {
-            "method": request.method, "path": request.url.path, "status_code": status_code_for_log,
-            "client_host": request.client.host if request.client else "unknown",
-            "user_agent": request.headers.get("user-agent"), "user_id": user_id_from_token,
-            "admin_id": admin_id_from_token, "request_body": request_body_log, 
+            "method": scope.get("method"), "path": path_for_tags, "status_code": status_code_for_log,
+            "client_host": client[0] if client else "unknown",
+            "user_agent": headers.get("user-agent"), "user_id": user_id_from_token,
+            "admin_id": admin_id_from_token, "request_body": request_body_log,
             "processing_time_ms": round(process_time, 2), "error_message": error_in_app_message,
             "tags": ["api_request"]
         }
-        
-        path_for_tags = request.url.path
-        if path_for_tags.startswith(f"{settings.API_V1_STR}/admin-panel"): log_entry["tags"].append("admin_panel_api")
-        elif path_for_tags.startswith(f"{settings.API_V1_STR}/auth"): log_entry["tags"].append("user_auth_api")
-        elif path_for_tags.startswith(f"{settings.API_V1_STR}/4L8FJYy4eWGL_admin"): log_entry["tags"].append("original_admin_api")
+
+        api_area = "other_api"
+        if path_for_tags.startswith(f"{settings.API_V1_STR}/admin-panel"): api_area = "admin_panel_api"
+        elif path_for_tags.startswith(f"{settings.API_V1_STR}/auth"): api_area = "user_auth_api"
+        elif path_for_tags.startswith(f"{settings.API_V1_STR}/4L8FJYy4eWGL_admin"): api_area = "original_admin_api"
+        if api_area != "other_api": log_entry["tags"].append(api_area)
 
         if status_code_for_log >= 500: log_entry["tags"].append("error_server")
         elif status_code_for_log >= 400: log_entry["tags"].append("error_client")
-        
+
+        # Rollup por minuto: template da rota (ex: /administrators/{admin_id}), não o path bruto, para limitar a cardinalidade
+        route = scope.get("route")
+        traffic_rollups.record(getattr(route, "path", None), scope.get("method"), status_code_for_log, process_time, api_area)
+
         try:
-            from app.services.supabase_service import supabase_service # Importar aqui para tentar mitigar startup issues
-            
-            if supabase_service and supabase_service.client:
-                current_user_id = log_entry.get("user_id")
-                if current_user_id and not isinstance(current_user_id, str): log_entry["user_id"] = str(current_user_id)
-                elif current_user_id is None: log_entry["user_id"] = None
-                current_admin_id = log_entry.get("admin_id")
-                if current_admin_id and not isinstance(current_admin_id, str): log_entry["admin_id"] = str(current_admin_id)
-                elif current_admin_id is None: log_entry["admin_id"] = None
-                if log_entry.get("request_body") is None: log_entry["request_body"] = None 
-                
-                print(f"DEBUG LOGGING - Payload para Inserção em api_logs: {json.dumps(log_entry, default=str)}")
-                
-                # REMOVIDO 'await' DA LINHA ABAIXO
-                supabase_service.client.table("api_logs").insert(log_entry).execute()
-            else:
-                print("AVISO DE LOGGING: Cliente Supabase não disponível, log da API não será salvo.")
+            current_user_id = log_entry.get("user_id")
+            if current_user_id and not isinstance(current_user_id, str): log_entry["user_id"] = str(current_user_id)
+            elif current_user_id is None: log_entry["user_id"] = None
+            current_admin_id = log_entry.get("admin_id")
+            if current_admin_id and not isinstance(current_admin_id, str): log_entry["admin_id"] = str(current_admin_id)
+            elif current_admin_id is None: log_entry["admin_id"] = None
+            if log_entry.get("request_body") is None: log_entry["request_body"] = None
+
+            # A inserção em api_logs acontece em lote no ApiLogSink, fora do caminho da resposta
+            await api_log_sink.enqueue(log_entry)
         except Exception as log_e:
-            print(f"ERRO CRÍTICO AO SALVAR LOG DA API: {log_e}")
-            if hasattr(log_e, 'message') and log_e.message: print(f"   Detalhe do APIError (se houver): {log_e.message}")
-            if hasattr(log_e, 'hint') and log_e.hint: print(f"   Dica do APIError (se houver): {log_e.hint}")
-            if hasattr(log_e, 'details') and log_e.details: print(f"   Detalhes adicionais do APIError (se houver): {log_e.details}")
+            print(f"ERRO CRÍTICO AO ENFILEIRAR LOG DA API: {log_e}")
             import traceback
             traceback.print_exc()
-        return response
@@ -0,0 +1,33 @@
+# app/core/security_headers_middleware.py
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class SecurityHeadersMiddleware:
+    """
+    Middleware ASGI puro que injeta os headers de segurança básicos diretamente
+    na mensagem `http.response.start`, sem re-empacotar a resposta.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        is_https = scope.get("scheme") == "https"
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-Content-Type-Options"] = "nosniff"
+                headers["X-Frame-Options"] = "DENY"
+                if is_https:
+                    headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+                # CSP é complexa e melhor configurada com mais granularidade,
+                # ou através de um gateway/CDN se possível.
+                # headers["Content-Security-Policy"] = "default-src 'self'; ..."
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,106 @@
+# app/core/warmup.py
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class StartupWarmup:
+    """
+    Aquecimento opcional executado em segundo plano logo após o startup (lifespan):
+    paga os custos de "primeira vez" (parse das chaves JWT, conexões TLS/pool, bcrypt)
+    antes que um usuário real pague. O probe /ready só responde 200 quando termina.
+    Falhas de uma etapa são registradas mas não bloqueiam as demais nem a prontidão.
+    """
+
+    def __init__(self, enabled: bool, timeout_seconds: float):
+        self.enabled = enabled
+        self.timeout_seconds = max(0.1, timeout_seconds)
+        self._task: Optional[asyncio.Task] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        if not self.enabled:
+            self.finished_at = self.started_at
+            print("INFO:     Warmup desativado (STARTUP_WARMUP_ENABLED=false). Pronto imediatamente.")
+            return
+        self._task = asyncio.create_task(self._run(), name="startup-warmup")
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def _steps(self) -> List[Tuple[str, Callable[[], Awaitable[None]]]]:
+        return [
+            ("jwt_keys", _warm_jwt_keys),
+            ("database", _warm_database),
+            ("password_hasher", _warm_password_hasher),
+            ("geoip_database", _warm_geoip_database),
+        ]
+
+    async def _run(self) -> None:
+        for name, step in self._steps():
+            step_started = time.perf_counter()
+            try:
+                await asyncio.wait_for(step(), self.timeout_seconds)
+                self.steps[name] = {"ok": True, "duration_ms": round((time.perf_counter() - step_started) * 1000, 2)}
+            except Exception as e:
+                self.steps[name] = {"ok": False, "duration_ms": round((time.perf_counter() - step_started) * 1000, 2), "error": str(e) or type(e).__name__}
+                print(f"AVISO: Warmup '{name}' falhou: {e}")
+        self.finished_at = time.perf_counter()
+        print(f"INFO:     Warmup concluído em {round((self.finished_at - self.started_at) * 1000, 2)}ms: {self.steps}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "duration_ms": round((self.finished_at - self.started_at) * 1000, 2) if self.ready and self.started_at else None,
+            "steps": self.steps,
+        }
+
+
+async def _warm_jwt_keys() -> None:
+    from app.auth.key_manager import signing_keys
+    signing_keys.ensure_loaded() # Parseia as chaves PEM uma única vez
+    # Um ciclo assinar/verificar inicializa o backend criptográfico do python-jose
+    token = signing_keys.sign({"sub": "warmup", "type": "warmup", "exp": datetime.now(timezone.utc) + timedelta(seconds=30)})
+    signing_keys.decode(token)
+
+
+async def _warm_database() -> None:
+    from app.services import get_supabase_service
+    await get_supabase_service().warmup()
+
+
+async def _warm_password_hasher() -> None:
+    from app.services.password_hashing_service import password_hasher
+    await password_hasher.warmup()
+
+
+async def _warm_geoip_database() -> None:
+    from app.services.geoip_service import GEOIP_PROVIDER_MMDB
+    from app.services.geoip_local import mmdb_resolver
+    if settings.GEOIP_PROVIDER != GEOIP_PROVIDER_MMDB:
+        return
+    if not mmdb_resolver.ensure_loaded(): # Abre (mmap) a base antes do primeiro login
+        raise RuntimeError(f"base GeoIP local indisponível em '{mmdb_resolver.path}'")
+
+
+startup_warmup = StartupWarmup(
+    enabled=settings.STARTUP_WARMUP_ENABLED,
+    timeout_seconds=settings.STARTUP_WARMUP_TIMEOUT_SECONDS,
+)
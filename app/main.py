@@ -6,15 +6,24 @@ from pathlib import Path
 import os
 
 from app.core.config import settings
-from app.routers import auth_router, admin_router
+from app.routers import auth_router, admin_router, jwks_router, admin_stats_router
 from app.routers.admin_panel_router import admin_panel_router
 from app.utils.rate_limiter import limiter
-from slowapi.errors import RateLimitExceeded
-from slowapi import _rate_limit_exceeded_handler
 from contextlib import asynccontextmanager
 from app.auth.dependencies import get_current_active_user
 from app.models.user import User as UserModel
 from app.core.logging_middleware import ApiLoggingMiddleware # << NOVO IMPORT
+from app.core.security_headers_middleware import SecurityHeadersMiddleware
+from app.services.log_sink import api_log_sink
+from app.services.traffic_rollups import traffic_rollups
+from app.services.geo_enrichment import geo_enrichment
+from app.services.geoip_local import mmdb_resolver
+from app.services.geoip_service import ipapi_client
+from app.auth.revoked_token_filter import revoked_token_filter
+from app.services import init_services, close_services
+from app.core.warmup import startup_warmup
+from app.services.password_hashing_service import password_hasher, PasswordHashingBusyError
+from fastapi.responses import JSONResponse
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 FRONTEND_ADMIN_DIR = BASE_DIR / "admin_frontend"
@@ -22,16 +31,26 @@ FRONTEND_ADMIN_DIR = BASE_DIR / "admin_frontend"
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print(f"INFO:     Aplicação '{settings.APP_NAME}' iniciando...")
-    # Verificar se supabase_service e admin_service_instance foram inicializados
-    # Isso acontece quando app.services é importado, o que ocorre antes do lifespan
-    # se os routers que os usam são importados globalmente.
-    # from app.services import supabase_service, admin_service_instance # Para checagem
-    # if not supabase_service or not supabase_service.client:
-    #     print("ALERTA LIFESPAN: Supabase service client não parece estar inicializado!")
-    # if not admin_service_instance:
-    #     print("ALERTA LIFESPAN: Admin service instance não parece estar inicializado!")
+    # Os serviços não são criados no import (cold start): são construídos e conectados aqui
+    await init_services()
+    await api_log_sink.start()
+    await traffic_rollups.start()
+    await ipapi_client.open() # Cliente HTTP compartilhado (keep-alive) do GeoIP
+    await geo_enrichment.start()
+    await revoked_token_filter.start() # Carrega os tokens revogados e reconstrói periodicamente
+    startup_warmup.start() # Em segundo plano: /health já responde, /ready só após o aquecimento
     yield
     print(f"INFO:     Aplicação '{settings.APP_NAME}' finalizando...")
+    await startup_warmup.stop()
+    await revoked_token_filter.stop()
+    await api_log_sink.stop() # Faz o flush de todos os logs ainda na fila
+    await traffic_rollups.stop() # Grava também o minuto corrente
+    await geo_enrichment.stop() # Grava os logins ainda na fila
+    password_hasher.shutdown()
+    mmdb_resolver.close()
+    await ipapi_client.close()
+    await limiter.close()
+    await close_services()
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -64,22 +83,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Authorization", "Content-Type", "X-CSRF-Token"],
+    expose_headers=["X-Next-Cursor", "Link"], # Paginação por cursor
 )
 
-@app.middleware("http")
-async def add_security_headers_basic(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    if request.url.scheme == "https":
-         response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    # CSP é complexa e melhor configurada com mais granularidade,
-    # ou através de um gateway/CDN se possível.
-    # response.headers["Content-Security-Policy"] = "default-src 'self'; ..." 
-    return response
-
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Headers de segurança: middleware ASGI puro (adicionado por último = mais externo, como o antigo @app.middleware("http"))
+app.add_middleware(SecurityHeadersMiddleware)
+
+@app.exception_handler(PasswordHashingBusyError)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusyError):
+    # Pool de bcrypt saturado: recusa rápido em vez de acumular requisições esperando
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": "Serviço temporariamente sobrecarregado. Tente novamente."}, headers={"Retry-After": "1"})
 
 if FRONTEND_ADMIN_DIR.is_dir():
     print(f"INFO:     Montando UI do Admin em /x9A7uQvP2LmZn53BqC de: {FRONTEND_ADMIN_DIR}")
@@ -96,6 +109,8 @@ else:
 app.include_router(auth_router.router, prefix=settings.API_V1_STR)
 app.include_router(admin_router.router, prefix=settings.API_V1_STR) # Seu router admin original
 app.include_router(admin_panel_router, prefix=settings.API_V1_STR) # API para o painel visual
+app.include_router(admin_stats_router.router, prefix=settings.API_V1_STR) # /admin-panel/stats/* (rollups de tráfego)
+app.include_router(jwks_router.router) # /.well-known/jwks.json (sem prefixo, por convenção)
 
 @app.get("/", tags=["Root"])
 async def read_root_main(): # Nome único
@@ -113,3 +128,10 @@ async def get_protected_data_main(current_user: UserModel = Depends(get_current_
 @app.get("/health", tags=["Health"], status_code=status.HTTP_200_OK)
 async def health_check_main(): # Nome único
     return {"status": "ok"}
+
+@app.get("/ready", tags=["Health"])
+async def readiness_check_main():
+    # Readiness probe (ex: Health Check Path do Render): 503 enquanto o warmup não terminar
+    if not startup_warmup.ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "warming_up", "warmup": startup_warmup.stats()})
+    return {"status": "ready", "warmup": startup_warmup.stats()}
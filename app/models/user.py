@@ -8,6 +8,7 @@ class User(BaseModel):
     is_active: bool = True
     role: Optional[str] = "user" # Default role
     user_metadata: Optional[Dict[str, Any]] = Field(default_factory=lambda: {"role": "user"})
+    session_epoch: int = 0 # app_metadata.session_epoch: tokens com 'sep' menor foram revogados (logout de todas as sessões)
     # Outros campos que você espera do Supabase user object
     # app_metadata: Optional[Dict[str, Any]] = None
     # created_at: Optional[datetime] = None
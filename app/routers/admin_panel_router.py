@@ -1,6 +1,7 @@
 # app/routers/admin_panel_router.py
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from typing import List, Optional, Literal
+from datetime import datetime
 import uuid
 
 from app.schemas.admin_schemas import (
@@ -8,11 +9,27 @@ from app.schemas.admin_schemas import (
     AdminCreateSchema, AdminUpdateSchema
 )
 from app.schemas.log_schemas import ApiLogResponseSchema
+from app.schemas.columns import API_LOG_COLUMNS, API_LOG_FIELDS_SUMMARY, API_LOG_FIELDS_FULL
 from app.auth.admin_jwt_handler import create_admin_access_token
 from app.auth.admin_dependencies import get_current_admin_user
 from app.models.admin import Administrator
 from app.core.config import settings
-from app.services import admin_service_instance, supabase_service
+from app.services import get_admin_service, get_supabase_service
+from app.services.log_sink import api_log_sink
+from app.auth.token_cache import verified_token_cache
+from app.auth.revoked_token_filter import revoked_token_filter
+from app.auth.principal_cache import user_principal_cache, admin_principal_cache
+from app.services.password_hashing_service import password_hasher
+from app.services.supabase_service import user_lookup_flight
+from app.services.admin_service import admin_lookup_flight
+from app.services.geoip_service import geoip_lookup_flight, geoip_cache, ipapi_client
+from app.core.warmup import startup_warmup
+from app.services.traffic_rollups import traffic_rollups
+from app.services.geo_enrichment import geo_enrichment
+from app.services.geoip_local import mmdb_resolver
+from app.utils.rate_limiter import limiter
+from app.utils.pagination import API_LOG_CURSOR, ADMIN_CURSOR, decode_cursor, next_cursor, set_next_page_headers
+from app.services.log_export import open_keyset_pages, export_response
 
 admin_panel_router = APIRouter(
     prefix="/admin-panel",
@@ -21,6 +38,7 @@ admin_panel_router = APIRouter(
 
 @admin_panel_router.post("/auth/token", response_model=AdminToken, summary="Login do Administrador do Painel")
 async def login_for_admin_panel_token(form_data: AdminLoginSchema):
+    admin_service_instance = get_admin_service()
     if not admin_service_instance:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço de administração indisponível.")
     admin = await admin_service_instance.authenticate_admin(
@@ -36,8 +54,7 @@ async def login_for_admin_panel_token(form_data: AdminLoginSchema):
         )
     if admin.status != "active":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Conta de administrador inativa.")
-    # A chamada para update_last_login é síncrona se self.db.table().update().execute() for síncrono
-    admin_service_instance.update_last_login(admin.id) # REMOVIDO await, pois o método em AdminService foi ajustado
+    await admin_service_instance.update_last_login(admin.id)
     
     access_token_payload = {"sub": str(admin.id)}
     access_token = create_admin_access_token(data=access_token_payload)
@@ -49,13 +66,19 @@ async def read_current_admin(current_admin: Administrator = Depends(get_current_
 
 @admin_panel_router.get("/administrators", response_model=List[AdminResponseSchema], summary="Listar Todos os Administradores")
 async def list_all_administrators(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0), 
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de X-Next-Cursor/Link da página anterior (substitui skip)"),
     current_admin: Administrator = Depends(get_current_admin_user)
 ):
+    admin_service_instance = get_admin_service()
     if not admin_service_instance:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço de administração indisponível.")
-    admins = admin_service_instance.list_admins(skip=skip, limit=limit) # REMOVIDO await
+    after_username = decode_cursor(cursor, ADMIN_CURSOR)[0] if cursor else None
+    admins = await admin_service_instance.list_admins(skip=skip, limit=limit, after_username=after_username)
+    set_next_page_headers(request, response, next_cursor(admins, limit, ADMIN_CURSOR))
     return admins
 
 @admin_panel_router.get("/administrators/{admin_id}", response_model=AdminResponseSchema, summary="Obter um Administrador por ID")
@@ -63,9 +86,10 @@ async def get_administrator_by_id_route(
     admin_id: uuid.UUID, 
     current_admin: Administrator = Depends(get_current_admin_user)
 ):
+    admin_service_instance = get_admin_service()
     if not admin_service_instance:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço de administração indisponível.")
-    admin = await admin_service_instance.get_admin_by_id(admin_id) # Mantido await se get_admin_by_id for async e suas operações internas forem sync
+    admin = await admin_service_instance.get_admin_by_id(admin_id)
     if not admin:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Administrador com ID {admin_id} não encontrado.")
     return admin
@@ -74,12 +98,13 @@ async def get_administrator_by_id_route(
 async def create_new_admin(
     admin_in: AdminCreateSchema, current_admin: Administrator = Depends(get_current_admin_user)
 ):
+    admin_service_instance = get_admin_service()
     if not admin_service_instance:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço de administração indisponível.")
-    existing_admin = await admin_service_instance.get_admin_by_username(admin_in.username) # Mantido await
+    existing_admin = await admin_service_instance.get_admin_by_username(admin_in.username)
     if existing_admin:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nome de usuário já registrado para um administrador.")
-    new_admin = admin_service_instance.create_admin(admin_in) # REMOVIDO await
+    new_admin = await admin_service_instance.create_admin(admin_in) # async: bcrypt no pool de hashing
     if not new_admin:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Falha ao criar administrador.")
     return new_admin
@@ -88,43 +113,101 @@ async def create_new_admin(
 async def update_existing_admin(
     admin_id: uuid.UUID, admin_in: AdminUpdateSchema, current_admin: Administrator = Depends(get_current_admin_user)
 ):
+    admin_service_instance = get_admin_service()
     if not admin_service_instance:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço de administração indisponível.")
-    updated_admin = admin_service_instance.update_admin(admin_id, admin_in) # REMOVIDO await
+    updated_admin = await admin_service_instance.update_admin(admin_id, admin_in) # async: bcrypt no pool de hashing
     if not updated_admin:
-        check_admin_exists = await admin_service_instance.get_admin_by_id(admin_id) # Mantido await
+        check_admin_exists = await admin_service_instance.get_admin_by_id(admin_id)
         if not check_admin_exists:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Administrador com ID {admin_id} não encontrado.")
         else:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Falha ao atualizar administrador com ID {admin_id}, mas o administrador ainda existe.")
     return updated_admin
 
-@admin_panel_router.get("/logs/api", response_model=List[ApiLogResponseSchema], summary="Visualizar Logs da API")
+# exclude_unset: no modo "summary" as colunas não lidas (corpos JSON, user_agent) nem aparecem na resposta
+@admin_panel_router.get("/logs/api", response_model=List[ApiLogResponseSchema], response_model_exclude_unset=True, summary="Visualizar Logs da API")
 async def get_api_logs(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de X-Next-Cursor/Link da página anterior (substitui skip)"),
     limit: int = Query(50, ge=1, le=200),
     method: Optional[str] = Query(None, min_length=3, max_length=10), 
     status_code_filter: Optional[int] = Query(None, alias="status_code", ge=100, le=599),
     path_contains: Optional[str] = Query(None, min_length=1),
     user_id_filter: Optional[uuid.UUID] = Query(None, alias="user_id"),
     admin_id_filter: Optional[uuid.UUID] = Query(None, alias="admin_id"),
+    fields: Literal["summary", "full"] = Query(API_LOG_FIELDS_SUMMARY, description="'summary' (colunas da listagem) ou 'full' (inclui corpos e user_agent)"),
     current_admin: Administrator = Depends(get_current_admin_user)
 ):
+    supabase_service = get_supabase_service()
     if not supabase_service or not supabase_service.client:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço Supabase indisponível para logging.")
+    after = decode_cursor(cursor, API_LOG_CURSOR) if cursor else None # 400 se malformado (antes do try)
     try:
-        query = supabase_service.client.table("api_logs").select("*").order("timestamp", desc=True).offset(skip).limit(limit)
-        if method: query = query.eq("method", method.upper())
-        if status_code_filter is not None: query = query.eq("status_code", status_code_filter)
-        if path_contains: query = query.ilike("path", f"%{path_contains}%")
-        if user_id_filter: query = query.eq("user_id", str(user_id_filter))
-        if admin_id_filter: query = query.eq("admin_id", str(admin_id_filter))
-        
-        response = query.execute() # REMOVIDO 'await' DAQUI
-        
-        return response.data if response.data else []
+        logs = await supabase_service.get_api_logs(
+            skip=skip, limit=limit, method=method, status_code=status_code_filter,
+            path_contains=path_contains, user_id=user_id_filter, admin_id=admin_id_filter,
+            fields=API_LOG_FIELDS_FULL if fields == API_LOG_FIELDS_FULL else API_LOG_FIELDS_SUMMARY,
+            after=after,
+        )
+        set_next_page_headers(request, response, next_cursor(logs, limit, API_LOG_CURSOR))
+        return logs
     except Exception as e:
         print(f"Erro ao buscar logs da API: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Falha ao buscar logs da API.")
+
+@admin_panel_router.get("/logs/api/export", summary="Exportar Logs da API (NDJSON/CSV em streaming)")
+async def export_api_logs(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    gzip: bool = Query(False, description="Comprime a saída (arquivo .gz)"),
+    since: Optional[datetime] = Query(None, description="Início do intervalo (inclusivo), ISO 8601"),
+    until: Optional[datetime] = Query(None, description="Fim do intervalo (exclusivo), ISO 8601"),
+    method: Optional[str] = Query(None, min_length=3, max_length=10),
+    status_code_filter: Optional[int] = Query(None, alias="status_code", ge=100, le=599),
+    path_contains: Optional[str] = Query(None, min_length=1),
+    user_id_filter: Optional[uuid.UUID] = Query(None, alias="user_id"),
+    admin_id_filter: Optional[uuid.UUID] = Query(None, alias="admin_id"),
+    fields: Literal["summary", "full"] = Query(API_LOG_FIELDS_SUMMARY),
+    current_admin: Administrator = Depends(get_current_admin_user)
+):
+    supabase_service = get_supabase_service()
+    if not supabase_service or not supabase_service.client:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Serviço Supabase indisponível para logging.")
+    field_set = API_LOG_FIELDS_FULL if fields == API_LOG_FIELDS_FULL else API_LOG_FIELDS_SUMMARY
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+
+    async def fetch_page(after):
+        return await supabase_service.get_api_logs(
+            limit=chunk_size, method=method, status_code=status_code_filter, path_contains=path_contains,
+            user_id=user_id_filter, admin_id=admin_id_filter, fields=field_set, after=after, since=since, until=until,
+        )
+
+    try:
+        pages = await open_keyset_pages(fetch_page, chunk_size, API_LOG_CURSOR)
+    except Exception as e:
+        print(f"Erro ao iniciar exportação de logs da API: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Falha ao exportar logs da API.")
+    return export_response(pages, export_format, API_LOG_COLUMNS[field_set], gzip, "api_logs")
+
+@admin_panel_router.get("/metrics", summary="Métricas Internas da API (filas e caches)")
+async def get_internal_metrics(current_admin: Administrator = Depends(get_current_admin_user)):
+    return {
+        "api_log_sink": api_log_sink.stats(),
+        "verified_token_cache": verified_token_cache.stats(),
+        "revoked_token_filter": revoked_token_filter.stats(),
+        "user_principal_cache": user_principal_cache.stats(),
+        "admin_principal_cache": admin_principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "startup_warmup": startup_warmup.stats(),
+        "traffic_rollups": traffic_rollups.stats(),
+        "geo_enrichment": geo_enrichment.stats(),
+        "geoip_mmdb": mmdb_resolver.stats(),
+        "geoip_http": ipapi_client.stats(),
+        "geoip_cache": geoip_cache.stats(),
+        "rate_limiter": limiter.stats(),
+        "single_flight": [flight.stats() for flight in (user_lookup_flight, admin_lookup_flight, geoip_lookup_flight)],
+    }
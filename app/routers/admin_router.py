@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from app.auth.dependencies import get_current_admin_user
 from app.models.user import User
-from app.services.supabase_service import supabase_service
+from app.services.supabase_service import get_supabase_service
 from app.schemas.geo_log_schemas import GeoLogResponse
-from typing import List
+from app.utils.pagination import GEO_LOG_CURSOR, decode_cursor, next_cursor, set_next_page_headers
+from app.schemas.columns import GEO_LOG_COLUMNS
+from app.services.log_export import open_keyset_pages, export_response
+from app.core.config import settings
+from typing import List, Optional, Literal
+from datetime import datetime
+import uuid
 
 router = APIRouter(prefix="/4L8FJYy4eWGL_admin", tags=["Admin"], dependencies=[Depends(get_current_admin_user)])
 
@@ -16,13 +22,40 @@ async def admin_dashboard(current_admin: User = Depends(get_current_admin_user))
 
 @router.get("/geologs", response_model=List[GeoLogResponse], summary="Listar Logs de GeoIP")
 async def list_geo_logs(
+    request: Request,
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de X-Next-Cursor/Link da página anterior (substitui offset)"),
     current_admin: User = Depends(get_current_admin_user) # Garante que é admin
 ):
-    logs = await supabase_service.get_all_geo_logs(limit=limit, offset=offset)
+    after = decode_cursor(cursor, GEO_LOG_CURSOR) if cursor else None
+    logs = await get_supabase_service().get_all_geo_logs(limit=limit, offset=offset, after=after)
+    set_next_page_headers(request, response, next_cursor(logs, limit, GEO_LOG_CURSOR))
     return logs
 
+@router.get("/geologs/export", summary="Exportar Logs de GeoIP (NDJSON/CSV em streaming)")
+async def export_geo_logs(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    gzip: bool = Query(False, description="Comprime a saída (arquivo .gz)"),
+    since: Optional[datetime] = Query(None, description="Início do intervalo (inclusivo), ISO 8601"),
+    until: Optional[datetime] = Query(None, description="Fim do intervalo (exclusivo), ISO 8601"),
+    user_id: Optional[uuid.UUID] = Query(None),
+    current_admin: User = Depends(get_current_admin_user)
+):
+    supabase_service = get_supabase_service()
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+
+    async def fetch_page(after):
+        return await supabase_service.fetch_geo_logs(limit=chunk_size, after=after, user_id=user_id, since=since, until=until)
+
+    try:
+        pages = await open_keyset_pages(fetch_page, chunk_size, GEO_LOG_CURSOR)
+    except Exception as e:
+        print(f"Erro ao iniciar exportação de geo logs: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Falha ao exportar logs de GeoIP.")
+    return export_response(pages, export_format, GEO_LOG_COLUMNS, gzip, "geo_login_logs")
+
 # Você pode adicionar outras rotas aqui:
 # - Listar usuários (cuidado com a paginação e dados sensíveis)
 # - Banir/ativar usuários
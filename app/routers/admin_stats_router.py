@@ -0,0 +1,63 @@
+# app/routers/admin_stats_router.py
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional, Literal, Tuple
+from datetime import datetime, timedelta, timezone
+
+from app.auth.admin_dependencies import get_current_admin_user
+from app.models.admin import Administrator
+from app.core.config import settings
+from app.schemas.stats_schemas import TrafficPointSchema, RouteTrafficSchema
+from app.services.traffic_stats import BUCKET_SIZES, load_rollups, timeseries, by_route
+
+router = APIRouter(
+    prefix="/admin-panel/stats",
+    tags=["Admin Panel - Estatísticas de Tráfego"],
+    dependencies=[Depends(get_current_admin_user)],
+)
+
+def _window(since: Optional[datetime], until: Optional[datetime]) -> Tuple[datetime, datetime]:
+    # Padrão: última hora. Datas sem fuso são tratadas como UTC.
+    until = (until or datetime.now(timezone.utc))
+    since = (since or until - timedelta(hours=1))
+    if until.tzinfo is None: until = until.replace(tzinfo=timezone.utc)
+    if since.tzinfo is None: since = since.replace(tzinfo=timezone.utc)
+    if since >= until:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'since' deve ser anterior a 'until'.")
+    if until - since > timedelta(hours=settings.TRAFFIC_STATS_MAX_WINDOW_HOURS):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Janela máxima: {settings.TRAFFIC_STATS_MAX_WINDOW_HOURS}h.")
+    return since, until
+
+async def _load(since, until, **filters):
+    try:
+        return await load_rollups(since, until, **filters)
+    except Exception as e:
+        print(f"Erro ao buscar rollups de tráfego: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Falha ao buscar estatísticas de tráfego.")
+
+@router.get("/timeseries", response_model=List[TrafficPointSchema], summary="Série temporal de requisições, erros e latência")
+async def get_traffic_timeseries(
+    since: Optional[datetime] = Query(None, description="Início (inclusivo), ISO 8601. Padrão: 1h atrás"),
+    until: Optional[datetime] = Query(None, description="Fim (exclusivo), ISO 8601. Padrão: agora"),
+    bucket: Literal["1m", "5m", "15m", "1h", "1d"] = Query("1m"),
+    route: Optional[str] = Query(None, description="Template da rota, ex: /api/v1/auth/login/json"),
+    method: Optional[str] = Query(None, min_length=3, max_length=10),
+    status_class: Optional[Literal["1xx", "2xx", "3xx", "4xx", "5xx"]] = Query(None),
+    api_area: Optional[str] = Query(None, description="admin_panel_api, user_auth_api, original_admin_api ou other_api"),
+    current_admin: Administrator = Depends(get_current_admin_user)
+):
+    since, until = _window(since, until)
+    rows = await _load(since, until, route=route, method=method, status_class=status_class, api_area=api_area)
+    return timeseries(rows, BUCKET_SIZES[bucket])
+
+@router.get("/routes", response_model=List[RouteTrafficSchema], summary="Totais por rota no intervalo (mais requisitadas primeiro)")
+async def get_traffic_by_route(
+    since: Optional[datetime] = Query(None, description="Início (inclusivo), ISO 8601. Padrão: 1h atrás"),
+    until: Optional[datetime] = Query(None, description="Fim (exclusivo), ISO 8601. Padrão: agora"),
+    status_class: Optional[Literal["1xx", "2xx", "3xx", "4xx", "5xx"]] = Query(None),
+    api_area: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    current_admin: Administrator = Depends(get_current_admin_user)
+):
+    since, until = _window(since, until)
+    rows = await _load(since, until, status_class=status_class, api_area=api_area)
+    return by_route(rows, limit)
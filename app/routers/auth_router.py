@@ -2,15 +2,18 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from app.auth.schemas import Token, UserLoginSchema, RefreshTokenRequest # Supondo que estes schemas existem
 from app.schemas.user_schemas import UserCreate, UserResponse
-from app.services.supabase_service import supabase_service
-from app.services.geoip_service import get_geoip_data
-from app.schemas.geo_log_schemas import GeoLogCreate
+from app.services.supabase_service import get_supabase_service, UserAlreadyExistsError, REFRESH_ROTATION_ROTATED
+from app.services.geo_enrichment import geo_enrichment
 from app.auth.jwt_handler import create_access_token, create_refresh_token, verify_token
+from app.auth.request_claims import get_request_claims
+from app.auth.token_cache import invalidate_token, invalidate_subject
+from app.auth.principal_cache import invalidate_user_principal, get_cached_user_principal
+from app.auth.revoked_token_filter import revoked_token_filter
 from app.models.user import User
 from app.auth.dependencies import get_current_active_user
 from app.utils.rate_limiter import limiter
 from app.core.config import settings
-from datetime import timedelta, datetime, timezone
+from datetime import timedelta
 from typing import Optional
 import uuid
 
@@ -19,14 +22,14 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 @limiter.limit("10/hour") # Limite para registro
 async def register_user(request: Request, user_in: UserCreate):
-    email_exists = await supabase_service.get_user_by_email_for_check(user_in.email)
-    if email_exists:
+    supabase_service = get_supabase_service()
+    try:
+        new_user = await supabase_service.create_user(user_in) # Duplicados são rejeitados pelo próprio GoTrue
+    except UserAlreadyExistsError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
-    
-    new_user = await supabase_service.create_user(user_in)
     if not new_user:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -43,6 +46,7 @@ async def login_for_access_token_json(
     request: Request,
     form_data: UserLoginSchema
 ):
+    supabase_service = get_supabase_service()
     user = await supabase_service.login_user(email=form_data.email, password=form_data.password)
     if not user or not user.id: # Checar se user e user.id são válidos
         raise HTTPException(
@@ -58,21 +62,8 @@ async def login_for_access_token_json(
     user_agent = request.headers.get("user-agent", "unknown")
     
     if ip_address != "unknown":
-        geoip_data = await get_geoip_data(ip_address)
-        log_entry_data = {
-            "user_id": user.id,
-            "ip_address": ip_address,
-            "user_agent": user_agent,
-        }
-        if geoip_data:
-            log_entry_data.update({
-                "country": geoip_data.get("country_name"),
-                "city": geoip_data.get("city"),
-                "region": geoip_data.get("region"),
-                "latitude": geoip_data.get("latitude"),
-                "longitude": geoip_data.get("longitude"),
-            })
-        await supabase_service.add_geo_log(GeoLogCreate(**log_entry_data))
+        # GeoIP + gravação em geo_login_logs acontecem em segundo plano (GeoEnrichmentPipeline)
+        geo_enrichment.enqueue_login(user.id, ip_address, user_agent)
 
 
     access_token_expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -80,11 +71,11 @@ async def login_for_access_token_json(
     
     access_token_payload = {"sub": str(user.id), "role": user.role}
     access_token = create_access_token(
-        data=access_token_payload, expires_delta=access_token_expires_delta
+        data=access_token_payload, expires_delta=access_token_expires_delta, session_epoch=user.session_epoch
     )
     
     raw_refresh_token, refresh_token_expires_at = create_refresh_token(
-        data={"sub": str(user.id)}, expires_delta=refresh_token_expires_delta
+        data={"sub": str(user.id)}, expires_delta=refresh_token_expires_delta, session_epoch=user.session_epoch
     )
 
     stored_token_info = await supabase_service.store_refresh_token(
@@ -112,6 +103,7 @@ async def login_for_access_token_form(
 @router.post("/refresh", response_model=Token)
 @limiter.limit("20/minute")
 async def refresh_access_token(request: Request, token_request: RefreshTokenRequest):
+    supabase_service = get_supabase_service()
     client_refresh_token_str = token_request.refresh_token
     
     credentials_exception = HTTPException(
@@ -124,90 +116,52 @@ async def refresh_access_token(request: Request, token_request: RefreshTokenRequ
         detail="Invalid or revoked refresh token",
     )
 
-    # 1. Obter dados do token do banco de dados usando o HASH
-    db_token_data = await supabase_service.get_refresh_token_data_by_hash(client_refresh_token_str)
-
-    if not db_token_data:
-        # print(f"Debug: /refresh - Token não encontrado no DB para o hash de: {client_refresh_token_str[:20]}...")
+    # 1. Validar o JWT do refresh token localmente (assinatura, expiração, tipo e 'sub'), sem ir ao banco
+    try:
+        jwt_payload = verify_token(client_refresh_token_str, credentials_exception)
+        user_id = uuid.UUID(jwt_payload.user_id) if jwt_payload else None
+    except (HTTPException, ValueError):
         raise auth_failed_exception
-
-    db_token_id = uuid.UUID(db_token_data["id"])
-    db_user_id_str = db_token_data["user_id"]
-
-    # 2. Verificar se foi revogado
-    if db_token_data.get("revoked"):
-        # print(f"Debug: /refresh - Token (DB ID: {db_token_id}) está revogado.")
-        # Medida de segurança: se um token revogado é usado, revogar toda a família de tokens descendentes.
-        # Esta lógica pode ser mais complexa se você rastrear a cadeia de `parent_token_hash`.
-        # Por simplicidade aqui, vamos apenas revogar todos os tokens do usuário se um revogado for usado.
-        await supabase_service.revoke_all_user_refresh_tokens(uuid.UUID(db_user_id_str))
+    if not user_id or jwt_payload.token_type != "refresh":
         raise auth_failed_exception
+    if revoked_token_filter.might_be_revoked(client_refresh_token_str):
+        raise auth_failed_exception # Revogado explicitamente (logout): recusa o replay sem ir ao banco
+    cached_user = get_cached_user_principal(user_id)
+    if isinstance(cached_user, User) and jwt_payload.session_epoch < cached_user.session_epoch:
+        raise auth_failed_exception # Logout de todas as sessões já visto por este processo; a RPC confere de qualquer forma
 
-    # 3. Verificar se expirou
-    expires_at_str = db_token_data.get("expires_at")
-    if not expires_at_str: # Checagem de segurança
-        # print(f"Debug: /refresh - Token (DB ID: {db_token_id}) não tem expires_at no DB.")
-        await supabase_service.revoke_refresh_token(db_token_id)
-        raise auth_failed_exception
-
-    expires_at_utc = datetime.fromisoformat(expires_at_str).replace(tzinfo=timezone.utc)
-    if expires_at_utc < datetime.now(timezone.utc):
-        # print(f"Debug: /refresh - Token (DB ID: {db_token_id}) expirou em {expires_at_utc}.")
-        await supabase_service.revoke_refresh_token(db_token_id) # Revoga o token expirado
-        raise auth_failed_exception
-        
-    # 4. Validar o JWT do refresh token em si (opcional, mas bom para consistência)
-    # Isto verifica a assinatura do token, expiração JWT (redundante com a do DB, mas ok), tipo, e 'sub'.
-    try:
-        jwt_payload = verify_token(client_refresh_token_str, credentials_exception) # Reutiliza verify_token
-        if not jwt_payload or jwt_payload.token_type != "refresh" or jwt_payload.user_id != db_user_id_str:
-            # print(f"Debug: /refresh - Payload JWT inválido ou não corresponde ao DB. JWT UserID: {jwt_payload.user_id if jwt_payload else 'N/A'}, DB UserID: {db_user_id_str}")
-            await supabase_service.revoke_refresh_token(db_token_id)
-            raise auth_failed_exception
-    except HTTPException as e: # Captura a credentials_exception de verify_token
-        # print(f"Debug: /refresh - verify_token falhou para o token do cliente: {e.detail}")
-        await supabase_service.revoke_refresh_token(db_token_id)
-        raise auth_failed_exception # Re-levanta a exceção com o detalhe apropriado
+    # 2. Gerar o novo refresh token (rotação) antes da chamada: o hash dele vai junto para o banco
+    new_refresh_token_expires_delta = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    new_raw_refresh_token, new_refresh_token_expires_at = create_refresh_token(
+        data={"sub": str(user_id)}, expires_delta=new_refresh_token_expires_delta, session_epoch=jwt_payload.session_epoch
+    )
 
-    # 5. Revogar o token antigo que foi usado (CRUCIAL para rotação segura)
-    if not await supabase_service.revoke_refresh_token(db_token_id):
-        print(f"ERRO CRÍTICO: Falha ao revogar o refresh token usado (DB ID: {db_token_id}) para o usuário {db_user_id_str}")
+    # 3. Validar no banco (existe, não revogado, não expirado, mesmo dono, usuário ativo, época de sessão), revogar o token usado
+    # e armazenar o sucessor: tudo numa única transação (RPC rotate_refresh_token), em um round trip.
+    # Um token já revogado que volta a ser usado faz a função revogar toda a família de tokens do usuário.
+    rotation = await supabase_service.rotate_refresh_token(
+        token_str=client_refresh_token_str,
+        new_token_str=new_raw_refresh_token,
+        new_expires_at=new_refresh_token_expires_at,
+        user_id=user_id,
+        session_epoch=jwt_payload.session_epoch,
+    )
+    if rotation is None:
+        print(f"ERRO CRÍTICO: Falha na rotação do refresh token para o usuário {user_id}.")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Token refresh process failed internally.")
+    if rotation["status"] != REFRESH_ROTATION_ROTATED:
+        # print(f"Debug: /refresh - Rotação recusada: {rotation['status']} (user {user_id}).")
+        raise auth_failed_exception
+    invalidate_token(client_refresh_token_str) # O token usado não vale mais: sai do cache de tokens verificados
 
-    # 6. Obter dados do usuário para o novo token
-    user = await supabase_service.get_user_by_id(uuid.UUID(db_user_id_str))
-    if not user or not user.is_active:
-        # print(f"Debug: /refresh - Usuário {db_user_id_str} não encontrado ou inativo.")
-        # O usuário pode ter sido desativado/deletado. Não emitir novos tokens.
-        raise auth_failed_exception # Ou credentials_exception
-
-    # 7. Gerar novo access token
+    # 4. Gerar novo access token (role devolvida pela própria rotação)
     new_access_token_expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    new_access_token_payload = {"sub": str(user.id), "role": user.role}
+    new_access_token_payload = {"sub": str(user_id), "role": rotation["role"]}
     new_access_token = create_access_token(
-        data=new_access_token_payload, expires_delta=new_access_token_expires_delta
-    )
-
-    # 8. Gerar novo refresh token (rotação)
-    new_refresh_token_expires_delta = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    new_raw_refresh_token, new_refresh_token_expires_at = create_refresh_token(
-        data={"sub": str(user.id)}, expires_delta=new_refresh_token_expires_delta
-    )
-
-    # 9. Armazenar o novo refresh token no banco de dados
-    new_stored_token_info = await supabase_service.store_refresh_token(
-        user_id=user.id,
-        token_str=new_raw_refresh_token,
-        expires_at=new_refresh_token_expires_at,
-        parent_token_str=client_refresh_token_str # Rastreia a origem
+        data=new_access_token_payload, expires_delta=new_access_token_expires_delta, session_epoch=jwt_payload.session_epoch
     )
-    if not new_stored_token_info:
-        print(f"ERRO CRÍTICO: Falha ao armazenar o NOVO refresh token para o usuário {user.id} durante o refresh.")
-        # Neste ponto, o token antigo já foi revogado. O usuário ficará sem refresh token.
-        # É uma situação ruim. Retornar erro 500.
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to store new refresh token.")
 
-    # print(f"Debug: /refresh - Sucesso. Novo access token e refresh token emitidos para user {user.id}.")
+    # print(f"Debug: /refresh - Sucesso. Novo access token e refresh token emitidos para user {user_id}.")
     return {"access_token": new_access_token, "refresh_token": new_raw_refresh_token, "token_type": "bearer"}
 
 
@@ -223,12 +177,15 @@ async def logout_user(
     - Se 'refresh_token' é fornecido no corpo, tenta revogar esse token específico.
       Isso permite que um cliente revogue um token mesmo que o access token associado tenha expirado.
     - Se 'refresh_token' não é fornecido E um usuário está autenticado (current_user),
-      revoga todos os tokens ativos para esse usuário. (Logout de todas as sessões)
+      encerra todas as sessões do usuário (avança a época de sessão): refresh e access tokens já emitidos deixam de valer.
     """
+    supabase_service = get_supabase_service()
     revoked_something = False
     if token_request and token_request.refresh_token:
         # print(f"Debug: /logout - Tentando revogar refresh token específico fornecido.")
-        if await supabase_service.revoke_refresh_token_by_hash(token_request.refresh_token):
+        if revoked_token_filter.might_be_revoked(token_request.refresh_token):
+            pass # Já revogado (logout repetido/replay): nada a gravar, sem UPDATE no banco
+        elif await supabase_service.revoke_refresh_token_by_hash(token_request.refresh_token):
             revoked_something = True
             # print(f"Debug: /logout - Refresh token específico revogado com sucesso.")
         # else:
@@ -249,6 +206,14 @@ async def logout_user(
         # Se o objetivo é SEMPRE ter um usuário para revogar todos os tokens, remova a opcionalidade de current_user.
         pass
 
+    # Remove do cache de tokens verificados o access token desta sessão e o refresh token informado
+    invalidate_token(get_request_claims(request.scope).token)
+    if token_request and token_request.refresh_token:
+        invalidate_token(token_request.refresh_token)
+    elif current_user and current_user.id:
+        invalidate_subject(str(current_user.id))
+        invalidate_user_principal(current_user.id) # Só no logout de todas as sessões: revogar um token não muda o usuário
+
     # O status 204 significa "No Content", então não retornamos corpo.
     return None
 
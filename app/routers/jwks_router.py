@@ -0,0 +1,13 @@
+# app/routers/jwks_router.py
+from fastapi import APIRouter, Response
+
+from app.auth.key_manager import signing_keys
+from app.core.config import settings
+
+router = APIRouter(tags=["JWKS"])
+
+@router.get("/.well-known/jwks.json", summary="Chaves públicas (JWKS) para verificação local dos tokens")
+async def get_jwks(response: Response):
+    # Serviços downstream podem cachear e verificar os tokens localmente, escolhendo a chave pelo 'kid'
+    response.headers["Cache-Control"] = f"public, max-age={settings.JWKS_CACHE_MAX_AGE_SECONDS}"
+    return signing_keys.jwks()
@@ -0,0 +1,47 @@
+# app/schemas/columns.py
+# Listas explícitas de colunas para cada leitura (nada de select("*")), derivadas dos schemas de resposta.
+from typing import Dict, Tuple, Type
+
+from pydantic import BaseModel
+
+from app.models.admin import Administrator
+from app.schemas.admin_schemas import AdminResponseSchema
+from app.schemas.geo_log_schemas import GeoLogResponse
+from app.schemas.log_schemas import ApiLogResponseSchema, ApiLogSummarySchema
+
+
+def columns_of(model: Type[BaseModel]) -> Tuple[str, ...]:
+    return tuple(model.model_fields)
+
+
+def select_list(columns: Tuple[str, ...]) -> str:
+    """Formato do PostgREST: "col_a,col_b"."""
+    return ",".join(columns)
+
+
+API_LOG_FIELDS_SUMMARY = "summary"
+API_LOG_FIELDS_FULL = "full"
+API_LOG_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    API_LOG_FIELDS_SUMMARY: columns_of(ApiLogSummarySchema),
+    API_LOG_FIELDS_FULL: columns_of(ApiLogResponseSchema),
+}
+
+GEO_LOG_COLUMNS = columns_of(GeoLogResponse)
+# Backfill de GeoIP: só a chave do keyset e o IP a resolver
+GEO_LOG_BACKFILL_COLUMNS = ("id", "timestamp", "ip_address")
+GEO_LOG_LOCATION_FIELDS = ("country", "city", "region", "latitude", "longitude")
+
+# Administrator inclui password_hash/HWID (necessários para autenticar); listagens usam só o schema público
+ADMIN_COLUMNS = columns_of(Administrator)
+ADMIN_PUBLIC_COLUMNS = columns_of(AdminResponseSchema)
+
+# Rollups por minuto do tráfego (app/services/traffic_rollups.py)
+TRAFFIC_ROLLUP_COLUMNS: Tuple[str, ...] = (
+    "bucket_start", "route", "method", "status_class", "api_area",
+    "request_count", "error_count", "latency_sum_ms", "latency_max_ms", "latency_sketch",
+)
+# Mesma chave do RollupKey em memória (e da PK): api_area separa as rotas não casadas "(other)"
+TRAFFIC_ROLLUP_CONFLICT_COLUMNS: Tuple[str, ...] = ("bucket_start", "writer_id", "route", "method", "status_class", "api_area")
+
+# Só o que o fluxo de /auth/refresh lê
+REFRESH_TOKEN_COLUMNS: Tuple[str, ...] = ("id", "user_id", "revoked", "expires_at")
@@ -14,6 +14,7 @@ class GeoLogBase(BaseModel):
 
 class GeoLogCreate(GeoLogBase):
     user_id: uuid.UUID # Para associar ao usuário que logou
+    timestamp: Optional[datetime] = None # Momento do login (pipeline em segundo plano); None = default do banco
 
 class GeoLogResponse(GeoLogBase):
     id: uuid.UUID
@@ -0,0 +1,30 @@
+# app/schemas/stats_schemas.py
+from pydantic import BaseModel
+from typing import Optional, Dict
+from datetime import datetime
+
+class TrafficPointSchema(BaseModel):
+    bucket_start: datetime
+    request_count: int
+    error_count: int
+    error_ratio: float
+    latency_avg_ms: Optional[float] = None
+    latency_max_ms: Optional[float] = None
+    latency_p50_ms: Optional[float] = None
+    latency_p95_ms: Optional[float] = None
+    latency_p99_ms: Optional[float] = None
+    status_classes: Dict[str, int] = {}
+
+class RouteTrafficSchema(BaseModel):
+    route: str
+    method: str
+    api_area: str
+    request_count: int
+    error_count: int
+    error_ratio: float
+    latency_avg_ms: Optional[float] = None
+    latency_max_ms: Optional[float] = None
+    latency_p50_ms: Optional[float] = None
+    latency_p95_ms: Optional[float] = None
+    latency_p99_ms: Optional[float] = None
+    status_classes: Dict[str, int] = {}
@@ -1,31 +1,58 @@
 # app/services/__init__.py
-from .supabase_service import supabase_service # Importa a instância já criada
+# Nada é construído no import: os serviços são criados pelos acessores abaixo, chamados no lifespan
+# (init_services) ou, no máximo, no primeiro uso. Isso mantém o cold start curto.
+from typing import Optional
+
+from .supabase_service import get_supabase_service, DATABASE_BACKEND_POSTGRES
 from .admin_service import AdminService     # Importa a CLASSE AdminService
+from app.core.config import settings
+
+_admin_service_instance: Optional[AdminService] = None
+_admin_service_built = False
 
-admin_service_instance = None # Inicializa como None
 
-print("INFO:     app.services.__init__ - Tentando criar instância de AdminService...")
-if supabase_service and supabase_service.client:
+def _create_admin_service() -> Optional[AdminService]:
+    supabase_service = get_supabase_service()
+    print("INFO:     app.services - Tentando criar instância de AdminService...")
+    if not supabase_service or not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+        print("ERRO CRÍTICO: SupabaseService NÃO ESTÁ DISPONÍVEL (verifique SUPABASE_URL/KEY no Render).")
+        print("              AdminService não pôde ser instanciado.")
+        return None
     try:
-        # Passa o cliente Supabase já inicializado para o AdminService
-        admin_service_instance = AdminService(supabase_client=supabase_service.client)
-        
-        # Verifica se o atributo 'db' dentro de AdminService foi realmente definido
-        if hasattr(admin_service_instance, 'db') and admin_service_instance.db is not None:
-            print("INFO:     Instância de AdminService CRIADA COM SUCESSO e cliente DB (self.db) associado.")
+        # Passa o SupabaseService para o AdminService (ele usa o cliente e o executor de queries do serviço)
+        if (settings.DATABASE_BACKEND or "").lower() == DATABASE_BACKEND_POSTGRES:
+            from .postgres_backend import PostgresAdminService # Mesmo pool asyncpg do supabase_service
+            admin_service = PostgresAdminService(supabase=supabase_service)
         else:
-            print("ERRO CRÍTICO: AdminService foi instanciado, MAS seu atributo 'db' (cliente supabase) é None ou não existe.")
-            print("              Isso indica um problema no __init__ do AdminService ou na passagem do supabase_client.")
-            admin_service_instance = None # Garante que é None se a inicialização interna falhar
+            admin_service = AdminService(supabase=supabase_service)
+        print("INFO:     Instância de AdminService CRIADA. Cliente DB será associado em init_services() (lifespan).")
+        return admin_service
     except Exception as e:
         print(f"ERRO CRÍTICO: Exceção ao tentar instanciar AdminService: {e}")
         import traceback
         traceback.print_exc()
-        admin_service_instance = None
-else:
-    print("ERRO CRÍTICO: Cliente Supabase (supabase_service.client) NÃO ESTÁ DISPONÍVEL ou é None.")
-    print("              AdminService não pôde ser instanciado. Verifique a inicialização do SupabaseService")
-    print("              (em supabase_service.py) e as variáveis de ambiente SUPABASE_URL/KEY no Render.")
-
-# Para permitir importações como 'from app.services import supabase_service, admin_service_instance'
-__all__ = ["supabase_service", "admin_service_instance"]
+        return None
+
+
+def get_admin_service() -> Optional[AdminService]:
+    """Acessor preguiçoso do AdminService (None se o Supabase não estiver configurado)."""
+    global _admin_service_instance, _admin_service_built
+    if not _admin_service_built:
+        _admin_service_instance = _create_admin_service()
+        _admin_service_built = True
+    return _admin_service_instance
+
+
+async def init_services() -> None:
+    """Chamado no startup (lifespan): constrói os serviços e abre os clientes/pools."""
+    await get_supabase_service().connect()
+    admin_service = get_admin_service()
+    if admin_service is not None and admin_service.db is None:
+        print("ERRO CRÍTICO: AdminService foi instanciado, MAS seu atributo 'db' é None após connect().")
+
+
+async def close_services() -> None:
+    await get_supabase_service().close()
+
+
+__all__ = ["get_supabase_service", "get_admin_service", "init_services", "close_services"]
@@ -0,0 +1,118 @@
+# app/services/geo_backfill.py
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from app.services.geoip_service import get_geoip_data, ipapi_client, location_fields
+
+# Tentativas por IP quando a consulta falha durante um cooldown de rate limit (429) do provedor
+_MAX_ATTEMPTS_PER_IP = 3
+
+
+class GeoBackfillJob:
+    """
+    Preenche a localização de linhas de geo_login_logs gravadas sem GeoIP (timeout/erro do provedor no login).
+    Percorre as linhas com country nulo em ordem crescente de (timestamp, id), em páginas;
+    por página, resolve cada IP distinto uma única vez (concorrência e taxa limitadas) e grava
+    com um UPDATE em lote por IP. O cursor e os contadores vão para um checkpoint JSON após cada
+    página, então a execução pode ser interrompida e retomada de onde parou.
+    """
+
+    def __init__(self, checkpoint_path: str, page_size: int, concurrency: int, rate_per_second: float, dry_run: bool = False):
+        self.checkpoint_path = checkpoint_path
+        self.page_size = max(1, page_size)
+        self.concurrency = max(1, concurrency)
+        self.rate_per_second = max(0.0, rate_per_second) # 0 = sem limite (ex: base MMDB local)
+        self.dry_run = dry_run
+        self.state: Dict[str, Any] = {
+            "after": None, "pages": 0, "rows_scanned": 0, "ips_resolved": 0,
+            "ips_unresolved": 0, "rows_updated": 0, "finished": False, "updated_at": None,
+        }
+        self._unresolved: Set[str] = set() # IPs sem localização nesta execução: não consulta de novo
+        self._next_slot = 0.0
+
+    def load_checkpoint(self) -> bool:
+        if not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, encoding="utf-8") as checkpoint_file:
+            self.state.update(json.load(checkpoint_file))
+        return True
+
+    def _save_checkpoint(self) -> None:
+        self.state["updated_at"] = datetime.now(timezone.utc).isoformat()
+        if self.dry_run:
+            return
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(self.state, checkpoint_file, indent=2)
+        os.replace(temp_path, self.checkpoint_path) # Atômico: um Ctrl+C nunca deixa o checkpoint pela metade
+
+    async def _wait_turn(self) -> None:
+        if self.rate_per_second > 0:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.rate_per_second
+            await asyncio.sleep(slot - now)
+        cooldown = ipapi_client.cooldown_remaining() # Provedor em rate limit (429): espera liberar
+        if cooldown > 0:
+            await asyncio.sleep(cooldown)
+
+    async def _resolve(self, ip_address: str, semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            for _ in range(_MAX_ATTEMPTS_PER_IP):
+                await self._wait_turn()
+                geoip_data = await get_geoip_data(ip_address, retry_failed=True)
+                if geoip_data or ipapi_client.cooldown_remaining() == 0:
+                    break
+        fields = location_fields(geoip_data)
+        return fields if fields.get("country") else None # Sem país a linha continuaria "sem localização"
+
+    async def _process_page(self, rows: List[Dict[str, Any]]) -> None:
+        ips = list(dict.fromkeys(row["ip_address"] for row in rows if row.get("ip_address")))
+        ips = [ip_address for ip_address in ips if ip_address not in self._unresolved]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._resolve(ip_address, semaphore) for ip_address in ips))
+        locations = {ip_address: fields for ip_address, fields in zip(ips, results) if fields}
+        self._unresolved.update(ip_address for ip_address, fields in zip(ips, results) if not fields)
+        if locations and not self.dry_run:
+            from app.services import get_supabase_service
+            self.state["rows_updated"] += await get_supabase_service().update_geo_log_locations(locations)
+        self.state["ips_resolved"] += len(locations)
+        self.state["ips_unresolved"] += len(ips) - len(locations)
+
+    async def run(self, max_pages: Optional[int] = None) -> Dict[str, Any]:
+        from app.services import get_supabase_service
+        service = get_supabase_service()
+        started = time.perf_counter()
+        rows_at_start = self.state["rows_scanned"]
+        self.state["finished"] = False
+        pages_run = 0
+        while max_pages is None or pages_run < max_pages:
+            after = tuple(self.state["after"]) if self.state["after"] else None
+            rows = await service.fetch_geo_logs_missing_location(limit=self.page_size, after=after)
+            if rows:
+                await self._process_page(rows)
+                last = rows[-1]
+                self.state["after"] = [last["timestamp"], str(last["id"])]
+                self.state["pages"] += 1
+                self.state["rows_scanned"] += len(rows)
+                pages_run += 1
+            if len(rows) < self.page_size:
+                self.state["finished"] = True
+            self._save_checkpoint() # Só depois do UPDATE: retomar nunca pula uma página não gravada
+            if not rows:
+                break
+            elapsed = time.perf_counter() - started
+            rate = (self.state["rows_scanned"] - rows_at_start) / elapsed if elapsed > 0 else 0.0
+            print(
+                f"INFO:     Backfill GeoIP: página {self.state['pages']} | linhas lidas {self.state['rows_scanned']} "
+                f"| IPs resolvidos {self.state['ips_resolved']}, sem localização {self.state['ips_unresolved']} "
+                f"| linhas atualizadas {self.state['rows_updated']} | {rate:.1f} linhas/s"
+            )
+            if self.state["finished"]:
+                break
+        return self.state
@@ -0,0 +1,204 @@
+# app/services/geo_enrichment.py
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.schemas.geo_log_schemas import GeoLogCreate
+
+
+class GeoEnrichmentPipeline:
+    """
+    Tira o GeoIP e a gravação em geo_login_logs do caminho crítico do login.
+    O handler só enfileira (user_id, ip, user_agent, timestamp); workers resolvem o GeoIP
+    (com retry/backoff) e uma task grava as linhas em lote. A fila de entrada é limitada:
+    se encher, o evento é descartado e contado (o login nunca espera).
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int,
+        workers: int,
+        batch_size: int,
+        flush_interval_seconds: float,
+        max_retries: int,
+        retry_base_delay_seconds: float,
+    ):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_seconds = max(0.01, flush_interval_seconds)
+        self.max_retries = max(0, max_retries)
+        self.retry_base_delay_seconds = max(0.0, retry_base_delay_seconds)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_queue_size))
+        self._resolved: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_queue_size))
+        self._tasks: List[asyncio.Task] = []
+        self._writer: Optional[asyncio.Task] = None
+        self._current_write: Optional[asyncio.Future] = None
+        self._in_flight: Dict[int, Dict[str, Any]] = {} # Eventos em lookup nos workers (por id do evento)
+        self._batch: List[GeoLogCreate] = [] # Lote em formação no writer: já fora de _resolved, ainda não gravado
+
+        # Contadores expostos em /admin-panel/metrics
+        self.enqueued = 0
+        self.dropped = 0
+        self.geo_resolved = 0
+        self.geo_failed = 0
+        self.lookup_retries = 0
+        self.written = 0
+        self.write_failed = 0
+        self.write_retries = 0
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None and not self._writer.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._tasks = [asyncio.create_task(self._resolve_loop(), name=f"geo-enrichment-{index}") for index in range(self.workers)]
+        self._writer = asyncio.create_task(self._write_loop(), name="geo-enrichment-writer")
+        print(f"INFO:     Pipeline de GeoIP iniciado (workers={self.workers}, batch={self.batch_size}, fila={self.queue.maxsize}).")
+
+    async def stop(self) -> None:
+        """Para os workers e grava o que restou; eventos ainda não resolvidos vão sem dados de GeoIP."""
+        for task in [*self._tasks, self._writer]:
+            if task is not None:
+                task.cancel()
+        for task in [*self._tasks, self._writer]:
+            if task is not None:
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._tasks, self._writer = [], None
+        if self._current_write is not None and not self._current_write.done():
+            await self._current_write # Lote que estava sendo gravado no momento do cancelamento
+        # O que os workers e o writer tinham em mãos no cancelamento, depois as filas
+        pending: List[GeoLogCreate] = self._batch
+        self._batch = []
+        while not self._resolved.empty():
+            pending.append(self._resolved.get_nowait())
+        pending.extend(self._build_log(event, None) for event in self._in_flight.values())
+        self._in_flight.clear()
+        while not self.queue.empty():
+            pending.append(self._build_log(self.queue.get_nowait(), None))
+        for start in range(0, len(pending), self.batch_size):
+            await self._write_batch(pending[start:start + self.batch_size], retry=False)
+        print(f"INFO:     Pipeline de GeoIP finalizado. Gravados={self.written}, descartados={self.dropped}, falhas={self.write_failed}.")
+
+    def enqueue_login(self, user_id: uuid.UUID, ip_address: str, user_agent: Optional[str], timestamp: Optional[datetime] = None) -> bool:
+        event = {
+            "user_id": user_id, "ip_address": ip_address, "user_agent": user_agent,
+            "timestamp": timestamp or datetime.now(timezone.utc),
+        }
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_size": self.queue.qsize(),
+            "queue_max_size": self.queue.maxsize,
+            "resolved_pending": self._resolved.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "geo_resolved": self.geo_resolved,
+            "geo_failed": self.geo_failed,
+            "lookup_retries": self.lookup_retries,
+            "written": self.written,
+            "write_failed": self.write_failed,
+            "write_retries": self.write_retries,
+        }
+
+    @staticmethod
+    def _build_log(event: Dict[str, Any], geoip_data: Optional[Dict[str, Any]]) -> GeoLogCreate:
+        from app.services.geoip_service import location_fields
+        return GeoLogCreate(
+            user_id=event["user_id"], ip_address=event["ip_address"],
+            user_agent=event["user_agent"], timestamp=event["timestamp"],
+            **location_fields(geoip_data),
+        )
+
+    async def _lookup(self, ip_address: str) -> Optional[Dict[str, Any]]:
+        from app.services.geoip_service import get_geoip_data, ipapi_client
+        for attempt in range(self.max_retries + 1):
+            geoip_data = await get_geoip_data(ip_address, retry_failed=attempt > 0) # None = falha (timeout, 429, 5xx...)
+            if geoip_data:
+                return geoip_data
+            if attempt < self.max_retries:
+                self.lookup_retries += 1
+                # Em rate limit (429), espera o provedor liberar em vez de gastar as tentativas no cooldown
+                await asyncio.sleep(max(self.retry_base_delay_seconds * (2 ** attempt), ipapi_client.cooldown_remaining()))
+        return None
+
+    async def _resolve_loop(self) -> None:
+        while True:
+            event = await self.queue.get()
+            self._in_flight[id(event)] = event # Até chegar a _resolved: stop() grava sem GeoIP se o worker for cancelado
+            geoip_data = None
+            try:
+                geoip_data = await self._lookup(event["ip_address"])
+            except Exception as e:
+                print(f"ERRO no GeoIP em segundo plano para {event['ip_address']}: {e}")
+            if geoip_data: self.geo_resolved += 1
+            else: self.geo_failed += 1 # O login é registrado mesmo sem localização
+            await self._resolved.put(self._build_log(event, geoip_data))
+            self._in_flight.pop(id(event), None)
+
+    async def _collect_batch(self) -> List[GeoLogCreate]:
+        # Mesmo esquema do ApiLogSink: espera a primeira linha, depois até encher o lote ou expirar o intervalo.
+        # O lote fica em self._batch para stop() gravar o que já saiu de _resolved se o writer for cancelado
+        batch = self._batch
+        batch.append(await self._resolved.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._resolved.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write_loop(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            self._batch = []
+            # shield: cancelar o writer (stop) não interrompe um INSERT em andamento
+            self._current_write = asyncio.ensure_future(self._write_batch(batch, retry=True))
+            await asyncio.shield(self._current_write)
+
+    async def _write_batch(self, batch: List[GeoLogCreate], retry: bool) -> None:
+        if not batch:
+            return
+        from app.services import get_supabase_service
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            try:
+                if await get_supabase_service().insert_geo_logs(batch):
+                    self.written += len(batch)
+                    return
+            except Exception as e:
+                print(f"ERRO ao gravar lote de {len(batch)} geo logs: {e}")
+            if attempt < attempts - 1:
+                self.write_retries += 1
+                await asyncio.sleep(self.retry_base_delay_seconds * (2 ** attempt))
+        self.write_failed += len(batch)
+        print(f"AVISO: {len(batch)} geo logs descartados após {attempts} tentativa(s).")
+
+
+geo_enrichment = GeoEnrichmentPipeline(
+    max_queue_size=settings.GEO_ENRICHMENT_QUEUE_MAX_SIZE,
+    workers=settings.GEO_ENRICHMENT_WORKERS,
+    batch_size=settings.GEO_ENRICHMENT_BATCH_SIZE,
+    flush_interval_seconds=settings.GEO_ENRICHMENT_FLUSH_INTERVAL_SECONDS,
+    max_retries=settings.GEO_ENRICHMENT_MAX_RETRIES,
+    retry_base_delay_seconds=settings.GEO_ENRICHMENT_RETRY_BASE_DELAY_SECONDS,
+)
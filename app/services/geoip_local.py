@@ -0,0 +1,130 @@
+# app/services/geoip_local.py
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+def _name(entry: Optional[Dict[str, Any]]) -> Optional[str]:
+    names = (entry or {}).get("names") or {}
+    return names.get("en") or next(iter(names.values()), None)
+
+
+def _to_geoip_dict(ip_address: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    # Mesmo formato montado a partir do ipapi.co em geoip_service._fetch_geoip_data
+    subdivisions = record.get("subdivisions") or []
+    location = record.get("location") or {}
+    traits = record.get("traits") or {}
+    return {
+        "ip": ip_address,
+        "city": _name(record.get("city")),
+        "region": _name(subdivisions[0]) if subdivisions else None,
+        "country_name": _name(record.get("country")) or _name(record.get("registered_country")),
+        "latitude": location.get("latitude"),
+        "longitude": location.get("longitude"),
+        "org": traits.get("organization") or traits.get("isp") or traits.get("autonomous_system_organization"), # Só em bases pagas/ASN
+    }
+
+
+class MMDBGeoIPResolver:
+    """
+    Resolução GeoIP local a partir de uma base no formato MaxMind (MMDB: GeoLite2/GeoIP2 City, DB-IP City),
+    lida por um reader memory-mapped: lookups em microssegundos, sem rede e sem limite de requisições.
+    Hot reload: a cada GEOIP_MMDB_RELOAD_CHECK_SECONDS o arquivo é verificado (inode, tamanho, mtime)
+    e, se mudou, reaberto. Para trocar a base, grave o novo arquivo ao lado e faça `mv` (rename atômico).
+    """
+
+    def __init__(self, path: str, reload_check_seconds: float):
+        self.path = path
+        self.reload_check_seconds = max(0.0, reload_check_seconds)
+        self._reader = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._next_check = 0.0
+        self._missing = False
+        self.build_epoch: Optional[int] = None
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.load_errors = 0
+
+    @property
+    def available(self) -> bool:
+        return self._reader is not None
+
+    def ensure_loaded(self) -> bool:
+        self._next_check = 0.0 # Força a verificação do arquivo (warmup)
+        self._maybe_reload()
+        return self.available
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_check_seconds
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if not self._missing: # Loga só na transição, não a cada verificação
+                print(f"AVISO: Base GeoIP local '{self.path}' indisponível: {e}")
+                self.load_errors += 1
+            self._missing, self._signature = True, None # Mantém o reader atual (se houver) até o arquivo voltar
+            return
+        self._missing = False
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if signature == self._signature:
+            return
+        self._signature = signature # Mesmo se falhar: só tenta de novo quando o arquivo mudar
+        try:
+            import maxminddb # Dependência opcional: só com GEOIP_PROVIDER="mmdb"
+            reader = maxminddb.open_database(self.path, maxminddb.MODE_AUTO) # Extensão C (mmap) se instalada, senão mmap em Python
+        except Exception as e:
+            self.load_errors += 1
+            print(f"ERRO ao abrir a base GeoIP local '{self.path}': {e}")
+            return
+        old_reader, self._reader = self._reader, reader
+        self.build_epoch = reader.metadata().build_epoch
+        if old_reader is not None:
+            old_reader.close()
+            self.reloads += 1
+        print(f"INFO:     Base GeoIP local carregada: {self.path} (build_epoch={self.build_epoch}).")
+
+    def lookup(self, ip_address: str) -> Optional[Dict[str, Any]]:
+        """Dict no formato de get_geoip_data, ou None (base indisponível, IP inválido ou não encontrado)."""
+        self._maybe_reload()
+        if self._reader is None:
+            return None
+        self.lookups += 1
+        try:
+            record = self._reader.get(ip_address)
+        except ValueError: # Não é um endereço IP
+            record = None
+        if not record:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _to_geoip_dict(ip_address, record)
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+        self._reader, self._signature = None, None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "available": self.available,
+            "build_epoch": self.build_epoch,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "load_errors": self.load_errors,
+        }
+
+
+mmdb_resolver = MMDBGeoIPResolver(
+    path=settings.GEOIP_MMDB_PATH,
+    reload_check_seconds=settings.GEOIP_MMDB_RELOAD_CHECK_SECONDS,
+)
@@ -1,34 +1,185 @@
-import httpx
+import ipaddress
+import time
 from app.core.config import settings
-from typing import Optional, Dict
+from typing import Any, Optional, Dict
+from app.utils.single_flight import SingleFlight
+from app.utils.ttl_cache import TTLCache, MISSING
+from app.services.geoip_local import mmdb_resolver
 
-async def get_geoip_data(ip_address: str) -> Optional[Dict]:
-    if ip_address == "127.0.0.1" or ip_address == "localhost": # ipapi.co não resolve localhost
-        return {"ip": ip_address, "city": "Localhost", "country_name": "Local Network", "org": "Local Machine"}
+GEOIP_PROVIDER_HTTP = "http"
+GEOIP_PROVIDER_MMDB = "mmdb"
 
-    url = f"{settings.IPAPI_URL}/{ip_address}/json/"
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=5.0) # Timeout de 5s
-            response.raise_for_status() # Lança exceção para 4xx/5xx
+geoip_lookup_flight = SingleFlight(name="get_geoip_data")
+
+# Resultados do ipapi.co por IP. None = IP sem localização (privado, reservado, desconhecido pelo provedor);
+# _LOOKUP_FAILED = falha transitória (timeout, 5xx), com TTL curto.
+geoip_cache = TTLCache(
+    max_size=settings.GEOIP_CACHE_MAX_SIZE,
+    ttl_seconds=settings.GEOIP_CACHE_TTL_SECONDS,
+    name="geoip",
+)
+_LOOKUP_FAILED = object()
+
+
+class IpapiClient:
+    """
+    Cliente HTTP único para o ipapi.co (keep-alive + HTTP/2), aberto e fechado pelo lifespan:
+    o handshake TCP/TLS é pago uma vez, não a cada login.
+    Em 429 o provedor entra em "cooldown" (Retry-After ou backoff exponencial) e nenhuma
+    consulta sai até ele expirar.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._cooldown_until = 0.0
+        self._consecutive_rate_limits = 0
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.skipped_in_cooldown = 0
+
+    async def open(self) -> None:
+        if self._client is not None:
+            return
+        import httpx # Import tardio: fora do caminho de import da aplicação (cold start)
+        limits = httpx.Limits(
+            max_connections=settings.GEOIP_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GEOIP_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=settings.GEOIP_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        try:
+            self._client = httpx.AsyncClient(http2=settings.GEOIP_HTTP2, limits=limits, timeout=settings.GEOIP_HTTP_TIMEOUT_SECONDS)
+        except ImportError: # http2=True sem o pacote 'h2' instalado
+            print("AVISO: Pacote 'h2' não instalado; cliente GeoIP usando HTTP/1.1 (instale httpx[http2]).")
+            self._client = httpx.AsyncClient(limits=limits, timeout=settings.GEOIP_HTTP_TIMEOUT_SECONDS)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def cooldown_remaining(self) -> float:
+        return max(0.0, self._cooldown_until - time.monotonic())
+
+    def _enter_cooldown(self, retry_after: Optional[str]) -> float:
+        self._consecutive_rate_limits += 1
+        try:
+            delay = float(retry_after) # Retry-After em segundos (o formato data HTTP cai no backoff)
+        except (TypeError, ValueError):
+            delay = settings.GEOIP_RATE_LIMIT_BACKOFF_SECONDS * (2 ** (self._consecutive_rate_limits - 1))
+        delay = min(max(delay, 1.0), settings.GEOIP_RATE_LIMIT_MAX_BACKOFF_SECONDS)
+        self._cooldown_until = time.monotonic() + delay
+        return delay
+
+    async def lookup(self, ip_address: str) -> Any:
+        """Dict no formato de get_geoip_data, None (IP sem localização) ou _LOOKUP_FAILED."""
+        if self.cooldown_remaining() > 0:
+            self.skipped_in_cooldown += 1
+            return _LOOKUP_FAILED
+        if self._client is None:
+            await self.open() # Uso fora da aplicação (scripts): abre sob demanda
+        import httpx
+        self.requests += 1
+        try:
+            response = await self._client.get(f"{settings.IPAPI_URL}/{ip_address}/json/")
+        except httpx.RequestError as e:
+            self.failures += 1
+            print(f"Erro de requisição ao buscar GeoIP para {ip_address}: {e}")
+            return _LOOKUP_FAILED
+        if response.status_code == 429:
+            self.rate_limited += 1
+            delay = self._enter_cooldown(response.headers.get("retry-after"))
+            print(f"AVISO: ipapi.co respondeu 429 (rate limit). Consultas GeoIP suspensas por {delay:.0f}s.")
+            return _LOOKUP_FAILED
+        self._consecutive_rate_limits = 0
+        if response.status_code >= 500:
+            self.failures += 1
+            print(f"Erro HTTP ao buscar GeoIP para {ip_address}: {response.status_code} - {response.text}")
+            return _LOOKUP_FAILED
+        if response.status_code >= 400: # IP inválido para o provedor: não adianta tentar de novo
+            return None
+        try:
             data = response.json()
-            # print(f"GeoIP Data for {ip_address}: {data}") # Debug
-            # Mapear para os campos que queremos, ipapi.co pode ter nomes diferentes
-            return {
-                "ip": data.get("ip"),
-                "city": data.get("city"),
-                "region": data.get("region"),
-                "country_name": data.get("country_name") or data.get("country"), # ipapi usa country_name
-                "latitude": data.get("latitude"),
-                "longitude": data.get("longitude"),
-                "org": data.get("org") # ISP / Organização
-            }
-    except httpx.HTTPStatusError as e:
-        print(f"Erro HTTP ao buscar GeoIP para {ip_address}: {e.response.status_code} - {e.response.text}")
-        return None
-    except httpx.RequestError as e:
-        print(f"Erro de requisição ao buscar GeoIP para {ip_address}: {e}")
+        except ValueError as e:
+            self.failures += 1
+            print(f"Erro inesperado ao buscar GeoIP para {ip_address}: {e}")
+            return _LOOKUP_FAILED
+        if data.get("error"): # ex: {"error": true, "reason": "Reserved IP Address"}
+            return None
+        # Mapear para os campos que queremos, ipapi.co pode ter nomes diferentes
+        return {
+            "ip": data.get("ip"),
+            "city": data.get("city"),
+            "region": data.get("region"),
+            "country_name": data.get("country_name") or data.get("country"), # ipapi usa country_name
+            "latitude": data.get("latitude"),
+            "longitude": data.get("longitude"),
+            "org": data.get("org") # ISP / Organização
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open": self._client is not None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited,
+            "skipped_in_cooldown": self.skipped_in_cooldown,
+            "cooldown_remaining_seconds": round(self.cooldown_remaining(), 1),
+        }
+
+
+ipapi_client = IpapiClient()
+
+
+def location_fields(geoip_data: Optional[Dict]) -> Dict[str, Any]:
+    """Campos de localização de geo_login_logs a partir do dict de get_geoip_data (vazio se None)."""
+    if not geoip_data:
+        return {}
+    return {
+        "country": geoip_data.get("country_name"),
+        "city": geoip_data.get("city"),
+        "region": geoip_data.get("region"),
+        "latitude": geoip_data.get("latitude"),
+        "longitude": geoip_data.get("longitude"),
+    }
+
+def _has_public_location(ip_address: str) -> bool:
+    try:
+        return ipaddress.ip_address(ip_address).is_global
+    except ValueError:
+        return False
+
+async def get_geoip_data(ip_address: str, retry_failed: bool = False) -> Optional[Dict]:
+    """
+    Dados de GeoIP do IP, ou None. `retry_failed=True` ignora uma falha transitória cacheada
+    (usado pelos retries do GeoEnrichmentPipeline).
+    """
+    if ip_address == "127.0.0.1" or ip_address == "localhost": # Nem ipapi.co nem a base local resolvem localhost
+        return {"ip": ip_address, "city": "Localhost", "country_name": "Local Network", "org": "Local Machine"}
+    if not _has_public_location(ip_address): # Privado/reservado/inválido: nunca sai da aplicação
         return None
+    if settings.GEOIP_PROVIDER == GEOIP_PROVIDER_MMDB:
+        geoip_data = mmdb_resolver.lookup(ip_address) # Síncrono: leitura em memória (mmap), sem I/O de rede
+        if geoip_data is not None or not settings.GEOIP_HTTP_FALLBACK:
+            return geoip_data
+    cached = geoip_cache.get(ip_address)
+    if cached is not MISSING and not (cached is _LOOKUP_FAILED and retry_failed):
+        return None if cached is _LOOKUP_FAILED else cached
+    # Logins simultâneos do mesmo IP compartilham uma única consulta ao ipapi.co
+    return await geoip_lookup_flight.do(ip_address, _fetch_geoip_data, ip_address)
+
+async def _fetch_geoip_data(ip_address: str) -> Optional[Dict]:
+    try:
+        result = await ipapi_client.lookup(ip_address)
     except Exception as e:
         print(f"Erro inesperado ao buscar GeoIP para {ip_address}: {e}")
+        result = _LOOKUP_FAILED
+    if result is _LOOKUP_FAILED:
+        if ipapi_client.cooldown_remaining() == 0: # Em cooldown (429) não cacheia: o próprio cooldown segura as consultas
+            geoip_cache.set(ip_address, _LOOKUP_FAILED, ttl_seconds=settings.GEOIP_FAILURE_CACHE_TTL_SECONDS)
+        return None
+    if result is None:
+        geoip_cache.set(ip_address, None, ttl_seconds=settings.GEOIP_NEGATIVE_CACHE_TTL_SECONDS)
         return None
+    geoip_cache.set(ip_address, result)
+    return result
@@ -0,0 +1,110 @@
+# app/services/log_export.py
+"""
+Exportação em streaming (NDJSON ou CSV, opcionalmente gzip) de api_logs e geo_login_logs.
+As linhas são lidas em blocos de tamanho fixo por keyset (timestamp, id) e escritas conforme
+chegam: a memória fica constante, independentemente do tamanho do intervalo exportado.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.responses import StreamingResponse
+
+from app.utils.pagination import CursorKeys
+
+EXPORT_FORMAT_NDJSON = "ndjson"
+EXPORT_FORMAT_CSV = "csv"
+_MEDIA_TYPES = {EXPORT_FORMAT_NDJSON: "application/x-ndjson", EXPORT_FORMAT_CSV: "text/csv; charset=utf-8"}
+
+Row = Dict[str, Any]
+FetchPage = Callable[[Optional[Tuple[Any, ...]]], Awaitable[List[Row]]]
+
+
+async def open_keyset_pages(fetch_page: FetchPage, chunk_size: int, keys: CursorKeys) -> AsyncIterator[List[Row]]:
+    """
+    Busca a primeira página já aqui (erros de banco viram 500 antes de o streaming começar)
+    e devolve um iterador assíncrono que segue pelas próximas páginas via keyset.
+    """
+    first_page = await fetch_page(None)
+
+    async def pages() -> AsyncIterator[List[Row]]:
+        rows = first_page
+        while rows:
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            last = rows[-1]
+            rows = await fetch_page(tuple(convert(last[column]) for column, convert in keys.values()))
+
+    return pages()
+
+
+def _json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+async def _encode_ndjson(pages: AsyncIterator[List[Row]]) -> AsyncIterator[bytes]:
+    async for rows in pages:
+        yield "".join(json.dumps(row, default=_json_default, separators=(",", ":")) + "\n" for row in rows).encode("utf-8")
+
+
+def _csv_cell(value: Any) -> Any:
+    if value is None: return ""
+    if isinstance(value, (dict, list)): return json.dumps(value, default=_json_default, separators=(",", ":"))
+    return value
+
+
+async def _encode_csv(pages: AsyncIterator[List[Row]], columns: Sequence[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for rows in pages:
+        for row in rows:
+            writer.writerow([_csv_cell(row.get(column)) for column in columns])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell(): # Só o cabeçalho (exportação vazia)
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31: formato gzip
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def _log_stream_errors(chunks: AsyncIterator[bytes], name: str) -> AsyncIterator[bytes]:
+    # Depois do primeiro byte não há como mudar o status: registra e encerra (o arquivo fica truncado)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except Exception as e:
+        print(f"ERRO: exportação '{name}' interrompida no meio do streaming: {e}")
+        raise
+
+
+def export_response(
+    pages: AsyncIterator[List[Row]], export_format: str, columns: Sequence[str], gzip: bool, name: str,
+) -> StreamingResponse:
+    if export_format == EXPORT_FORMAT_CSV:
+        body = _encode_csv(pages, columns)
+    else:
+        body = _encode_ndjson(pages)
+    filename = f"{name}_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.{export_format}"
+    media_type = _MEDIA_TYPES.get(export_format, _MEDIA_TYPES[EXPORT_FORMAT_NDJSON])
+    if gzip:
+        body = _gzip(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        _log_stream_errors(body, name),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
@@ -0,0 +1,160 @@
+# app/services/log_sink.py
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+OVERFLOW_DROP = "drop"
+OVERFLOW_BLOCK = "block"
+
+
+class ApiLogSink:
+    """
+    Fila em memória (limitada) para as linhas de api_logs.
+    O middleware apenas enfileira; uma task de fundo insere as linhas em lote
+    quando o lote enche (batch_size) ou quando o intervalo de flush expira.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval_seconds: float,
+        overflow_policy: str = OVERFLOW_DROP,
+    ):
+        if overflow_policy not in (OVERFLOW_DROP, OVERFLOW_BLOCK):
+            print(f"AVISO: API_LOG_OVERFLOW_POLICY inválida '{overflow_policy}'. Usando '{OVERFLOW_DROP}'.")
+            overflow_policy = OVERFLOW_DROP
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_seconds = max(0.01, flush_interval_seconds)
+        self.overflow_policy = overflow_policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_queue_size))
+        self._task: Optional[asyncio.Task] = None
+        self._current_write: Optional[asyncio.Future] = None
+        self._batch: List[Dict[str, Any]] = [] # Lote em formação: já fora da fila, ainda não gravado
+
+        # Contadores expostos em /admin-panel/metrics
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run(), name="api-log-sink-flusher")
+        print(f"INFO:     ApiLogSink iniciado (batch={self.batch_size}, intervalo={self.flush_interval_seconds}s, overflow='{self.overflow_policy}').")
+
+    async def stop(self) -> None:
+        """Para o flusher e grava tudo o que ainda está na fila."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._current_write is not None and not self._current_write.done():
+            await self._current_write # Lote que estava sendo gravado no momento do cancelamento
+        batch, self._batch = self._batch, [] # Lote que estava sendo montado no momento do cancelamento
+        await self._write_batch(batch)
+        while not self.queue.empty():
+            await self._write_batch(self._drain_nowait(self.batch_size))
+        print(f"INFO:     ApiLogSink finalizado. Gravados={self.written}, descartados={self.dropped}, falhas={self.failed}.")
+
+    async def enqueue(self, log_entry: Dict[str, Any]) -> bool:
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            await self.queue.put(log_entry)
+            self.enqueued += 1
+            return True
+        try:
+            self.queue.put_nowait(log_entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_size": self.queue.qsize(),
+            "queue_max_size": self.queue.maxsize,
+            "overflow_policy": self.overflow_policy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+    def _drain_nowait(self, max_items: int) -> List[Dict[str, Any]]:
+        batch: List[Dict[str, Any]] = []
+        while len(batch) < max_items:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _collect_batch(self) -> List[Dict[str, Any]]:
+        # Espera (sem timeout) pela primeira linha; depois acumula até encher o lote ou expirar o intervalo.
+        # O lote fica em self._batch: se o flusher for cancelado no meio, stop() grava o que já saiu da fila
+        batch = self._batch
+        batch.append(await self.queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval_seconds
+        while len(batch) < self.batch_size:
+            batch.extend(self._drain_nowait(self.batch_size - len(batch)))
+            if len(batch) >= self.batch_size:
+                break
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            self._batch = []
+            # shield: cancelar o flusher (stop) não interrompe um INSERT em andamento
+            self._current_write = asyncio.ensure_future(self._write_batch(batch))
+            await asyncio.shield(self._current_write)
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        from app.services.supabase_service import get_supabase_service # Importar aqui para tentar mitigar startup issues
+        supabase_service = get_supabase_service()
+        try:
+            if not supabase_service or not supabase_service.client:
+                print(f"AVISO DE LOGGING: Cliente Supabase não disponível, {len(batch)} logs da API não serão salvos.")
+                self.failed += len(batch)
+                return
+            # insert_api_logs é uma coroutine real (AsyncClient ou threadpool), não trava o event loop
+            if await supabase_service.insert_api_logs(batch):
+                self.written += len(batch)
+            else:
+                self.failed += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"ERRO CRÍTICO AO SALVAR LOTE DE LOGS DA API ({len(batch)} linhas): {e}")
+        finally:
+            self.batches += 1
+
+
+api_log_sink = ApiLogSink(
+    max_queue_size=settings.API_LOG_QUEUE_MAX_SIZE,
+    batch_size=settings.API_LOG_BATCH_SIZE,
+    flush_interval_seconds=settings.API_LOG_FLUSH_INTERVAL_SECONDS,
+    overflow_policy=settings.API_LOG_OVERFLOW_POLICY,
+)
@@ -0,0 +1,102 @@
+# app/services/password_hashing_service.py
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.utils.security import verify_password, get_password_hash
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+
+class PasswordHashingBusyError(Exception):
+    """Fila do pool de hashing cheia: a requisição deve ser recusada (503) em vez de enfileirar sem limite."""
+
+
+class PasswordHashingService:
+    """
+    Executa o bcrypt (passlib) num pool limitado de threads ou processos, fora do event loop.
+    O número de operações em andamento (executando + aguardando) é limitado a max_workers + max_queue.
+    """
+
+    def __init__(self, executor_kind: str, max_workers: int, max_queue: int):
+        if executor_kind not in (EXECUTOR_THREAD, EXECUTOR_PROCESS):
+            print(f"AVISO: PASSWORD_HASH_EXECUTOR inválido '{executor_kind}'. Usando '{EXECUTOR_THREAD}'.")
+            executor_kind = EXECUTOR_THREAD
+        self.executor_kind = executor_kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        # Criado sob demanda para funcionar também fora do lifespan (ex: scripts)
+        if self._executor is None:
+            if self.executor_kind == EXECUTOR_PROCESS:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+            print(f"INFO:     Pool de hashing de senhas criado ({self.executor_kind}, workers={self.max_workers}, fila={self.max_queue}).")
+        return self._executor
+
+    async def _submit(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHashingBusyError("Password hashing queue is full.")
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    async def hash_password(self, password: str) -> str:
+        return await self._submit(get_password_hash, password)
+
+    async def warmup(self) -> None:
+        """Cria o pool, carrega o passlib/bcrypt em cada worker e paga o custo do primeiro hash fora de um request."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        sample_hash = await loop.run_in_executor(executor, get_password_hash, "warmup")
+        await asyncio.gather(*[
+            loop.run_in_executor(executor, verify_password, "warmup", sample_hash) for _ in range(self.max_workers)
+        ])
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executor": self.executor_kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHashingService(
+    executor_kind=settings.PASSWORD_HASH_EXECUTOR,
+    max_workers=settings.PASSWORD_HASH_MAX_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Versão assíncrona de verify_password: não trava o event loop durante o bcrypt."""
+    return await password_hasher.verify_password(plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    """Versão assíncrona de get_password_hash: não trava o event loop durante o bcrypt."""
+    return await password_hasher.hash_password(password)
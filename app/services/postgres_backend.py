@@ -0,0 +1,364 @@
+# app/services/postgres_backend.py
+"""
+Backend de armazenamento alternativo: Postgres direto (asyncpg), sem passar pelo PostgREST.
+Selecionado com DATABASE_BACKEND="postgres" + DATABASE_URL (ex: um Postgres local para testes).
+
+- Pool de conexões assíncrono compartilhado por SupabaseService e AdminService.
+- Queries parametrizadas: o asyncpg prepara cada statement uma vez por conexão e reutiliza
+  (cache de prepared statements, tamanho em DATABASE_STATEMENT_CACHE_SIZE; use 0 atrás de
+  poolers em modo transaction, como o Supavisor/pgbouncer).
+- Inserção de api_logs e geo_login_logs em lote via COPY.
+A autenticação de usuários (GoTrue) continua indo pelo cliente Supabase.
+"""
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Any, Dict, List, Tuple
+
+from app.core.config import settings
+from app.schemas.geo_log_schemas import GeoLogCreate
+from app.services.admin_service import AdminService
+from app.services.supabase_service import SupabaseService, _rotation_result
+from app.auth.revoked_token_filter import revoked_token_filter
+from app.utils.security import hash_token
+from app.schemas.columns import (
+    API_LOG_COLUMNS, API_LOG_FIELDS_FULL, GEO_LOG_COLUMNS, GEO_LOG_BACKFILL_COLUMNS, GEO_LOG_LOCATION_FIELDS,
+    REFRESH_TOKEN_COLUMNS, ADMIN_COLUMNS, ADMIN_PUBLIC_COLUMNS,
+    TRAFFIC_ROLLUP_COLUMNS, TRAFFIC_ROLLUP_CONFLICT_COLUMNS,
+)
+
+# Colunas timestamptz que chegam como string ISO da camada de serviço (formato do PostgREST)
+_TIMESTAMP_COLUMNS = {"expires_at", "issued_at", "last_login_at", "created_at", "updated_at", "timestamp", "bucket_start"}
+
+# Colunas graváveis por tabela (nomes de coluna nunca vêm do cliente, mas validamos mesmo assim)
+_ADMIN_COLUMNS = {"username", "password_hash", "client_hwid_identifier_hash", "status", "last_login_at"}
+_ADMIN_LOOKUP_COLUMNS = {"id", "username"}
+
+
+def _to_db_value(column: str, value: Any) -> Any:
+    if column in _TIMESTAMP_COLUMNS and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _select_list(columns: Tuple[str, ...]) -> str:
+    return ", ".join(f'"{column}"' for column in columns) # Aspas: "timestamp" também é nome de tipo
+
+
+def _row_to_dict(record: Any) -> Dict[str, Any]:
+    # Mesmo formato que o PostgREST devolve (UUIDs e datas como string), para os chamadores não mudarem
+    row: Dict[str, Any] = {}
+    for key, value in dict(record).items():
+        if isinstance(value, uuid.UUID): value = str(value)
+        elif isinstance(value, datetime): value = value.isoformat()
+        row[key] = value
+    return row
+
+
+class PostgresPool:
+    def __init__(self):
+        self.pool = None
+
+    async def _init_connection(self, conn) -> None:
+        for json_type in ("json", "jsonb"):
+            await conn.set_type_codec(json_type, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def connect(self) -> None:
+        if self.pool is not None:
+            return
+        if not settings.DATABASE_URL:
+            print("ERRO FATAL: DATABASE_BACKEND='postgres' mas DATABASE_URL não está definida.")
+            return
+        try:
+            import asyncpg
+            self.pool = await asyncpg.create_pool(
+                dsn=settings.DATABASE_URL,
+                min_size=settings.DATABASE_POOL_MIN_SIZE,
+                max_size=settings.DATABASE_POOL_MAX_SIZE,
+                statement_cache_size=settings.DATABASE_STATEMENT_CACHE_SIZE,
+                init=self._init_connection,
+            )
+            print(f"INFO:     Pool Postgres INICIALIZADO (min={settings.DATABASE_POOL_MIN_SIZE}, max={settings.DATABASE_POOL_MAX_SIZE}).")
+        except Exception as e:
+            print(f"ERRO FATAL AO CRIAR O POOL POSTGRES: {e}")
+            import traceback
+            traceback.print_exc()
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+
+postgres_pool = PostgresPool()
+
+
+class PostgresSupabaseService(SupabaseService):
+    """Mesmas assinaturas do SupabaseService; as operações de tabela vão direto ao Postgres."""
+
+    async def connect(self) -> None:
+        await super().connect()
+        await postgres_pool.connect()
+
+    async def close(self) -> None:
+        await postgres_pool.close()
+        await super().close()
+
+    async def warmup(self) -> None:
+        await super().warmup()
+        if self.pool: await self.pool.fetchval("SELECT 1") # Já usa o cache de statements da conexão
+
+    @property
+    def pool(self):
+        return postgres_pool.pool
+
+    async def add_geo_log(self, log_data: GeoLogCreate) -> bool:
+        if not self.pool: print("ERRO: add_geo_log, pool Postgres indisponível."); return False
+        data = log_data.model_dump()
+        try:
+            await self.pool.execute(
+                "INSERT INTO geo_login_logs (user_id, ip_address, user_agent, country, city, region, latitude, longitude) "
+                "VALUES ($1, $2, $3, $4, $5, $6, $7, $8)",
+                data["user_id"], data["ip_address"], data["user_agent"], data["country"],
+                data["city"], data["region"], data["latitude"], data["longitude"],
+            )
+            return True
+        except Exception as e: print(f"Erro ao adicionar geo log: {e}"); return False
+
+    async def insert_geo_logs(self, logs: List[GeoLogCreate]) -> bool:
+        if not self.pool: print("ERRO: insert_geo_logs, pool Postgres indisponível."); return False
+        if not logs: return True
+        columns = ["user_id", "ip_address", "user_agent", "country", "city", "region", "latitude", "longitude", "timestamp"]
+        records = []
+        for log in logs:
+            data = log.model_dump()
+            if data["timestamp"] is None: data["timestamp"] = datetime.now(timezone.utc) # COPY não aplica o default da coluna
+            records.append(tuple(data[column] for column in columns))
+        async with self.pool.acquire() as conn:
+            await conn.copy_records_to_table("geo_login_logs", records=records, columns=columns) # COPY em lote
+        return True
+
+    async def insert_api_logs(self, log_entries: List[Dict[str, Any]]) -> bool:
+        if not self.pool: print("ERRO: insert_api_logs, pool Postgres indisponível."); return False
+        if not log_entries: return True
+        columns = list(dict.fromkeys(column for entry in log_entries for column in entry)) # União das chaves, na ordem
+        records = [tuple(_to_db_value(column, entry.get(column)) for column in columns) for entry in log_entries]
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.copy_records_to_table("api_logs", records=records, columns=columns) # COPY em lote
+            return True
+        except Exception as e:
+            print(f"Erro ao inserir (COPY) lote de {len(log_entries)} logs da API: {e}")
+            return False
+
+    async def get_api_logs(
+        self, skip: int = 0, limit: int = 50, method: Optional[str] = None, status_code: Optional[int] = None,
+        path_contains: Optional[str] = None, user_id: Optional[uuid.UUID] = None, admin_id: Optional[uuid.UUID] = None,
+        fields: str = API_LOG_FIELDS_FULL, after: Optional[Tuple[str, Any]] = None,
+        since: Optional[datetime] = None, until: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        if not self.pool: raise RuntimeError("get_api_logs, pool Postgres indisponível.")
+        conditions: List[str] = []
+        params: List[Any] = []
+        def add(condition: str, value: Any) -> None:
+            params.append(value)
+            conditions.append(condition.format(f"${len(params)}"))
+        if method: add("method = {}", method.upper())
+        if status_code is not None: add("status_code = {}", status_code)
+        if path_contains: add("path ILIKE {}", f"%{path_contains}%")
+        if user_id: add("user_id = {}", user_id)
+        if admin_id: add("admin_id = {}", admin_id)
+        if since: add("timestamp >= {}", since)
+        if until: add("timestamp < {}", until)
+        if after: # Keyset: (timestamp, id) da última linha da página anterior; `skip` é ignorado
+            params.extend([datetime.fromisoformat(after[0]), after[1]])
+            conditions.append(f"(timestamp, id) < (${len(params) - 1}, ${len(params)})")
+            skip = 0
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.extend([limit, skip])
+        rows = await self.pool.fetch(
+            f"SELECT {_select_list(API_LOG_COLUMNS[fields])} FROM api_logs {where} "
+            f"ORDER BY timestamp DESC, id DESC LIMIT ${len(params) - 1} OFFSET ${len(params)}",
+            *params,
+        )
+        return [_row_to_dict(row) for row in rows]
+
+    async def fetch_geo_logs(
+        self, limit: int = 100, offset: int = 0, after: Optional[Tuple[str, Any]] = None,
+        user_id: Optional[uuid.UUID] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        if not self.pool: raise RuntimeError("fetch_geo_logs, pool Postgres indisponível.")
+        conditions: List[str] = []
+        params: List[Any] = []
+        def add(condition: str, value: Any) -> None:
+            params.append(value)
+            conditions.append(condition.format(f"${len(params)}"))
+        if user_id: add("user_id = {}", user_id)
+        if since: add("timestamp >= {}", since)
+        if until: add("timestamp < {}", until)
+        if after:
+            params.extend([datetime.fromisoformat(after[0]), uuid.UUID(after[1])])
+            conditions.append(f"(timestamp, id) < (${len(params) - 1}, ${len(params)})")
+            offset = 0
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.extend([limit, offset])
+        rows = await self.pool.fetch(
+            f"SELECT {_select_list(GEO_LOG_COLUMNS)} FROM geo_login_logs {where} "
+            f"ORDER BY timestamp DESC, id DESC LIMIT ${len(params) - 1} OFFSET ${len(params)}",
+            *params,
+        )
+        return [_row_to_dict(row) for row in rows]
+
+    async def fetch_geo_logs_missing_location(self, limit: int, after: Optional[Tuple[str, Any]] = None) -> List[Dict[str, Any]]:
+        if not self.pool: raise RuntimeError("fetch_geo_logs_missing_location, pool Postgres indisponível.")
+        params: List[Any] = [limit]
+        keyset = ""
+        if after:
+            params.extend([datetime.fromisoformat(after[0]), uuid.UUID(after[1])])
+            keyset = "AND (timestamp, id) > ($2, $3)"
+        rows = await self.pool.fetch(
+            f"SELECT {_select_list(GEO_LOG_BACKFILL_COLUMNS)} FROM geo_login_logs WHERE country IS NULL {keyset} "
+            "ORDER BY timestamp, id LIMIT $1",
+            *params,
+        )
+        return [_row_to_dict(row) for row in rows]
+
+    async def update_geo_log_locations(self, locations: Dict[str, Dict[str, Any]]) -> int:
+        # Um único UPDATE ... FROM unnest(arrays): todas as localizações do lote em um round trip
+        if not self.pool: raise RuntimeError("update_geo_log_locations, pool Postgres indisponível.")
+        if not locations: return 0
+        ips = list(locations)
+        columns = [[locations[ip].get(field) for ip in ips] for field in GEO_LOG_LOCATION_FIELDS]
+        status = await self.pool.execute(
+            "UPDATE geo_login_logs AS g SET country = v.country, city = v.city, region = v.region, "
+            "latitude = v.latitude, longitude = v.longitude "
+            "FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::float8[], $6::float8[]) "
+            "AS v(ip_address, country, city, region, latitude, longitude) "
+            "WHERE g.ip_address = v.ip_address AND g.country IS NULL",
+            ips, *columns,
+        )
+        return int(status.split()[-1]) # "UPDATE n"
+
+    async def upsert_traffic_rollups(self, rows: List[Dict[str, Any]]) -> bool:
+        if not self.pool: print("ERRO: upsert_traffic_rollups, pool Postgres indisponível."); return False
+        if not rows: return True
+        columns = list(rows[0].keys())
+        placeholders = ", ".join(f"${index}" for index in range(1, len(columns) + 1))
+        updates = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in columns if column not in TRAFFIC_ROLLUP_CONFLICT_COLUMNS)
+        await self.pool.executemany(
+            f"INSERT INTO api_traffic_rollups ({_select_list(tuple(columns))}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({_select_list(TRAFFIC_ROLLUP_CONFLICT_COLUMNS)}) DO UPDATE SET {updates}",
+            [tuple(_to_db_value(column, row[column]) for column in columns) for row in rows],
+        )
+        return True
+
+    async def get_traffic_rollups(
+        self, since: datetime, until: datetime, route: Optional[str] = None, method: Optional[str] = None,
+        status_class: Optional[str] = None, api_area: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        if not self.pool: raise RuntimeError("get_traffic_rollups, pool Postgres indisponível.")
+        conditions = ["bucket_start >= $1", "bucket_start < $2"]
+        params: List[Any] = [since, until]
+        for column, value in (("route", route), ("method", method), ("status_class", status_class), ("api_area", api_area)):
+            if value:
+                params.append(value)
+                conditions.append(f"{column} = ${len(params)}")
+        rows = await self.pool.fetch(
+            f"SELECT {_select_list(TRAFFIC_ROLLUP_COLUMNS)} FROM api_traffic_rollups WHERE {' AND '.join(conditions)}",
+            *params,
+        )
+        return [_row_to_dict(row) for row in rows]
+
+    async def store_refresh_token(self, user_id: uuid.UUID, token_str: str, expires_at: datetime, parent_token_str: Optional[str] = None) -> Optional[Dict]:
+        if not self.pool: print("ERRO: store_refresh_token, pool Postgres indisponível."); return None
+        try:
+            row = await self.pool.fetchrow(
+                "INSERT INTO refresh_tokens (user_id, token_hash, expires_at, issued_at, parent_token_hash) "
+                f"VALUES ($1, $2, $3, now(), $4) RETURNING {_select_list(REFRESH_TOKEN_COLUMNS)}",
+                user_id, hash_token(token_str), expires_at, hash_token(parent_token_str) if parent_token_str else None,
+            )
+            return _row_to_dict(row) if row else None
+        except Exception as e: print(f"Erro ao armazenar refresh token: {e}"); return None
+
+    async def rotate_refresh_token(
+        self, token_str: str, new_token_str: str, new_expires_at: datetime, user_id: uuid.UUID, session_epoch: int = 0,
+    ) -> Optional[Dict[str, Any]]:
+        if not self.pool: print("ERRO: rotate_refresh_token, pool Postgres indisponível."); return None
+        try:
+            row = await self.pool.fetchrow(
+                "SELECT rotation_status, rotated_user_id, user_role FROM rotate_refresh_token($1, $2, $3, $4, $5)",
+                hash_token(token_str), hash_token(new_token_str), new_expires_at, user_id, session_epoch,
+            )
+        except Exception as e: print(f"Erro ao rotacionar refresh token: {e}"); return None
+        return _rotation_result(_row_to_dict(row)) if row else None
+
+    async def get_refresh_token_data_by_hash(self, token_str: str) -> Optional[Dict]:
+        if not self.pool: print("ERRO: get_refresh_token_data_by_hash, pool Postgres indisponível."); return None
+        try:
+            row = await self.pool.fetchrow(f"SELECT {_select_list(REFRESH_TOKEN_COLUMNS)} FROM refresh_tokens WHERE token_hash = $1", hash_token(token_str))
+            return _row_to_dict(row) if row else None
+        except Exception as e: print(f"Erro ao buscar refresh token por hash: {e}"); return None
+
+    async def revoke_refresh_token(self, token_db_id: uuid.UUID) -> bool:
+        if not self.pool: print("ERRO: revoke_refresh_token, pool Postgres indisponível."); return False
+        try:
+            rows = await self.pool.fetch("UPDATE refresh_tokens SET revoked = true WHERE id = $1 RETURNING token_hash", token_db_id)
+            revoked_token_filter.add_hashes(row["token_hash"] for row in rows)
+            return bool(rows)
+        except Exception as e: print(f"Erro ao revogar refresh token ID {token_db_id}: {e}"); return False
+
+    async def revoke_refresh_token_by_hash(self, token_str: str) -> bool:
+        if not self.pool: print("ERRO: revoke_refresh_token_by_hash, pool Postgres indisponível."); return False
+        try:
+            token_hashed = hash_token(token_str)
+            status = await self.pool.execute(
+                "UPDATE refresh_tokens SET revoked = true WHERE token_hash = $1 AND revoked = false", token_hashed
+            )
+            if status != "UPDATE 0": revoked_token_filter.add_hashes([token_hashed])
+            return status != "UPDATE 0"
+        except Exception as e: print(f"Erro ao revogar refresh token por hash: {e}"); return False
+
+    async def list_revoked_refresh_token_hashes(self) -> List[str]:
+        if not self.pool: raise RuntimeError("list_revoked_refresh_token_hashes, pool Postgres indisponível.")
+        rows = await self.pool.fetch("SELECT token_hash FROM revoked_refresh_token_hashes")
+        return [row["token_hash"] for row in rows]
+
+
+class PostgresAdminService(AdminService):
+    """Mesmas assinaturas do AdminService; só as primitivas de acesso a dados mudam."""
+
+    @property
+    def db(self) -> Optional[Any]:
+        return postgres_pool.pool
+
+    async def _select_admin_row(self, column: str, value: str) -> Optional[Dict[str, Any]]:
+        if column not in _ADMIN_LOOKUP_COLUMNS: raise ValueError(f"Coluna de busca inválida: {column}")
+        lookup_value: Any = uuid.UUID(value) if column == "id" else value
+        row = await self.db.fetchrow(f"SELECT {_select_list(ADMIN_COLUMNS)} FROM administrators WHERE {column} = $1", lookup_value)
+        return _row_to_dict(row) if row else None
+
+    async def _insert_admin_row(self, db_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        columns = [column for column in db_data if column in _ADMIN_COLUMNS]
+        placeholders = ", ".join(f"${index}" for index in range(1, len(columns) + 1))
+        row = await self.db.fetchrow(
+            f"INSERT INTO administrators ({', '.join(columns)}) VALUES ({placeholders}) RETURNING {_select_list(ADMIN_COLUMNS)}",
+            *[_to_db_value(column, db_data[column]) for column in columns],
+        )
+        return _row_to_dict(row) if row else None
+
+    async def _update_admin_row(self, admin_id: uuid.UUID, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        columns = [column for column in fields if column in _ADMIN_COLUMNS]
+        if not columns: return None
+        assignments = ", ".join(f"{column} = ${index}" for index, column in enumerate(columns, start=2))
+        row = await self.db.fetchrow(
+            f"UPDATE administrators SET {assignments} WHERE id = $1 RETURNING {_select_list(ADMIN_COLUMNS)}",
+            admin_id, *[_to_db_value(column, fields[column]) for column in columns],
+        )
+        return _row_to_dict(row) if row else None
+
+    async def _select_admin_rows(self, skip: int, limit: int, after_username: Optional[str] = None) -> List[Dict[str, Any]]:
+        if after_username:
+            rows = await self.db.fetch(f"SELECT {_select_list(ADMIN_PUBLIC_COLUMNS)} FROM administrators WHERE username > $2 ORDER BY username LIMIT $1", limit, after_username)
+        else:
+            rows = await self.db.fetch(f"SELECT {_select_list(ADMIN_PUBLIC_COLUMNS)} FROM administrators ORDER BY username LIMIT $1 OFFSET $2", limit, skip)
+        return [_row_to_dict(row) for row in rows]
@@ -1,106 +1,342 @@
 # app/services/supabase_service.py
-from supabase import create_client, Client
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
 from app.schemas.user_schemas import UserCreate
 from app.models.user import User
 from app.schemas.geo_log_schemas import GeoLogCreate
 from app.utils.security import hash_token
-from typing import Optional, Dict, Any, List
+from app.auth.principal_cache import user_principal_cache, invalidate_user_principal, cache_user_principal, get_cached_user_principal
+from app.auth.revoked_token_filter import revoked_token_filter
+from app.utils.single_flight import SingleFlight
+from app.schemas.columns import (
+    API_LOG_COLUMNS, API_LOG_FIELDS_FULL, GEO_LOG_COLUMNS, GEO_LOG_BACKFILL_COLUMNS, REFRESH_TOKEN_COLUMNS,
+    TRAFFIC_ROLLUP_COLUMNS, TRAFFIC_ROLLUP_CONFLICT_COLUMNS, select_list,
+)
+from typing import Optional, Dict, Any, List, Callable, Tuple
+import asyncio
+import time
 import uuid
 from datetime import datetime, timezone
 import traceback # Para logs de exceção
 
+CLIENT_MODE_SYNC = "sync"
+CLIENT_MODE_ASYNC = "async"
+
+user_lookup_flight = SingleFlight(name="get_user_by_id")
+
+class UserAlreadyExistsError(Exception):
+    """create_user: o GoTrue recusou o cadastro porque o email já está registrado."""
+
+
+# Códigos/mensagens do GoTrue para email duplicado (versões novas usam `code`, antigas só a mensagem)
+_DUPLICATE_USER_CODES = {"email_exists", "user_already_exists"}
+
+
+def _is_duplicate_user_error(error: Exception) -> bool:
+    if getattr(error, "code", None) in _DUPLICATE_USER_CODES:
+        return True
+    message = str(error).lower()
+    return "already been registered" in message or "already registered" in message or "already exists" in message
+
+
+# Resultados de rotate_refresh_token (coluna rotation_status da função SQL)
+REFRESH_ROTATION_ROTATED = "rotated"
+REFRESH_ROTATION_REUSED = "reused"
+
+
+def _rotation_result(row: Dict[str, Any]) -> Dict[str, Any]:
+    result = {"status": row["rotation_status"], "user_id": row["rotated_user_id"], "role": row["user_role"]}
+    if result["status"] == REFRESH_ROTATION_REUSED and result["user_id"]:
+        invalidate_user_principal(result["user_id"]) # A função já revogou a família inteira no banco
+    return result
+
+
+# Chave em app_metadata (só o service_role altera) com a época de sessão do usuário
+SESSION_EPOCH_METADATA_KEY = "session_epoch"
+
+
+def _user_from_supabase(supabase_user: Any) -> User:
+    # Mesmo mapeamento para as respostas de get_user_by_id, create_user e sign_in_with_password
+    metadata = supabase_user.user_metadata or {}
+    app_metadata = supabase_user.app_metadata or {}
+    return User(
+        id=supabase_user.id, email=supabase_user.email, is_active=True,
+        role=metadata.get("role", "user"), user_metadata=metadata,
+        session_epoch=app_metadata.get(SESSION_EPOCH_METADATA_KEY) or 0,
+    )
+
+
+def _geo_log_row(log_data: GeoLogCreate) -> Dict[str, Any]:
+    row = log_data.model_dump(mode="json")
+    if row.get("timestamp") is None: row.pop("timestamp", None) # Deixa o default (now()) do banco
+    return row
+
+
 class SupabaseService:
     def __init__(self):
-        self.client: Optional[Client] = None
-        print(f"INFO:     Tentando inicializar SupabaseService...")
+        self.client: Optional[Any] = None # supabase.Client (modo sync) ou supabase.AsyncClient (modo async)
+        self.mode = settings.SUPABASE_CLIENT_MODE if settings.SUPABASE_CLIENT_MODE in (CLIENT_MODE_SYNC, CLIENT_MODE_ASYNC) else CLIENT_MODE_SYNC
+        self._http_client = None # httpx.AsyncClient compartilhado (modo async)
+        print(f"INFO:     Tentando inicializar SupabaseService (modo '{self.mode}')...")
         print(f"INFO:     Usando SUPABASE_URL: '{settings.SUPABASE_URL[:30] if settings.SUPABASE_URL else 'NÃO DEFINIDA!'}...'")
         print(f"INFO:     Usando SUPABASE_KEY (primeiros 5 chars): '{settings.SUPABASE_KEY[:5] if settings.SUPABASE_KEY else 'NÃO DEFINIDA!'}...'")
         if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
             print("ERRO FATAL: SUPABASE_URL ou SUPABASE_KEY não definidas. Inicialização abortada.")
             return
+        # O cliente (e o import do pacote supabase) só é criado em connect(), chamado no lifespan
+
+    @property
+    def is_async(self) -> bool:
+        return self.mode == CLIENT_MODE_ASYNC
+
+    async def connect(self) -> None:
+        """Cria o cliente. Modo async: AsyncClient sobre um pool HTTP (keep-alive) compartilhado. Modo sync: Client."""
+        if self.client is not None:
+            return
+        if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+            return
+        if not self.is_async:
+            try:
+                from supabase import create_client # Import tardio: o pacote supabase é pesado para o cold start
+                self.client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+                if self.client:
+                    print(f"INFO:     Supabase client INICIALIZADO COM SUCESSO.")
+                else:
+                    print(f"AVISO CRÍTICO: create_client retornou None/Falsey sem exceção.")
+            except Exception as e:
+                print(f"ERRO FATAL AO INICIALIZAR O OBJETO SUPABASE CLIENT: {e}")
+                traceback.print_exc()
+            return
         try:
-            self.client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-            if self.client:
-                print(f"INFO:     Supabase client INICIALIZADO COM SUCESSO.")
-            else:
-                print(f"AVISO CRÍTICO: create_client retornou None/Falsey sem exceção.")
+            import httpx
+            from supabase import acreate_client
+            from supabase.lib.client_options import AsyncClientOptions
+
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.SUPABASE_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=settings.SUPABASE_HTTP_TIMEOUT_SECONDS,
+            )
+            options_kwargs: Dict[str, Any] = {}
+            # Versões mais novas do supabase-py aceitam um httpx client externo; nas antigas,
+            # cada sub-cliente (postgrest, auth) já mantém a própria sessão httpx com keep-alive.
+            if "httpx_client" in getattr(AsyncClientOptions, "__dataclass_fields__", {}):
+                options_kwargs["httpx_client"] = self._http_client
+            self.client = await acreate_client(settings.SUPABASE_URL, settings.SUPABASE_KEY, options=AsyncClientOptions(**options_kwargs))
+            print(f"INFO:     Supabase AsyncClient INICIALIZADO COM SUCESSO (pool HTTP compartilhado: {'httpx_client' in options_kwargs}).")
         except Exception as e:
-            print(f"ERRO FATAL AO INICIALIZAR O OBJETO SUPABASE CLIENT: {e}")
+            print(f"ERRO FATAL AO INICIALIZAR O SUPABASE ASYNC CLIENT: {e}")
             traceback.print_exc()
 
-    # Auth admin methods might still be awaitable if they make HTTP calls internally
-    # and the gotrue client handles async. We'll keep await for these for now.
-    # The primary error was with .table().execute().
+    async def close(self) -> None:
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        self.client = None
+
+    async def warmup(self) -> None:
+        """Abre a conexão HTTP (TLS + keep-alive) com uma consulta mínima antes do primeiro request real."""
+        if not self.client: return
+        await self.run(self.client.table("administrators").select("id").limit(1).execute)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Executa uma chamada ao Supabase (ex: `query.execute`, `client.auth.admin.get_user_by_id`).
+        Modo async: aguarda a coroutine do AsyncClient. Modo sync: roda no threadpool,
+        para que o round trip HTTP nunca trave o event loop.
+        """
+        if self.is_async:
+            return await fn(*args, **kwargs)
+        return await run_in_threadpool(fn, *args, **kwargs)
+
     async def get_user_by_id(self, user_id: uuid.UUID) -> Optional[User]:
+        # Requisições concorrentes do mesmo usuário compartilham uma única chamada ao GoTrue
+        return await user_lookup_flight.do(str(user_id), self._fetch_user_by_id, user_id)
+
+    async def _fetch_user_by_id(self, user_id: uuid.UUID) -> Optional[User]:
         if not self.client: print("ERRO: get_user_by_id, self.client é None."); return None
+        # Geração antes da chamada: um logout de todas as sessões no meio tempo não é desfeito pelo resultado antigo
+        generation = user_principal_cache.generation()
+        user: Optional[User] = None
         try:
-            user_data_res = self.client.auth.admin.get_user_by_id(str(user_id)) # Assumindo que esta chamada pode ser awaitable ou sync
+            user_data_res = await self.run(self.client.auth.admin.get_user_by_id, str(user_id))
             if user_data_res and user_data_res.user:
-                # ... (lógica de conversão para User model)
-                supabase_user = user_data_res.user
-                role = supabase_user.user_metadata.get("role", "user") if supabase_user.user_metadata else "user"
-                return User(
-                    id=supabase_user.id, email=supabase_user.email, is_active=True,
-                    role=role, user_metadata=supabase_user.user_metadata or {}
-                )
-            return None
-        except Exception as e: print(f"Erro ao buscar usuário {user_id}: {e}"); return None
-
-    async def get_user_by_email_for_check(self, email: str) -> bool:
-        if not self.client: print("ERRO: get_user_by_email_for_check, self.client é None."); return False
-        try:
-            response = self.client.auth.admin.list_users(email=email, limit=1)
-            return bool(response.users)
-        except Exception as e: print(f"Erro ao verificar usuário por email {email}: {e}"); return False
+                user = _user_from_supabase(user_data_res.user)
+        except Exception as e: print(f"Erro ao buscar usuário {user_id}: {e}")
+        cache_user_principal(user_id, user, generation=generation)
+        return user
 
     async def create_user(self, user_create: UserCreate) -> Optional[User]:
+        """
+        Cria o usuário no GoTrue (um round trip). Email já cadastrado -> UserAlreadyExistsError:
+        o próprio GoTrue rejeita duplicados, então não há verificação prévia com list_users.
+        """
         if not self.client: print("ERRO: create_user, self.client é None."); return None
         try:
             # ... (lógica de user_metadata)
             user_metadata_with_role = user_create.model_dump(exclude_unset=True).get("user_metadata", {})
             if "role" not in user_metadata_with_role: user_metadata_with_role["role"] = "user"
-            
-            response = self.client.auth.admin.create_user(
+
+            response = await self.run(
+                self.client.auth.admin.create_user,
                 email=user_create.email, password=user_create.password,
                 email_confirm=True, user_metadata=user_metadata_with_role
             )
             if response and response.user:
-                # ... (lógica de conversão para User model)
-                created_user = response.user
-                return User(
-                    id=created_user.id, email=created_user.email, is_active=True,
-                    role=created_user.user_metadata.get("role", "user"),
-                    user_metadata=created_user.user_metadata or {}
-                )
+                return _user_from_supabase(response.user)
             print(f"Falha ao criar usuário Supabase. Resposta: {response}"); return None
-        except Exception as e: print(f"Erro ao criar usuário Supabase: {e}"); return None
+        except Exception as e:
+            if _is_duplicate_user_error(e): raise UserAlreadyExistsError(user_create.email) from e
+            print(f"Erro ao criar usuário Supabase: {e}"); return None
 
     async def login_user(self, email: str, password: str) -> Optional[User]:
         if not self.client: print("ERRO: login_user, self.client é None."); return None
+        generation = user_principal_cache.generation()
         try:
-            response = self.client.auth.sign_in_with_password({"email": email, "password": password})
+            response = await self.run(self.client.auth.sign_in_with_password, {"email": email, "password": password})
             if response and response.user:
-                return await self.get_user_by_id(response.user.id) # Reutiliza get_user_by_id
+                # A resposta do sign-in já traz o usuário: sem um segundo round trip (get_user_by_id).
+                # Também aquece o cache de principals para a primeira requisição autenticada.
+                user = _user_from_supabase(response.user)
+                cache_user_principal(user.id, user, generation=generation)
+                return user
             return None
         except Exception as e: print(f"Erro ao logar usuário Supabase: {e}"); return None
 
-    # Table operations are now synchronous (no await for .execute())
-    def add_geo_log(self, log_data: GeoLogCreate) -> bool: # Removido async
+    async def add_geo_log(self, log_data: GeoLogCreate) -> bool:
         if not self.client: print("ERRO: add_geo_log, self.client é None."); return False
         try:
-            response = self.client.table("geo_login_logs").insert(log_data.model_dump()).execute() # SÍNCRONO
+            response = await self.run(self.client.table("geo_login_logs").insert(_geo_log_row(log_data)).execute)
             return bool(response.data and len(response.data) > 0)
         except Exception as e: print(f"Erro ao adicionar geo log: {e}"); return False
 
-    def get_all_geo_logs(self, limit: int = 100, offset: int = 0) -> list: # Removido async
+    async def insert_geo_logs(self, logs: List[GeoLogCreate]) -> bool: # Chamado pelo GeoEnrichmentPipeline (em lote)
+        if not self.client: print("ERRO: insert_geo_logs, self.client é None."); return False
+        if not logs: return True
+        await self.run(self.client.table("geo_login_logs").insert([_geo_log_row(log) for log in logs]).execute)
+        return True
+
+    async def insert_api_logs(self, log_entries: List[Dict[str, Any]]) -> bool: # Chamado pelo ApiLogSink (em lote)
+        if not self.client: print("ERRO: insert_api_logs, self.client é None."); return False
+        if not log_entries: return True
+        try:
+            await self.run(self.client.table("api_logs").insert(log_entries).execute)
+            return True
+        except Exception as e:
+            print(f"Erro ao inserir lote de {len(log_entries)} logs da API: {e}")
+            if hasattr(e, 'message') and e.message: print(f"   Detalhe do APIError (se houver): {e.message}")
+            if hasattr(e, 'hint') and e.hint: print(f"   Dica do APIError (se houver): {e.hint}")
+            if hasattr(e, 'details') and e.details: print(f"   Detalhes adicionais do APIError (se houver): {e.details}")
+            return False
+
+    async def get_api_logs(
+        self, skip: int = 0, limit: int = 50, method: Optional[str] = None, status_code: Optional[int] = None,
+        path_contains: Optional[str] = None, user_id: Optional[uuid.UUID] = None, admin_id: Optional[uuid.UUID] = None,
+        fields: str = API_LOG_FIELDS_FULL, after: Optional[Tuple[str, Any]] = None,
+        since: Optional[datetime] = None, until: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Levanta exceção em caso de falha (o router devolve 500). `fields`: "summary" (sem corpos JSON) ou "full".
+        `after`: (timestamp, id) da última linha da página anterior (keyset); quando presente, `skip` é ignorado.
+        `since`/`until`: intervalo [since, until) sobre timestamp.
+        """
+        if not self.client: raise RuntimeError("get_api_logs, self.client é None.")
+        query = self.client.table("api_logs").select(select_list(API_LOG_COLUMNS[fields])).order("timestamp", desc=True).order("id", desc=True)
+        query = self._after_timestamp_id(query, after).limit(limit) if after else query.offset(skip).limit(limit)
+        if method: query = query.eq("method", method.upper())
+        if status_code is not None: query = query.eq("status_code", status_code)
+        if path_contains: query = query.ilike("path", f"%{path_contains}%")
+        if user_id: query = query.eq("user_id", str(user_id))
+        if admin_id: query = query.eq("admin_id", str(admin_id))
+        if since: query = query.gte("timestamp", since.isoformat())
+        if until: query = query.lt("timestamp", until.isoformat())
+        response = await self.run(query.execute)
+        return response.data if response.data else []
+
+    async def get_all_geo_logs(self, limit: int = 100, offset: int = 0, after: Optional[Tuple[str, Any]] = None) -> list:
         if not self.client: print("ERRO: get_all_geo_logs, self.client é None."); return []
         try:
-            response = self.client.table("geo_login_logs").select("*").order("timestamp", desc=True).limit(limit).offset(offset).execute() # SÍNCRONO
-            return response.data if response.data else []
+            return await self.fetch_geo_logs(limit=limit, offset=offset, after=after)
         except Exception as e: print(f"Erro ao buscar geo logs: {e}"); return []
 
-    def store_refresh_token(self, user_id: uuid.UUID, token_str: str, expires_at: datetime, parent_token_str: Optional[str] = None) -> Optional[Dict]: # Removido async
+    async def fetch_geo_logs(
+        self, limit: int = 100, offset: int = 0, after: Optional[Tuple[str, Any]] = None,
+        user_id: Optional[uuid.UUID] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """Como get_all_geo_logs, mas levanta exceção em caso de falha (usado pela exportação)."""
+        if not self.client: raise RuntimeError("fetch_geo_logs, self.client é None.")
+        query = self.client.table("geo_login_logs").select(select_list(GEO_LOG_COLUMNS)).order("timestamp", desc=True).order("id", desc=True)
+        query = self._after_timestamp_id(query, after).limit(limit) if after else query.limit(limit).offset(offset)
+        if user_id: query = query.eq("user_id", str(user_id))
+        if since: query = query.gte("timestamp", since.isoformat())
+        if until: query = query.lt("timestamp", until.isoformat())
+        response = await self.run(query.execute)
+        return response.data if response.data else []
+
+    async def fetch_geo_logs_missing_location(self, limit: int, after: Optional[Tuple[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Linhas sem localização (country nulo), em ordem crescente de (timestamp, id). Usado pelo backfill de GeoIP."""
+        if not self.client: raise RuntimeError("fetch_geo_logs_missing_location, self.client é None.")
+        query = self.client.table("geo_login_logs").select(select_list(GEO_LOG_BACKFILL_COLUMNS)).is_("country", "null")
+        query = query.order("timestamp").order("id")
+        if after: query = self._after_timestamp_id(query, after, ascending=True)
+        response = await self.run(query.limit(limit).execute)
+        return response.data if response.data else []
+
+    async def update_geo_log_locations(self, locations: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Preenche a localização de todas as linhas ainda sem country de cada IP ({ip: campos}).
+        Um UPDATE por IP (o PostgREST não aplica valores diferentes por linha num único PATCH), em paralelo.
+        Retorna o número de linhas atualizadas.
+        """
+        if not self.client: raise RuntimeError("update_geo_log_locations, self.client é None.")
+        async def update(ip_address: str, fields: Dict[str, Any]) -> int:
+            query = self.client.table("geo_login_logs").update(fields).eq("ip_address", ip_address).is_("country", "null")
+            response = await self.run(query.execute)
+            return len(response.data or [])
+        counts = await asyncio.gather(*(update(ip_address, fields) for ip_address, fields in locations.items()))
+        return sum(counts)
+
+    async def upsert_traffic_rollups(self, rows: List[Dict[str, Any]]) -> bool: # Chamado pelo TrafficRollupAggregator
+        if not self.client: print("ERRO: upsert_traffic_rollups, self.client é None."); return False
+        if not rows: return True
+        await self.run(self.client.table("api_traffic_rollups").upsert(rows, on_conflict=",".join(TRAFFIC_ROLLUP_CONFLICT_COLUMNS)).execute)
+        return True
+
+    async def get_traffic_rollups(
+        self, since: datetime, until: datetime, route: Optional[str] = None, method: Optional[str] = None,
+        status_class: Optional[str] = None, api_area: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Rollups em [since, until). Lê em páginas de EXPORT_CHUNK_SIZE (limite de linhas do PostgREST). Levanta exceção em caso de falha."""
+        if not self.client: raise RuntimeError("get_traffic_rollups, self.client é None.")
+        rows: List[Dict[str, Any]] = []
+        page_size = settings.EXPORT_CHUNK_SIZE
+        while True:
+            query = (
+                self.client.table("api_traffic_rollups").select(select_list(TRAFFIC_ROLLUP_COLUMNS))
+                .gte("bucket_start", since.isoformat()).lt("bucket_start", until.isoformat())
+            )
+            if route: query = query.eq("route", route)
+            if method: query = query.eq("method", method)
+            if status_class: query = query.eq("status_class", status_class)
+            if api_area: query = query.eq("api_area", api_area)
+            for column in TRAFFIC_ROLLUP_CONFLICT_COLUMNS: query = query.order(column) # Ordem estável entre páginas
+            response = await self.run(query.range(len(rows), len(rows) + page_size - 1).execute)
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    @staticmethod
+    def _after_timestamp_id(query: Any, after: Tuple[str, Any], ascending: bool = False) -> Any:
+        # Keyset para ORDER BY timestamp DESC, id DESC: (timestamp, id) < (ts, id) da última linha (> se ascending).
+        # Valores já validados em app.utils.pagination (data ISO e int/UUID), aspas por causa do "+" do fuso
+        timestamp, row_id = after
+        op = "gt" if ascending else "lt"
+        return query.or_(f'timestamp.{op}."{timestamp}",and(timestamp.eq."{timestamp}",id.{op}.{row_id})')
+
+    async def store_refresh_token(self, user_id: uuid.UUID, token_str: str, expires_at: datetime, parent_token_str: Optional[str] = None) -> Optional[Dict]:
         if not self.client: print("ERRO: store_refresh_token, self.client é None."); return None
         # ... (lógica de hash)
         token_hashed = hash_token(token_str)
@@ -111,38 +347,105 @@ class SupabaseService:
         }
         if parent_hash: data_to_insert["parent_token_hash"] = parent_hash
         try:
-            response = self.client.table("refresh_tokens").insert(data_to_insert).execute() # SÍNCRONO
+            response = await self.run(self.client.table("refresh_tokens").insert(data_to_insert).execute)
             return response.data[0] if response.data and len(response.data) > 0 else None
         except Exception as e: print(f"Erro ao armazenar refresh token: {e}"); return None
 
-    def get_refresh_token_data_by_hash(self, token_str: str) -> Optional[Dict]: # Removido async
+    async def get_refresh_token_data_by_hash(self, token_str: str) -> Optional[Dict]:
         if not self.client: print("ERRO: get_refresh_token_data_by_hash, self.client é None."); return None
         token_hashed = hash_token(token_str)
         try:
-            response = self.client.table("refresh_tokens").select("*").eq("token_hash", token_hashed).maybe_single().execute() # SÍNCRONO
-            return response.data if response.data else None
+            response = await self.run(self.client.table("refresh_tokens").select(select_list(REFRESH_TOKEN_COLUMNS)).eq("token_hash", token_hashed).maybe_single().execute)
+            return response.data if response and response.data else None # maybe_single() pode devolver None sem linhas
         except Exception as e: print(f"Erro ao buscar refresh token por hash: {e}"); return None
 
-    def revoke_refresh_token(self, token_db_id: uuid.UUID) -> bool: # Removido async
+    async def rotate_refresh_token(
+        self, token_str: str, new_token_str: str, new_expires_at: datetime, user_id: uuid.UUID, session_epoch: int = 0,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Rotação atômica via RPC rotate_refresh_token (sql/refresh_token_rotation.sql): valida o token usado,
+        revoga-o e insere o sucessor numa única transação, em um round trip. `session_epoch` é a claim 'sep'
+        do token usado: abaixo da época atual do usuário (logout de todas as sessões) => "stale_epoch".
+        Retorna {"status", "user_id", "role"} (status em REFRESH_ROTATION_*) ou None se a chamada falhar.
+        """
+        if not self.client: print("ERRO: rotate_refresh_token, self.client é None."); return None
+        try:
+            response = await self.run(self.client.rpc("rotate_refresh_token", {
+                "p_token_hash": hash_token(token_str), "p_new_token_hash": hash_token(new_token_str),
+                "p_new_expires_at": new_expires_at.isoformat(), "p_user_id": str(user_id),
+                "p_session_epoch": session_epoch,
+            }).execute)
+        except Exception as e: print(f"Erro ao rotacionar refresh token: {e}"); return None
+        return _rotation_result(response.data[0]) if response.data else None
+
+    async def revoke_refresh_token(self, token_db_id: uuid.UUID) -> bool:
         if not self.client: print("ERRO: revoke_refresh_token, self.client é None."); return False
         try:
-            response = self.client.table("refresh_tokens").update({"revoked": True}).eq("id", str(token_db_id)).execute() # SÍNCRONO
+            response = await self.run(self.client.table("refresh_tokens").update({"revoked": True}).eq("id", str(token_db_id)).execute)
+            revoked_token_filter.add_hashes(row.get("token_hash") for row in response.data or [])
             return bool(response.data and len(response.data) > 0)
         except Exception as e: print(f"Erro ao revogar refresh token ID {token_db_id}: {e}"); return False
 
-    def revoke_refresh_token_by_hash(self, token_str: str) -> bool: # Removido async
+    async def revoke_refresh_token_by_hash(self, token_str: str) -> bool:
         if not self.client: print("ERRO: revoke_refresh_token_by_hash, self.client é None."); return False
         token_hashed = hash_token(token_str)
         try:
-            response = self.client.table("refresh_tokens").update({"revoked": True}).eq("token_hash", token_hashed).eq("revoked", False).execute() # SÍNCRONO
+            response = await self.run(self.client.table("refresh_tokens").update({"revoked": True}).eq("token_hash", token_hashed).eq("revoked", False).execute)
+            if response.data: revoked_token_filter.add_hashes([token_hashed])
             return bool(response.data and len(response.data) > 0)
         except Exception as e: print(f"Erro ao revogar refresh token por hash: {e}"); return False
 
-    def revoke_all_user_refresh_tokens(self, user_id: uuid.UUID) -> bool: # Removido async
+    async def revoke_all_user_refresh_tokens(self, user_id: uuid.UUID) -> bool:
+        """
+        Logout de todas as sessões: avança a época de sessão do usuário (app_metadata.session_epoch no GoTrue),
+        uma única escrita, sem UPDATE em refresh_tokens. Tokens emitidos antes ('sep' menor) deixam de valer:
+        refresh tokens na RPC rotate_refresh_token, access tokens em get_current_user (contra o principal cacheado).
+        """
         if not self.client: print("ERRO: revoke_all_user_refresh_tokens, self.client é None."); return False
+        cached = get_cached_user_principal(user_id)
+        # Época = instante em ms (sem ler o valor atual no GoTrue), sempre acima da última conhecida
+        epoch = max(int(time.time() * 1000), (cached.session_epoch + 1) if isinstance(cached, User) else 0)
         try:
-            response = self.client.table("refresh_tokens").update({"revoked": True}).eq("user_id", str(user_id)).eq("revoked", False).execute() # SÍNCRONO
-            return True 
+            await self.run(self.client.auth.admin.update_user_by_id, str(user_id), {"app_metadata": {SESSION_EPOCH_METADATA_KEY: epoch}})
+            invalidate_user_principal(user_id) # A próxima requisição do usuário volta a consultar o GoTrue (e vê a nova época)
+            return True
         except Exception as e: print(f"Erro ao revogar todos os refresh tokens para user {user_id}: {e}"); return False
 
-supabase_service = SupabaseService()
+    async def list_revoked_refresh_token_hashes(self) -> List[str]:
+        """Hashes da view revoked_refresh_token_hashes (sql/revoked_refresh_tokens.sql), em páginas de EXPORT_CHUNK_SIZE. Levanta exceção em caso de falha."""
+        if not self.client: raise RuntimeError("list_revoked_refresh_token_hashes, self.client é None.")
+        token_hashes: List[str] = []
+        page_size = settings.EXPORT_CHUNK_SIZE
+        while True:
+            query = self.client.table("revoked_refresh_token_hashes").select("token_hash").order("token_hash")
+            response = await self.run(query.range(len(token_hashes), len(token_hashes) + page_size - 1).execute)
+            page = response.data or []
+            token_hashes.extend(row["token_hash"] for row in page)
+            if len(page) < page_size:
+                return token_hashes
+
+
+DATABASE_BACKEND_SUPABASE = "supabase"
+DATABASE_BACKEND_POSTGRES = "postgres"
+
+
+def _create_supabase_service() -> SupabaseService:
+    backend = (settings.DATABASE_BACKEND or DATABASE_BACKEND_SUPABASE).lower()
+    if backend == DATABASE_BACKEND_POSTGRES:
+        from app.services.postgres_backend import PostgresSupabaseService # Import tardio: asyncpg só é exigido neste modo
+        print("INFO:     DATABASE_BACKEND='postgres': tabelas via pool asyncpg (DATABASE_URL).")
+        return PostgresSupabaseService()
+    if backend != DATABASE_BACKEND_SUPABASE:
+        print(f"AVISO: DATABASE_BACKEND inválido '{settings.DATABASE_BACKEND}'. Usando '{DATABASE_BACKEND_SUPABASE}'.")
+    return SupabaseService()
+
+
+_supabase_service: Optional[SupabaseService] = None
+
+
+def get_supabase_service() -> SupabaseService:
+    """Acessor preguiçoso: o serviço é construído na primeira chamada (normalmente no lifespan), não no import."""
+    global _supabase_service
+    if _supabase_service is None:
+        _supabase_service = _create_supabase_service()
+    return _supabase_service
@@ -0,0 +1,168 @@
+# app/services/traffic_rollups.py
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.latency_sketch import LatencySketch
+
+BUCKET_SECONDS = 60
+ROUTE_OTHER = "(other)" # Requisições sem rota da API (404, arquivos estáticos): mantém a cardinalidade limitada
+
+# (início do minuto em epoch, rota, método, classe de status, área da API)
+RollupKey = Tuple[int, str, str, str, str]
+
+
+def status_class(status_code: int) -> str:
+    return f"{status_code // 100}xx"
+
+
+class _Rollup:
+    __slots__ = ("request_count", "error_count", "latency_sum_ms", "latency_max_ms", "sketch")
+
+    def __init__(self, relative_accuracy: float):
+        self.request_count = 0
+        self.error_count = 0
+        self.latency_sum_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.sketch = LatencySketch(relative_accuracy)
+
+    def add(self, status_code: int, latency_ms: float) -> None:
+        self.request_count += 1
+        if status_code >= 400: self.error_count += 1 # Mesmo critério das tags error_client/error_server
+        self.latency_sum_ms += latency_ms
+        self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+        self.sketch.add(latency_ms)
+
+    def merge_row(self, row: Dict[str, Any]) -> None:
+        self.request_count += row["request_count"]
+        self.error_count += row["error_count"]
+        self.latency_sum_ms += row["latency_sum_ms"]
+        self.latency_max_ms = max(self.latency_max_ms, row["latency_max_ms"])
+        self.sketch.merge(LatencySketch.from_dict(row["latency_sketch"]))
+
+
+class TrafficRollupAggregator:
+    """
+    Rollups por minuto do tráfego da API, mantidos em memória pelo ApiLoggingMiddleware
+    (chave: rota, método, classe de status, área da API) e gravados em lote em api_traffic_rollups
+    quando o minuto fecha. Cada processo grava com o próprio writer_id, então workers diferentes
+    nunca sobrescrevem as linhas uns dos outros; as consultas somam por balde.
+    """
+
+    def __init__(self, enabled: bool, flush_interval_seconds: float, relative_accuracy: float):
+        self.enabled = enabled
+        self.flush_interval_seconds = max(1.0, flush_interval_seconds)
+        self.relative_accuracy = relative_accuracy
+        self.writer_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._buckets: Dict[RollupKey, _Rollup] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def record(self, route: Optional[str], method: str, status_code: int, latency_ms: float, api_area: str) -> None:
+        """Chamado pelo middleware a cada requisição: O(1), sem I/O."""
+        if not self.enabled:
+            return
+        minute = int(time.time()) // BUCKET_SECONDS * BUCKET_SECONDS
+        key = (minute, route or ROUTE_OTHER, method or "", status_class(status_code), api_area)
+        rollup = self._buckets.get(key)
+        if rollup is None:
+            rollup = self._buckets[key] = _Rollup(self.relative_accuracy)
+        rollup.add(status_code, latency_ms)
+        self.recorded += 1
+
+    async def start(self) -> None:
+        if not self.enabled or self.running:
+            return
+        self._task = asyncio.create_task(self._run(), name="traffic-rollup-flusher")
+        print(f"INFO:     Rollups de tráfego iniciados (writer_id={self.writer_id}, flush={self.flush_interval_seconds}s).")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.enabled:
+            await self.flush(include_open=True) # Minuto corrente também: o processo está saindo
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            await self.flush()
+
+    def _row(self, key: RollupKey, rollup: _Rollup) -> Dict[str, Any]:
+        minute, route, method, status_cls, api_area = key
+        return {
+            "bucket_start": datetime.fromtimestamp(minute, tz=timezone.utc).isoformat(),
+            "writer_id": self.writer_id, "route": route, "method": method,
+            "status_class": status_cls, "api_area": api_area,
+            "request_count": rollup.request_count, "error_count": rollup.error_count,
+            "latency_sum_ms": round(rollup.latency_sum_ms, 3), "latency_max_ms": round(rollup.latency_max_ms, 3),
+            "latency_sketch": rollup.sketch.to_dict(),
+        }
+
+    async def flush(self, include_open: bool = False) -> None:
+        current_minute = int(time.time()) // BUCKET_SECONDS * BUCKET_SECONDS
+        keys = [key for key in self._buckets if include_open or key[0] < current_minute]
+        if not keys:
+            return
+        popped = {key: self._buckets.pop(key) for key in keys}
+        rows = [self._row(key, rollup) for key, rollup in popped.items()]
+        from app.services import get_supabase_service
+        try:
+            written = await get_supabase_service().upsert_traffic_rollups(rows)
+        except Exception as e:
+            print(f"ERRO ao gravar rollups de tráfego: {e}")
+            written = False
+        self.flushes += 1
+        if written:
+            self.rows_written += len(rows)
+            return
+        # Falhou: devolve à memória para a próxima tentativa (a chave do writer torna o upsert idempotente)
+        if len(self._buckets) + len(popped) > settings.TRAFFIC_ROLLUP_MAX_PENDING_KEYS:
+            self.rows_failed += len(rows)
+            print(f"AVISO: {len(rows)} rollups de tráfego descartados após falha (limite de pendências atingido).")
+            return
+        for key, rollup in popped.items():
+            existing = self._buckets.get(key)
+            if existing is None:
+                self._buckets[key] = rollup
+            else:
+                existing.merge_row(self._row(key, rollup))
+
+    def pending_rows(self) -> List[Dict[str, Any]]:
+        """Rollups ainda em memória (minuto corrente deste processo), para as consultas não ficarem 1 min atrasadas."""
+        return [self._row(key, rollup) for key, rollup in list(self._buckets.items())]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "writer_id": self.writer_id,
+            "pending_keys": len(self._buckets),
+            "recorded": self.recorded,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "flushes": self.flushes,
+        }
+
+
+traffic_rollups = TrafficRollupAggregator(
+    enabled=settings.TRAFFIC_ROLLUPS_ENABLED,
+    flush_interval_seconds=settings.TRAFFIC_ROLLUP_FLUSH_INTERVAL_SECONDS,
+    relative_accuracy=settings.TRAFFIC_ROLLUP_SKETCH_ACCURACY,
+)
@@ -0,0 +1,84 @@
+# app/services/traffic_stats.py
+"""
+Consultas de séries temporais sobre os rollups por minuto (api_traffic_rollups).
+Cada balde de saída custa o número de chaves (rota x método x status x writer) daquele intervalo,
+nunca o número de requisições: contadores somam e os sketches de latência se combinam.
+"""
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from app.services.traffic_rollups import traffic_rollups, _Rollup
+
+BUCKET_SIZES = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+
+
+async def load_rollups(
+    since: datetime, until: datetime, route: Optional[str] = None, method: Optional[str] = None,
+    status_class: Optional[str] = None, api_area: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    from app.services import get_supabase_service
+    method = method.upper() if method else None # Rollups gravam o método em maiúsculas; vale para o banco e para o minuto pendente
+    rows = await get_supabase_service().get_traffic_rollups(
+        since=since, until=until, route=route, method=method, status_class=status_class, api_area=api_area,
+    )
+    # Minuto corrente deste processo, ainda não gravado
+    filters = {"route": route, "method": method, "status_class": status_class, "api_area": api_area}
+    for row in traffic_rollups.pending_rows():
+        bucket_start = datetime.fromisoformat(row["bucket_start"])
+        if since <= bucket_start < until and all(value is None or row[column] == value for column, value in filters.items()):
+            rows.append(row)
+    return rows
+
+
+def _summary(rollup: _Rollup, status_classes: Dict[str, int]) -> Dict[str, Any]:
+    sketch = rollup.sketch
+    return {
+        "request_count": rollup.request_count,
+        "error_count": rollup.error_count,
+        "error_ratio": round(rollup.error_count / rollup.request_count, 4) if rollup.request_count else 0.0,
+        "latency_avg_ms": round(rollup.latency_sum_ms / rollup.request_count, 2) if rollup.request_count else None,
+        "latency_max_ms": round(rollup.latency_max_ms, 2) if rollup.request_count else None,
+        "latency_p50_ms": _rounded(sketch.quantile(0.50)),
+        "latency_p95_ms": _rounded(sketch.quantile(0.95)),
+        "latency_p99_ms": _rounded(sketch.quantile(0.99)),
+        "status_classes": status_classes,
+    }
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def _group(rows: Iterable[Dict[str, Any]], key_of: Callable[[Dict[str, Any]], Hashable]) -> Dict[Hashable, Any]:
+    groups: Dict[Hashable, Any] = {}
+    for row in rows:
+        key = key_of(row)
+        group = groups.get(key)
+        if group is None:
+            sketch_accuracy = float((row.get("latency_sketch") or {}).get("a", traffic_rollups.relative_accuracy))
+            group = groups[key] = (_Rollup(sketch_accuracy), {})
+        rollup, status_classes = group
+        rollup.merge_row(row)
+        status_classes[row["status_class"]] = status_classes.get(row["status_class"], 0) + row["request_count"]
+    return groups
+
+
+def timeseries(rows: List[Dict[str, Any]], bucket_seconds: int) -> List[Dict[str, Any]]:
+    def bucket_of(row: Dict[str, Any]) -> int:
+        epoch = int(datetime.fromisoformat(row["bucket_start"]).timestamp())
+        return epoch // bucket_seconds * bucket_seconds
+    groups = _group(rows, bucket_of)
+    return [
+        {"bucket_start": datetime.fromtimestamp(bucket, tz=timezone.utc), **_summary(*groups[bucket])}
+        for bucket in sorted(groups)
+    ]
+
+
+def by_route(rows: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    groups = _group(rows, lambda row: (row["route"], row["method"], row["api_area"]))
+    routes = [
+        {"route": route, "method": method, "api_area": api_area, **_summary(*groups[(route, method, api_area)])}
+        for route, method, api_area in groups
+    ]
+    routes.sort(key=lambda item: item["request_count"], reverse=True)
+    return routes[:limit]
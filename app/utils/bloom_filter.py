@@ -0,0 +1,54 @@
+# app/utils/bloom_filter.py
+import hashlib
+import math
+from typing import Any, Dict, Iterable
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom: pertinência aproximada em memória fixa. `x in filtro` nunca dá falso negativo;
+    dá falso positivo com probabilidade ~false_positive_rate enquanto o número de itens não passar de `capacity`.
+    Não suporta remoção: para "esquecer" itens, reconstrua um filtro novo e troque a referência.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self.capacity = max(1, capacity)
+        self.false_positive_rate = min(max(false_positive_rate, 1e-12), 0.5)
+        # Dimensionamento ótimo: m = -n ln(p) / ln(2)^2 bits, k = (m / n) ln(2) funções de hash
+        self.bit_count = max(8, math.ceil(-self.capacity * math.log(self.false_positive_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.bit_count / self.capacity * math.log(2)))
+        self._bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # Double hashing (Kirsch-Mitzenmacher): k posições a partir de dois hashes de 64 bits
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bit_count for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+    def estimated_false_positive_rate(self) -> float:
+        # (1 - e^(-k n / m))^k com o número de itens inseridos
+        return (1 - math.exp(-self.hash_count * self.count / self.bit_count)) ** self.hash_count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "items": self.count,
+            "target_false_positive_rate": self.false_positive_rate,
+            "estimated_false_positive_rate": self.estimated_false_positive_rate(),
+            "memory_bytes": self.memory_bytes,
+            "hash_count": self.hash_count,
+        }
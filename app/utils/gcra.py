@@ -0,0 +1,193 @@
+# app/utils/gcra.py
+"""
+GCRA (Generic Cell Rate Algorithm) para rate limiting: um único timestamp por chave, o TAT
+("theoretical arrival time"). Limite "N por período": intervalo de emissão T = período / N.
+Uma requisição em `now` é aceita se TAT + T - período <= now (rajada de até N) e o TAT avança T;
+recusada, o cliente pode tentar de novo em TAT + T - período - now segundos (Retry-After).
+
+Armazenamentos (mesma interface: acquire, stats, close):
+- GCRAMemoryStore: por processo.
+- GCRASharedMemoryStore: tabela hash de tamanho fixo num arquivo mmap (ex: em /dev/shm) com flock,
+  compartilhada pelos workers do mesmo host.
+- GCRARedisStore: script Lua atômico num servidor com protocolo Redis (Redis, Valkey, KeyDB...),
+  com o relógio do próprio servidor; compartilhado entre hosts.
+"""
+import hashlib
+import math
+import os
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.ttl_cache import TTLCache
+
+# TTL máximo de uma chave no GCRAMemoryStore: períodos maiores que um dia não são suportados
+_MAX_PERIOD_SECONDS = 86400.0
+
+
+def gcra_step(tat: Optional[float], now: float, emission_interval: float, period: float) -> Tuple[Optional[float], float]:
+    """(novo TAT, 0.0) se a requisição é aceita; (None, segundos até liberar) se recusada."""
+    if tat is None or tat < now or tat > now + period: # Chave nova, ociosa, ou TAT impossível (relógio voltou)
+        tat = now
+    new_tat = tat + emission_interval
+    allow_at = new_tat - period
+    if allow_at > now:
+        return None, allow_at - now
+    return new_tat, 0.0
+
+
+class GCRAMemoryStore:
+    """TAT por chave num TTLCache (LRU): cada entrada expira quando a chave volta a ter a rajada cheia."""
+
+    backend = "memory"
+
+    def __init__(self, max_keys: int):
+        self._tats = TTLCache(max_size=max_keys, ttl_seconds=_MAX_PERIOD_SECONDS, name="rate_limits")
+
+    async def acquire(self, key: str, emission_interval: float, period: float) -> float:
+        # Sem await entre a leitura e a escrita: atômico no event loop
+        now = time.monotonic()
+        new_tat, retry_after = gcra_step(self._tats.get(key, None), now, emission_interval, period)
+        if new_tat is not None:
+            self._tats.set(key, new_tat, ttl_seconds=new_tat - now)
+        return retry_after
+
+    def stats(self) -> Dict[str, Any]:
+        return self._tats.stats()
+
+    async def close(self) -> None:
+        self._tats.clear()
+
+
+# Slot da tabela compartilhada: hash de 64 bits da chave (0 = vazio) + TAT (CLOCK_MONOTONIC, comum aos processos do host)
+_SLOT = struct.Struct("<Qd")
+_PROBES = 8 # Sondagem linear: posições examinadas por chave
+
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class GCRASharedMemoryStore:
+    """
+    Tabela hash de endereçamento aberto num arquivo mmap (16 bytes por slot), protegida por flock.
+    Cada worker abre o mesmo arquivo, então o limite vale para o host, não para o processo.
+    Com a tabela cheia, a chave nova ocupa o slot cujo TAT vence primeiro (a chave despejada recomeça com a rajada cheia).
+    Só Unix (fcntl); o arquivo é aberto na primeira requisição, não no import.
+    """
+
+    backend = "shm"
+
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.slots = max(_PROBES, slots)
+        self._fd: Optional[int] = None
+        self._map = None
+        self.evictions = 0
+
+    def _open(self) -> None:
+        import fcntl # Import tardio: indisponível no Windows
+        import mmap
+        size = self.slots * _SLOT.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            # Arquivo novo (zerado = tabela vazia) ou de uma configuração menor. Nunca encolhe:
+            # outro worker ainda mapeando o tamanho antigo levaria SIGBUS
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(fd, size)
+        self._fd = fd
+        print(f"INFO:     Rate limit em memória compartilhada: '{self.path}' ({self.slots} slots, {size // 1024} KB).")
+
+    async def acquire(self, key: str, emission_interval: float, period: float) -> float:
+        import fcntl
+        if self._map is None:
+            self._open()
+        key_hash = _key_hash(key)
+        start = key_hash % self.slots
+        fcntl.flock(self._fd, fcntl.LOCK_EX) # Seção crítica curta (até _PROBES leituras de 16 bytes), sem await
+        try:
+            now = time.monotonic()
+            slot, tat, free_slot, oldest_slot, oldest_tat = None, None, None, None, math.inf
+            for probe in range(_PROBES):
+                index = (start + probe) % self.slots
+                slot_hash, slot_tat = _SLOT.unpack_from(self._map, index * _SLOT.size)
+                if slot_hash == key_hash:
+                    slot, tat = index, slot_tat
+                    break
+                if slot_hash == 0 or slot_tat <= now: # Vazio ou com a rajada cheia de novo: reutilizável
+                    if free_slot is None:
+                        free_slot = index
+                elif slot_tat < oldest_tat:
+                    oldest_slot, oldest_tat = index, slot_tat
+            if slot is None:
+                slot = free_slot
+                if slot is None:
+                    slot = oldest_slot
+                    self.evictions += 1
+            new_tat, retry_after = gcra_step(tat, now, emission_interval, period)
+            if new_tat is not None:
+                _SLOT.pack_into(self._map, slot * _SLOT.size, key_hash, new_tat)
+            return retry_after
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "open": self._map is not None, "slots": self.slots, "memory_bytes": self.slots * _SLOT.size, "evictions": self.evictions}
+
+    async def close(self) -> None:
+        # O arquivo fica: os outros workers continuam usando a mesma tabela
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._map, self._fd = None, None
+
+
+# Relógio do servidor (TIME), não o dos hosts da API; números voltam como string (o Lua truncaria para inteiro)
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now or tat > now + period then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if allow_at > now then return tostring(allow_at - now) end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+
+class GCRARedisStore:
+    """GCRA num script Lua (EVALSHA): ler e gravar o TAT é atômico no servidor, em um round trip."""
+
+    backend = "redis"
+
+    def __init__(self, url: str, key_prefix: str = "rate_limit:"):
+        self.url = url
+        self.key_prefix = key_prefix
+        self._client = None
+        self._script = None
+
+    def _open(self) -> None:
+        import redis.asyncio as redis # Import tardio: dependência opcional (RATE_LIMIT_STORAGE="redis")
+        self._client = redis.from_url(self.url)
+        self._script = self._client.register_script(_GCRA_LUA)
+
+    async def acquire(self, key: str, emission_interval: float, period: float) -> float:
+        if self._client is None:
+            self._open()
+        retry_after = await self._script(keys=[self.key_prefix + key], args=[emission_interval, period])
+        return float(retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"open": self._client is not None, "key_prefix": self.key_prefix}
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client, self._script = None, None
@@ -0,0 +1,64 @@
+# app/utils/latency_sketch.py
+import math
+from typing import Any, Dict, Optional
+
+# Latências abaixo disso (ms) caem no balde "zero"
+_MIN_VALUE = 0.001
+
+
+class LatencySketch:
+    """
+    Histograma logarítmico mergeável (estilo DDSketch) para quantis de latência.
+    Cada valor cai no balde ceil(log_gamma(v)); o quantil estimado tem erro relativo <= relative_accuracy.
+    Dois sketches com a mesma precisão se combinam somando os baldes, então rollups por minuto
+    podem ser agregados em qualquer janela (5 min, 1 h...) sem voltar às linhas brutas.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.02):
+        self.relative_accuracy = min(max(relative_accuracy, 0.0001), 0.5)
+        self.gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= _MIN_VALUE:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    def merge(self, other: "LatencySketch") -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Sketches com precisões diferentes não podem ser combinados.")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = min(max(q, 0.0), 1.0) * (self.count - 1)
+        cumulative = self.zero_count
+        if rank < cumulative:
+            return 0.0
+        for index in sorted(self.bins):
+            cumulative += self.bins[index]
+            if cumulative > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1) # Ponto médio (relativo) do balde
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Formato compacto gravado na coluna JSONB do rollup
+        return {"a": self.relative_accuracy, "z": self.zero_count, "b": {str(index): count for index, count in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencySketch":
+        sketch = cls(relative_accuracy=float(data.get("a", 0.02)))
+        sketch.zero_count = int(data.get("z", 0))
+        sketch.bins = {int(index): int(count) for index, count in (data.get("b") or {}).items()}
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
@@ -0,0 +1,69 @@
+# app/utils/pagination.py
+"""
+Paginação por cursor (keyset). O cursor é opaco para o cliente: JSON em base64url com os
+valores da chave de ordenação da última linha da página, ex: {"ts": ..., "id": ...} para logs.
+A próxima página é devolvida nos headers `X-Next-Cursor` e `Link: <...>; rel="next"`,
+para que o corpo das listagens continue sendo uma lista simples (compatível com `skip`).
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+
+# Chaves de ordenação: nome no cursor -> (coluna da linha, conversor/validador do valor recebido)
+CursorKeys = Dict[str, Tuple[str, Callable[[Any], Any]]]
+
+
+def _timestamp(value: Any) -> str:
+    # Reemitido via isoformat: o valor vai para um filtro do PostgREST, só aceitamos datas válidas
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).isoformat()
+
+
+def _username(value: Any) -> str:
+    if not isinstance(value, str) or not value:
+        raise ValueError("username inválido")
+    return value
+
+
+def _uuid(value: Any) -> str:
+    return str(uuid.UUID(str(value)))
+
+
+API_LOG_CURSOR: CursorKeys = {"ts": ("timestamp", _timestamp), "id": ("id", int)}
+GEO_LOG_CURSOR: CursorKeys = {"ts": ("timestamp", _timestamp), "id": ("id", _uuid)}
+ADMIN_CURSOR: CursorKeys = {"u": ("username", _username)}
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: CursorKeys) -> Tuple[Any, ...]:
+    """Devolve os valores na ordem de `keys`. Cursor malformado -> HTTP 400."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return tuple(convert(values[name]) for name, (_, convert) in keys.items())
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginação inválido.")
+
+
+def next_cursor(rows: Sequence[Any], limit: int, keys: CursorKeys) -> Optional[str]:
+    """Cursor da próxima página, ou None se esta página não veio cheia (última página)."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    get = last.get if isinstance(last, dict) else lambda column: getattr(last, column)
+    return encode_cursor({name: get(column) for name, (column, _) in keys.items()})
+
+
+def set_next_page_headers(request: Request, response: Response, cursor: Optional[str]) -> None:
+    if not cursor:
+        return
+    next_url = request.url.remove_query_params(["skip", "offset", "cursor"]).include_query_params(cursor=cursor)
+    response.headers["X-Next-Cursor"] = cursor
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
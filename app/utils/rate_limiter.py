@@ -1,8 +1,150 @@
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from app.core.config import settings # Para pegar RATE_LIMIT_LOGIN_ATTEMPTS
-
-limiter = Limiter(key_func=get_remote_address, default_limits=["1000/hour", "200/minute"])
-# O default_limits acima é um exemplo genérico.
-# Você aplicará limites específicos às rotas.
+import functools
+import inspect
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from fastapi import HTTPException, Request, status
+
+from app.core.config import settings # Para pegar RATE_LIMIT_LOGIN_ATTEMPTS e o armazenamento
+from app.utils.gcra import GCRAMemoryStore, GCRARedisStore, GCRASharedMemoryStore
+
+RATE_LIMIT_STORAGE_MEMORY = "memory"
+RATE_LIMIT_STORAGE_SHM = "shm"
+RATE_LIMIT_STORAGE_REDIS = "redis"
+
+_PERIOD_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+# Em request.state: a requisição já passou por um @limiter.limit (como o _rate_limiting_complete do slowapi)
+_RATE_LIMIT_CHECKED_STATE = "rate_limit_checked"
+# Mesma notação do slowapi/limits: "5/minute", "10 per hour", "100/2 hours"; vários com ";" ou ","
+_RATE_RE = re.compile(r"^\s*(\d+)\s*(?:/|per)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    amount: int
+    period_seconds: float
+    text: str
+
+    @property
+    def emission_interval(self) -> float:
+        return self.period_seconds / self.amount
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def parse_rate_limits(limit_value: str) -> List[RateLimit]:
+    limits = []
+    for part in re.split(r"[;,]", limit_value):
+        if not part.strip():
+            continue
+        match = _RATE_RE.match(part)
+        if not match or int(match.group(1)) <= 0:
+            raise ValueError(f"Limite de taxa inválido: '{part.strip()}' (ex: '5/minute', '100 per 2 hours').")
+        amount, multiple, unit = int(match.group(1)), int(match.group(2) or 1), match.group(3).lower()
+        limits.append(RateLimit(amount, multiple * _PERIOD_SECONDS[unit], f"{amount} per {multiple} {unit}"))
+    if not limits:
+        raise ValueError(f"Limite de taxa vazio: '{limit_value}'.")
+    return limits
+
+
+class RateLimitExceeded(HTTPException):
+    """429 com Retry-After (segundos até a próxima requisição ser aceita)."""
+
+    def __init__(self, limit: RateLimit, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded: {limit}",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+def get_remote_address(request: Request) -> str:
+    return request.client.host if request.client else "127.0.0.1"
+
+
+class Limiter:
+    """
+    Rate limiter GCRA com a mesma API de decorador do slowapi (@limiter.limit("5/minute")).
+    O estado é um timestamp por (rota, limite, cliente) no armazenamento configurado; com "shm" ou
+    "redis" o limite vale para todos os workers, não para cada processo.
+    Se o armazenamento falhar, a requisição passa (fail open) e o erro é contado em stats().
+    """
+
+    def __init__(self, key_func: Callable[[Request], str], store: Any):
+        self.key_func = key_func
+        self.store = store
+        self.allowed = 0
+        self.limited = 0
+        self.storage_errors = 0
+
+    def limit(self, limit_value: str) -> Callable:
+        limits = parse_rate_limits(limit_value)
+
+        def decorator(func: Callable) -> Callable:
+            if "request" not in inspect.signature(func).parameters:
+                raise TypeError(f"{func.__name__}: @limiter.limit exige um parâmetro 'request: Request' no endpoint.")
+            scope = f"{func.__module__}.{func.__name__}"
+
+            @functools.wraps(func)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                request = kwargs.get("request")
+                if request is None: # Chamada direta com argumentos posicionais (ex: /login repassando para /login/json)
+                    request = next(arg for arg in args if isinstance(arg, Request))
+                # Só o endpoint da rota conta: /login repassando para /login/json não consome o limite do JSON
+                if not getattr(request.state, _RATE_LIMIT_CHECKED_STATE, False):
+                    setattr(request.state, _RATE_LIMIT_CHECKED_STATE, True)
+                    await self.hit(scope, limits, request)
+                return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    async def hit(self, scope: str, limits: List[RateLimit], request: Request) -> None:
+        client_key = self.key_func(request)
+        for rate_limit in limits:
+            try:
+                retry_after = await self.store.acquire(
+                    f"{scope}:{rate_limit}:{client_key}", rate_limit.emission_interval, rate_limit.period_seconds
+                )
+            except Exception as e:
+                self.storage_errors += 1
+                if self.storage_errors == 1 or self.storage_errors % 1000 == 0: # Sem inundar o log se o armazenamento cair
+                    print(f"ERRO no armazenamento do rate limit ('{self.store.backend}'): {e}. Requisição liberada ({self.storage_errors} erros).")
+                continue
+            if retry_after > 0:
+                self.limited += 1
+                raise RateLimitExceeded(rate_limit, retry_after)
+        self.allowed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.store.backend,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "storage_errors": self.storage_errors,
+            "store": self.store.stats(),
+        }
+
+    async def close(self) -> None:
+        await self.store.close()
+
+
+def _create_store() -> Any:
+    backend = (settings.RATE_LIMIT_STORAGE or RATE_LIMIT_STORAGE_MEMORY).lower()
+    if backend == RATE_LIMIT_STORAGE_SHM:
+        return GCRASharedMemoryStore(settings.RATE_LIMIT_SHM_PATH, settings.RATE_LIMIT_SHM_SLOTS)
+    if backend == RATE_LIMIT_STORAGE_REDIS:
+        if settings.RATE_LIMIT_REDIS_URL:
+            return GCRARedisStore(settings.RATE_LIMIT_REDIS_URL)
+        print(f"AVISO: RATE_LIMIT_STORAGE='redis' sem RATE_LIMIT_REDIS_URL. Usando '{RATE_LIMIT_STORAGE_MEMORY}' (limite por processo).")
+    elif backend != RATE_LIMIT_STORAGE_MEMORY:
+        print(f"AVISO: RATE_LIMIT_STORAGE inválido '{settings.RATE_LIMIT_STORAGE}'. Usando '{RATE_LIMIT_STORAGE_MEMORY}'.")
+    return GCRAMemoryStore(settings.RATE_LIMIT_MEMORY_MAX_KEYS)
+
+
+limiter = Limiter(key_func=get_remote_address, store=_create_store())
+# Limites aplicados rota a rota com @limiter.limit(...)
@@ -1,19 +1,25 @@
 # app/utils/security.py
 import hashlib
-from passlib.context import CryptContext
 
-# Contexto para hashing de senhas
+# Contexto para hashing de senhas (criado no primeiro uso: o passlib não precisa pesar no cold start)
 # Escolha os esquemas de hashing. bcrypt é uma boa escolha padrão.
 # deprecated="auto" fará com que senhas antigas (se você mudar o esquema) sejam atualizadas no próximo login.
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_pwd_context = None
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica uma senha plana contra um hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Gera um hash para uma senha."""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def hash_identifier(identifier: str) -> str:
     """Gera um hash SHA256 para um identificador (como o HWID do cliente)."""
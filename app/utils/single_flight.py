@@ -0,0 +1,64 @@
+# app/utils/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Colapsa chamadas concorrentes com a mesma chave numa única execução em andamento.
+    O primeiro chamador cria a task; os demais aguardam a mesma task e recebem o mesmo
+    resultado (ou a mesma exceção). Nada é guardado depois que a task termina (não é cache).
+
+    Cancelamento: cada chamador espera via asyncio.shield, então cancelar um chamador não
+    afeta os outros; a task compartilhada só é cancelada quando todos desistem dela.
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        self.calls += 1
+        task = self._tasks.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.create_task(func(*args, **kwargs), name=f"{self.name}:{key}")
+            self._tasks[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda finished, key=key: self._on_done(key, finished))
+        else:
+            self.coalesced += 1
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(key) == 1 and self._tasks.get(key) is task:
+                task.cancel() # Último interessado desistiu: não vale a pena terminar a chamada
+            raise
+        finally:
+            if self._tasks.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _on_done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+            del self._waiters[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None: # Também marca a exceção como "recuperada" se ninguém mais esperar
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "in_flight": len(self._tasks),
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
@@ -0,0 +1,123 @@
+# app/utils/ttl_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+# Sentinela para diferenciar "não está no cache" de um valor None cacheado (cache negativo)
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache LRU em memória com limite rígido de tamanho e TTL por entrada.
+    Thread-safe, pois também é usado a partir de código síncrono rodando no threadpool.
+
+    Gerações de invalidação: quem vai buscar um valor fora do cache pega generation() antes da busca e
+    passa para set(..., generation=...). Se a chave foi invalidada no meio tempo, o set é ignorado:
+    uma busca iniciada antes de uma escrita não recoloca o valor antigo no cache.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, name: str = "cache"):
+        self.name = name
+        self.max_size = max(1, max_size)
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Geração em que cada chave foi invalidada por último (limitado a max_size; as mais antigas
+        # saem e sobem o piso: buscas iniciadas antes dele não gravam)
+        self._generation = 0
+        self._invalidated_at: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._generation_floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def _bump_generation(self, keys: Iterable[Hashable]) -> None:
+        # Chamado com self._lock adquirido
+        self._generation += 1
+        for key in keys:
+            self._invalidated_at[key] = self._generation
+            self._invalidated_at.move_to_end(key)
+        while len(self._invalidated_at) > self.max_size:
+            _, generation = self._invalidated_at.popitem(last=False)
+            self._generation_floor = max(self._generation_floor, generation)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None, generation: Optional[int] = None) -> None:
+        """
+        Armazena `value`. O TTL efetivo é o menor entre `ttl_seconds` e o TTL padrão; TTL <= 0 não armazena.
+        Com `generation` (de generation(), pego antes da busca): não armazena se a chave foi invalidada depois.
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and (generation < self._generation_floor or self._invalidated_at.get(key, -1) > generation):
+                self.stale_sets += 1
+                return
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            self._bump_generation([key]) # Mesmo sem entrada: pode haver uma busca da chave em andamento
+            if self._data.pop(key, None) is None:
+                return False
+            self.invalidations += 1
+            return True
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Remove todas as entradas para as quais predicate(chave, valor) é verdadeiro (varredura O(n))."""
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            self._bump_generation(keys)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self._invalidated_at.clear()
+            self._generation_floor = self._generation
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_sets": self.stale_sets,
+        }
@@ -0,0 +1,57 @@
+# scripts/backfill_geoip.py
+"""
+Backfill de GeoIP: preenche country/city/region/latitude/longitude das linhas de geo_login_logs
+gravadas sem localização (o provedor falhou no momento do login).
+
+O progresso é salvo em um checkpoint JSON após cada página; rodar de novo retoma de onde parou
+(e também pega as linhas sem localização gravadas depois da última execução).
+
+Uso (na raiz do projeto, com as variáveis de ambiente da API configuradas):
+    python -m scripts.backfill_geoip --concurrency 4 --rate 1
+    python -m scripts.backfill_geoip --max-pages 10 --dry-run
+    python -m scripts.backfill_geoip --reset        # ignora o checkpoint e começa do início
+Com GEOIP_PROVIDER=mmdb (base local) use --rate 0 (sem limite de taxa).
+"""
+import argparse
+import asyncio
+import os
+
+from app.core.config import settings
+from app.services import init_services, close_services
+from app.services.geo_backfill import GeoBackfillJob
+from app.services.geoip_local import mmdb_resolver
+from app.services.geoip_service import ipapi_client
+
+
+async def main(args: argparse.Namespace) -> None:
+    job = GeoBackfillJob(
+        checkpoint_path=args.checkpoint, page_size=args.page_size, concurrency=args.concurrency,
+        rate_per_second=args.rate, dry_run=args.dry_run,
+    )
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    if job.load_checkpoint():
+        print(f"INFO:     Retomando do checkpoint {args.checkpoint} (cursor={job.state['after']}).")
+    await init_services()
+    await ipapi_client.open()
+    try:
+        state = await job.run(max_pages=args.max_pages)
+    finally:
+        await ipapi_client.close()
+        mmdb_resolver.close()
+        await close_services()
+    print(f"INFO:     Backfill {'concluído' if state['finished'] else 'interrompido (--max-pages)'}: {state}")
+    if args.dry_run:
+        print("INFO:     --dry-run: nada foi gravado (nem o checkpoint).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkpoint", default=".geoip_backfill_checkpoint.json")
+    parser.add_argument("--page-size", type=int, default=settings.EXPORT_CHUNK_SIZE, help="Linhas por página (<= max-rows do PostgREST)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Consultas GeoIP simultâneas")
+    parser.add_argument("--rate", type=float, default=1.0, help="Consultas GeoIP por segundo (0 = sem limite)")
+    parser.add_argument("--max-pages", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Resolve mas não grava")
+    parser.add_argument("--reset", action="store_true", help="Apaga o checkpoint e começa do início")
+    asyncio.run(main(parser.parse_args()))
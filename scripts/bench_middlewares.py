@@ -0,0 +1,116 @@
+# scripts/bench_middlewares.py
+"""
+Benchmark de requisições por segundo em /health e /api/v1/protected-data
+comparando os middlewares antigos (BaseHTTPMiddleware) com as versões ASGI puras.
+
+Uso (na raiz do projeto, com as variáveis de ambiente da API configuradas):
+    python -m scripts.bench_middlewares --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+from fastapi import Request
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.main import app
+from app.auth.dependencies import get_current_active_user
+from app.core.config import settings
+from app.core.logging_middleware import ApiLoggingMiddleware
+from app.core.security_headers_middleware import SecurityHeadersMiddleware
+from app.models.user import User
+from app.services.log_sink import api_log_sink
+
+
+class LegacyApiLoggingMiddleware(BaseHTTPMiddleware):
+    # Reproduz o custo do middleware antigo: call_next + log enfileirado após a resposta
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        await api_log_sink.enqueue({
+            "method": request.method, "path": request.url.path, "status_code": response.status_code,
+            "processing_time_ms": round((time.time() - start_time) * 1000, 2), "tags": ["api_request"],
+        })
+        return response
+
+
+async def legacy_security_headers(request: Request, call_next):
+    response = await call_next(request)
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    response.headers["X-Frame-Options"] = "DENY"
+    if request.url.scheme == "https":
+        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+    return response
+
+
+def use_middlewares(logging_cls, security_middleware: Middleware) -> None:
+    # Substitui os middlewares de logging/headers mantendo os demais (ex: CORS) na mesma posição
+    stack = []
+    for middleware in app.user_middleware:
+        if middleware.cls in (ApiLoggingMiddleware, LegacyApiLoggingMiddleware):
+            stack.append(Middleware(logging_cls))
+        elif middleware.cls in (SecurityHeadersMiddleware, BaseHTTPMiddleware):
+            stack.append(security_middleware)
+        else:
+            stack.append(middleware)
+    app.user_middleware = stack
+    app.middleware_stack = None # Força o Starlette a reconstruir a pilha na próxima requisição
+
+
+async def measure(path: str, total_requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": "Bearer bench"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(min(100, total_requests)): # Aquecimento
+            await client.get(path, headers=headers)
+        queue: asyncio.Queue = asyncio.Queue()
+        for _ in range(total_requests):
+            queue.put_nowait(None)
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                response = await client.get(path, headers=headers)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} respondeu {response.status_code}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total_requests / (time.perf_counter() - start)
+
+
+async def main(total_requests: int, concurrency: int) -> None:
+    fake_user = User(id=uuid.uuid4(), email="bench@example.com", role="user")
+    app.dependency_overrides[get_current_active_user] = lambda: fake_user
+    # Consome e descarta a fila do sink: o benchmark não deve gravar linhas em api_logs,
+    # e uma fila cheia (overflow) distorceria a medição
+    async def discard_logs():
+        while True:
+            await api_log_sink.queue.get()
+    discard_task = asyncio.create_task(discard_logs())
+
+    paths = ["/health", f"{settings.API_V1_STR}/protected-data"]
+    variants = [
+        ("antes (BaseHTTPMiddleware)", LegacyApiLoggingMiddleware, Middleware(BaseHTTPMiddleware, dispatch=legacy_security_headers)),
+        ("depois (ASGI puro)", ApiLoggingMiddleware, Middleware(SecurityHeadersMiddleware)),
+    ]
+    try:
+        for label, logging_cls, security_middleware in variants:
+            use_middlewares(logging_cls, security_middleware)
+            for path in paths:
+                rps = await measure(path, total_requests, concurrency)
+                print(f"{label:<28} {path:<28} {rps:>10.1f} req/s")
+    finally:
+        app.dependency_overrides.pop(get_current_active_user, None)
+        discard_task.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
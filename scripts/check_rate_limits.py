@@ -0,0 +1,65 @@
+# scripts/check_rate_limits.py
+"""
+Confere que o rate limit vale entre workers: N processos disputam a mesma chave no armazenamento
+configurado (RATE_LIMIT_STORAGE) e o total aceito não pode passar do limite. Com "memory" cada
+processo tem o próprio estado e o total escala com o número de processos (é o que "shm" e "redis" evitam);
+termina com código 1 se um armazenamento compartilhado deixar passar mais que o limite.
+
+Uso (na raiz do projeto, com as variáveis de ambiente da API configuradas):
+    RATE_LIMIT_STORAGE=shm python -m scripts.check_rate_limits --processes 4 --limit 50
+    RATE_LIMIT_STORAGE=redis RATE_LIMIT_REDIS_URL=redis://localhost:6379/0 python -m scripts.check_rate_limits
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+import uuid
+
+from app.utils.rate_limiter import RATE_LIMIT_STORAGE_MEMORY, _create_store
+
+
+def worker(key: str, limit: int, attempts: int, results: "multiprocessing.Queue") -> None:
+    async def run() -> None:
+        store = _create_store() # Como um worker do uvicorn: cada processo abre o próprio acesso ao armazenamento
+        accepted = 0
+        started = time.perf_counter()
+        for _ in range(attempts):
+            if await store.acquire(key, 60 / limit, 60) == 0:
+                accepted += 1
+        results.put((accepted, (time.perf_counter() - started) / attempts * 1e6))
+        await store.close()
+    asyncio.run(run())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=50, help="Requisições por minuto para a chave de teste")
+    parser.add_argument("--attempts", type=int, default=200, help="Tentativas por processo")
+    args = parser.parse_args()
+
+    key = f"check_rate_limits:{uuid.uuid4().hex}" # Chave nova a cada execução
+    results: "multiprocessing.Queue" = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(key, args.limit, args.attempts, results)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    backend = _create_store().backend
+    accepted = sum(count for count, _ in outcomes)
+    latency_us = sum(us for _, us in outcomes) / len(outcomes)
+    shared = backend != RATE_LIMIT_STORAGE_MEMORY
+    expected = args.limit if shared else args.limit * args.processes
+    ok = accepted <= args.limit if shared else True
+    print(
+        f"{'OK ' if ok else 'FALHOU'} armazenamento={backend} processos={args.processes} "
+        f"aceitas={accepted} (esperado {expected}, limite {args.limit}/minuto) | {latency_us:.1f} µs por verificação"
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
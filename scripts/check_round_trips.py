@@ -0,0 +1,128 @@
+# scripts/check_round_trips.py
+"""
+Orçamento de round trips ao Supabase (GoTrue + PostgREST) por endpoint de autenticação.
+Troca o cliente do SupabaseService por um falso que conta cada chamada feita via
+SupabaseService.run e devolve respostas prontas; termina com código 1 se algum endpoint
+passar do orçamento. Guarda contra regressões (ex: voltar a buscar o usuário depois do
+sign-in, checar o email com list_users antes do create_user, ou um replay de token já
+revogado no logout voltar a ir ao banco).
+
+Uso (na raiz do projeto, com as variáveis de ambiente da API configuradas):
+    python -m scripts.check_round_trips
+"""
+import asyncio
+import sys
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.main import app
+from app.core.config import settings
+from app.services import get_supabase_service
+from app.services.supabase_service import DATABASE_BACKEND_SUPABASE
+
+USER_ID = uuid.uuid4()
+EMAIL = "round-trips@example.com"
+DUPLICATE_EMAIL = "already-registered@example.com"
+PASSWORD = "round-trips-password"
+
+# Orçamento por endpoint: (nome, método, caminho, status esperado, round trips permitidos)
+BUDGETS: List[Tuple[str, str, str, int, int]] = [
+    ("register", "POST", "/auth/register", 201, 1),                    # create_user
+    ("register (email duplicado)", "POST", "/auth/register", 400, 1),  # create_user rejeita
+    ("login", "POST", "/auth/login/json", 200, 2),                     # sign_in_with_password + store_refresh_token
+    ("refresh", "POST", "/auth/refresh", 200, 1),                      # rpc rotate_refresh_token
+    ("logout", "POST", "/auth/logout", 204, 1),                        # revoke_refresh_token_by_hash
+    ("refresh (token revogado)", "POST", "/auth/refresh", 403, 0),     # recusado pelo revoked_token_filter
+    ("logout (token revogado)", "POST", "/auth/logout", 204, 0),       # ignorado pelo revoked_token_filter
+    ("logout (todas as sessões)", "POST", "/auth/logout", 204, 1),     # update_user_by_id
+]
+
+
+class DuplicateUserError(Exception):
+    code = "email_exists" # Mesmo código que o GoTrue devolve
+
+
+class FakeCall:
+    """Registra a cadeia de chamadas do cliente, ex: table("refresh_tokens").insert(...).execute."""
+
+    def __init__(self, path: Tuple[str, ...] = ()):
+        self.path = path
+
+    def __getattr__(self, name: str) -> "FakeCall":
+        return FakeCall(self.path + (name,))
+
+    def __call__(self, *args: Any, **kwargs: Any) -> "FakeCall":
+        if self.path and self.path[-1] in ("table", "rpc"):
+            return FakeCall(self.path[:-1] + (f"{self.path[-1]}:{args[0]}",))
+        return self # Métodos do query builder (select, eq, insert...) encadeiam
+
+
+def fake_user() -> SimpleNamespace:
+    return SimpleNamespace(user=SimpleNamespace(id=str(USER_ID), email=EMAIL, user_metadata={"role": "user"}, app_metadata={}))
+
+
+def respond(path: Tuple[str, ...], kwargs: Dict[str, Any]) -> Any:
+    operation = path[-1]
+    if operation in ("sign_in_with_password", "get_user_by_id", "update_user_by_id"):
+        return fake_user()
+    if operation == "create_user":
+        if kwargs.get("email") == DUPLICATE_EMAIL:
+            raise DuplicateUserError("A user with this email address has already been registered")
+        return fake_user()
+    if path[0] == "rpc:rotate_refresh_token":
+        return SimpleNamespace(data=[{"rotation_status": "rotated", "rotated_user_id": str(USER_ID), "user_role": "user"}])
+    return SimpleNamespace(data=[{"id": str(uuid.uuid4())}])
+
+
+async def main() -> int:
+    if settings.DATABASE_BACKEND != DATABASE_BACKEND_SUPABASE:
+        print("ERRO: o orçamento é medido no backend 'supabase' (DATABASE_BACKEND).")
+        return 1
+    service = get_supabase_service()
+    calls: List[Tuple[str, ...]] = []
+
+    async def counting_run(fn: FakeCall, *args: Any, **kwargs: Any) -> Any:
+        calls.append(fn.path)
+        return respond(fn.path, kwargs)
+
+    service.client = FakeCall()
+    service.run = counting_run
+
+    prefix = settings.API_V1_STR
+    bodies: Dict[str, Optional[Dict[str, Any]]] = {
+        "register": {"email": EMAIL, "password": PASSWORD},
+        "register (email duplicado)": {"email": DUPLICATE_EMAIL, "password": PASSWORD},
+        "login": {"email": EMAIL, "password": PASSWORD},
+        "refresh": None, # Preenchido com o refresh token devolvido pelo login
+        "logout": None, # Refresh token devolvido pelo refresh
+        "refresh (token revogado)": None, # O mesmo token, já revogado pelo logout
+        "logout (token revogado)": None, # Logout repetido com o mesmo token
+        "logout (todas as sessões)": None, # Sem corpo: só o access token
+    }
+    headers: Dict[str, str] = {}
+    failures = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://round-trips") as client:
+        for name, method, path, expected_status, budget in BUDGETS:
+            calls.clear()
+            response = await client.request(method, f"{prefix}{path}", json=bodies[name], headers=headers)
+            if name == "login" and response.status_code == 200:
+                bodies["refresh"] = {"refresh_token": response.json()["refresh_token"]}
+            if name == "refresh" and response.status_code == 200:
+                tokens = response.json()
+                headers["Authorization"] = f"Bearer {tokens['access_token']}"
+                revoked = {"refresh_token": tokens["refresh_token"]}
+                bodies["logout"] = bodies["refresh (token revogado)"] = bodies["logout (token revogado)"] = revoked
+            ok = response.status_code == expected_status and len(calls) <= budget
+            failures += 0 if ok else 1
+            print(f"{'OK ' if ok else 'FALHOU'} {name:<28} status={response.status_code} round_trips={len(calls)}/{budget}")
+            for call in calls:
+                print(f"       - {'.'.join(call)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,70 @@
+# scripts/profile_imports.py
+"""
+Perfil de tempo de import (cold start) de app.main, via `python -X importtime`.
+Mostra o tempo total e os módulos mais caros (cumulativo e próprio).
+
+Uso (na raiz do projeto, com as variáveis de ambiente da API configuradas):
+    python -m scripts.profile_imports --top 25
+    python -m scripts.profile_imports --module app.routers.auth_router
+"""
+import argparse
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+ImportRow = Tuple[int, int, str] # (self_us, cumulative_us, módulo)
+
+
+def run_importtime(module: str) -> Tuple[List[ImportRow], float]:
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        print(completed.stderr[-4000:])
+        raise SystemExit(f"ERRO: import de '{module}' falhou (código {completed.returncode}).")
+
+    rows: List[ImportRow] = []
+    for line in completed.stderr.splitlines():
+        # Formato: "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+        except ValueError:
+            continue
+    return rows, wall_ms
+
+
+def print_table(title: str, rows: List[ImportRow], key_index: int, top: int) -> None:
+    print(f"\n{title}")
+    print(f"{'self (ms)':>10} {'cumul. (ms)':>12}  módulo")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda row: row[key_index], reverse=True)[:top]:
+        print(f"{self_us / 1000:>10.2f} {cumulative_us / 1000:>12.2f}  {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Perfil de tempo de import da API.")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    rows, wall_ms = run_importtime(args.module)
+    total_us = sum(self_us for self_us, _, _ in rows)
+    print(f"Import de '{args.module}': {total_us / 1000:.2f}ms em {len(rows)} módulos (processo completo: {wall_ms:.2f}ms)")
+    print_table("Maiores tempos cumulativos (módulo + dependências):", rows, 1, args.top)
+    print_table("Maiores tempos próprios:", rows, 0, args.top)
+
+    # Pacotes que devem ficar fora do caminho de import (carregados só no lifespan/primeiro uso)
+    lazy_packages = ("supabase", "passlib", "asyncpg")
+    loaded = sorted({name.strip().split(".")[0] for _, _, name in rows} & set(lazy_packages))
+    if loaded:
+        print(f"\nAVISO: pacotes pesados carregados no import: {', '.join(loaded)}")
+
+
+if __name__ == "__main__":
+    main()
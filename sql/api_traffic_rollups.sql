@@ -0,0 +1,20 @@
+-- Rollups por minuto do tráfego da API (app/services/traffic_rollups.py).
+-- Cada processo grava com o próprio writer_id; as consultas de /admin-panel/stats/* somam por balde.
+create table if not exists public.api_traffic_rollups (
+    bucket_start    timestamptz      not null,
+    writer_id       text             not null,
+    route           text             not null,
+    method          text             not null,
+    status_class    text             not null,
+    api_area        text             not null,
+    request_count   integer          not null,
+    error_count     integer          not null,
+    latency_sum_ms  double precision not null,
+    latency_max_ms  double precision not null,
+    latency_sketch  jsonb            not null,
+    primary key (bucket_start, writer_id, route, method, status_class, api_area)
+);
+
+create index if not exists api_traffic_rollups_route_idx on public.api_traffic_rollups (route, bucket_start);
+
+-- Retenção sugerida (ex: via pg_cron): delete from public.api_traffic_rollups where bucket_start < now() - interval '90 days';
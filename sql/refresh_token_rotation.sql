@@ -0,0 +1,81 @@
+-- Rotação atômica de refresh token (SupabaseService.rotate_refresh_token, POST /auth/refresh).
+-- Valida o token usado, revoga-o e insere o sucessor em uma única transação: um round trip,
+-- e o FOR UPDATE serializa usos concorrentes do mesmo token (o segundo vê revoked = true).
+--
+-- rotation_status:
+--   rotated        sucesso; rotated_user_id/user_role para emitir o novo access token
+--   not_found      hash desconhecido
+--   reused         token já revogado foi reapresentado: toda a família (tokens do usuário) é revogada
+--   expired        expires_at vencido (o token é revogado)
+--   mismatch       'sub' do JWT diferente do dono do token (o token é revogado)
+--   user_inactive  usuário removido ou banido no GoTrue (o token é revogado)
+--   stale_epoch    'sep' do token abaixo de app_metadata.session_epoch do usuário: emitido antes de um
+--                  logout de todas as sessões (o token é revogado)
+
+-- Versão anterior, sem p_session_epoch
+drop function if exists public.rotate_refresh_token(text, text, timestamptz, uuid);
+
+create or replace function public.rotate_refresh_token(
+    p_token_hash       text,
+    p_new_token_hash   text,
+    p_new_expires_at   timestamptz,
+    p_user_id          uuid,
+    p_session_epoch    bigint default 0
+)
+returns table (rotation_status text, rotated_user_id uuid, user_role text)
+language plpgsql
+security definer
+set search_path = public, auth
+as $$
+declare
+    v_token public.refresh_tokens%rowtype;
+    v_user  auth.users%rowtype;
+begin
+    select * into v_token from public.refresh_tokens t where t.token_hash = p_token_hash for update;
+    if not found then
+        return query select 'not_found'::text, null::uuid, null::text;
+        return;
+    end if;
+
+    if v_token.revoked then
+        update public.refresh_tokens t set revoked = true where t.user_id = v_token.user_id and not t.revoked;
+        return query select 'reused'::text, v_token.user_id, null::text;
+        return;
+    end if;
+
+    if v_token.user_id <> p_user_id then
+        update public.refresh_tokens t set revoked = true where t.id = v_token.id;
+        return query select 'mismatch'::text, v_token.user_id, null::text;
+        return;
+    end if;
+
+    if v_token.expires_at is null or v_token.expires_at <= now() then
+        update public.refresh_tokens t set revoked = true where t.id = v_token.id;
+        return query select 'expired'::text, v_token.user_id, null::text;
+        return;
+    end if;
+
+    select * into v_user from auth.users u where u.id = v_token.user_id;
+    if not found or v_user.deleted_at is not null or coalesce(v_user.banned_until > now(), false) then
+        update public.refresh_tokens t set revoked = true where t.id = v_token.id;
+        return query select 'user_inactive'::text, v_token.user_id, null::text;
+        return;
+    end if;
+
+    if coalesce((v_user.raw_app_meta_data ->> 'session_epoch')::bigint, 0) > coalesce(p_session_epoch, 0) then
+        update public.refresh_tokens t set revoked = true where t.id = v_token.id;
+        return query select 'stale_epoch'::text, v_token.user_id, null::text;
+        return;
+    end if;
+
+    update public.refresh_tokens t set revoked = true where t.id = v_token.id;
+    insert into public.refresh_tokens (user_id, token_hash, expires_at, issued_at, parent_token_hash)
+    values (v_token.user_id, p_new_token_hash, p_new_expires_at, now(), p_token_hash);
+
+    return query select 'rotated'::text, v_token.user_id, coalesce(v_user.raw_user_meta_data ->> 'role', 'user');
+end;
+$$;
+
+-- Só o backend (service_role) rotaciona tokens
+revoke all on function public.rotate_refresh_token(text, text, timestamptz, uuid, bigint) from public, anon, authenticated;
+grant execute on function public.rotate_refresh_token(text, text, timestamptz, uuid, bigint) to service_role;
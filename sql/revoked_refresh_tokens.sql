@@ -0,0 +1,17 @@
+-- Fonte da reconstrução periódica do filtro de tokens revogados (app/auth/revoked_token_filter.py).
+-- Só revogações explícitas (logout de um token, revogação por ID, recusas da RPC de rotação) e ainda não expiradas:
+-- tokens revogados pela rotação têm um sucessor (parent_token_hash) e ficam de fora, para que o
+-- replay deles continue chegando a rotate_refresh_token e dispare a detecção de reuso.
+create index if not exists refresh_tokens_parent_token_hash_idx
+    on public.refresh_tokens (parent_token_hash) where parent_token_hash is not null;
+
+create or replace view public.revoked_refresh_token_hashes as
+select t.token_hash
+from public.refresh_tokens t
+where t.revoked
+  and t.expires_at > now()
+  and not exists (select 1 from public.refresh_tokens c where c.parent_token_hash = t.token_hash);
+
+-- Só o backend (service_role) lê a lista
+revoke all on public.revoked_refresh_token_hashes from public, anon, authenticated;
+grant select on public.revoked_refresh_token_hashes to service_role;